@@ -24,6 +24,7 @@ from __future__ import division       #                           ''
 import time     # import the time library for the sleep function
 import brickpi3 # import the BrickPi3 drivers
 import sys      # import sys for sys.exit()
+import balance_control # the balance loop math, shared with balance_sim.py
 
 BP = brickpi3.BrickPi3() # Create an instance of the BrickPi3 class. BP will be the BrickPi3 object.
 
@@ -58,7 +59,7 @@ else:
 
 KGYROANGLECORRECT = 0.25 # a constant used to correct/center the gyro accumulated angle so that gyro integral drift works itself out faster than it can accumulate.
 
-# constants used to define how agressively the robot should respond to:
+# constants used to define how agressively the robot should respond to (use balance_sim.py to try out new values in simulation):
 KGYROANGLE = 14    # sudden changes in angle
 KGYROSPEED = 1.2   # overall angle
 KPOS       = 0.07  # deviation from the target position
@@ -208,27 +209,19 @@ try:
             elif GYRO_TYPE == GYRO_HiTechnic:
                 gyroSpeed = BP.get_sensor(PORT_SENSOR_GYRO)[0] / 4 - gOffset
             
-            gOffset += (gyroSpeed * KGYROSPEEDCORRECT * tInterval)
-            
-            gyroAngle += gyroSpeed * tInterval
-            gyroAngle -= (gyroAngle * KGYROANGLECORRECT * tInterval)
+            gOffset, gyroAngle = balance_control.update_gyro(gyroSpeed, gOffset, gyroAngle, tInterval,
+                                                             KGYROSPEEDCORRECT, KGYROANGLECORRECT)
             
             mrcLeft = BP.get_motor_encoder(PORT_MOTOR_LEFT)
             mrcRight = BP.get_motor_encoder(PORT_MOTOR_RIGHT)
             mrcSumPrev = mrcSum
             mrcSum = mrcLeft + mrcRight
             motorDiff = mrcLeft - mrcRight
-            mrcDelta = mrcSum - mrcSumPrev
-            motorPos += mrcDelta
-            motorSpeed = mrcDelta / tInterval
-            
-            motorPos -= motorControlDrive * tInterval
+            motorPos, motorSpeed = balance_control.update_motor_position(mrcSum, mrcSumPrev, motorPos,
+                                                                         motorControlDrive, tInterval)
             
-            power = ((KGYROSPEED * gyroSpeed +                # (Deg/Sec from Gyro sensor
-                     KGYROANGLE * gyroAngle) / WHEEL_RATIO +  # Deg from integral of gyro) / wheel ratio (tuned for 56mm wheels)
-                     KPOS       * motorPos +                  # From MotorRotaionCount of both motors
-                     KDRIVE     * motorControlDrive +         # To improve start/stop performance
-                     KSPEED     * motorSpeed)                 # Motor speed in Deg/Sec
+            power = balance_control.balance_power(gyroSpeed, gyroAngle, motorPos, motorSpeed, motorControlDrive,
+                                                  KGYROSPEED, KGYROANGLE, KPOS, KSPEED, KDRIVE, WHEEL_RATIO)
             
             if abs(power) < 100:
                 tMotorPosOK = CurrentTime
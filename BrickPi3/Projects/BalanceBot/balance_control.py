@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+#
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2016 Dexter Industries
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information, see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# The balance loop math of the BrickPi3 BalanceBot, used by BalanceBot.py on the robot and by balance_sim.py in
+# simulation. The functions only use arithmetic operators, so they work on numbers and on numpy arrays alike.
+# They don't use augmented assignments (+=), which would change the caller's numpy arrays in place.
+
+from __future__ import print_function # use python 3 syntax but make it compatible with python 2
+from __future__ import division       #                           ''
+
+
+def update_gyro(gyroSpeed, gOffset, gyroAngle, tInterval, KGYROSPEEDCORRECT, KGYROANGLECORRECT):
+    """
+    Track the gyro offset and integrate the gyro speed into the body angle
+
+    Keyword arguments:
+    gyroSpeed -- the gyro reading minus the gyro offset, in degrees per second
+    gOffset -- the gyro offset
+    gyroAngle -- the body angle in degrees, integrated from the gyro speed
+    tInterval -- the time since the last loop, in seconds
+    KGYROSPEEDCORRECT -- how fast the gyro offset follows the gyro readings
+    KGYROANGLECORRECT -- how fast the gyro angle is pulled back to 0, to cancel drift
+
+    Returns:
+    the new gOffset and gyroAngle
+    """
+    gOffset = gOffset + (gyroSpeed * KGYROSPEEDCORRECT * tInterval)
+
+    gyroAngle = gyroAngle + gyroSpeed * tInterval
+    gyroAngle = gyroAngle - (gyroAngle * KGYROANGLECORRECT * tInterval)
+    return gOffset, gyroAngle
+
+
+def update_motor_position(mrcSum, mrcSumPrev, motorPos, motorControlDrive, tInterval):
+    """
+    Track the wheel position and speed from the motor encoders
+
+    Keyword arguments:
+    mrcSum -- the sum of the left and right motor encoders
+    mrcSumPrev -- mrcSum from the last loop
+    motorPos -- the position error, in encoder degrees
+    motorControlDrive -- the drive speed target, in degrees per second
+    tInterval -- the time since the last loop, in seconds
+
+    Returns:
+    the new motorPos, and the motor speed in degrees per second
+    """
+    mrcDelta = mrcSum - mrcSumPrev
+    motorPos = motorPos + mrcDelta
+    motorSpeed = mrcDelta / tInterval
+
+    motorPos = motorPos - motorControlDrive * tInterval
+    return motorPos, motorSpeed
+
+
+def balance_power(gyroSpeed, gyroAngle, motorPos, motorSpeed, motorControlDrive,
+                  KGYROSPEED, KGYROANGLE, KPOS, KSPEED, KDRIVE, WHEEL_RATIO):
+    """
+    Calculate the motor power that keeps the robot balanced
+
+    Returns:
+    the power for both motors, before steering and before limiting it to -100 to 100
+    """
+    return ((KGYROSPEED * gyroSpeed +                # (Deg/Sec from Gyro sensor
+             KGYROANGLE * gyroAngle) / WHEEL_RATIO +  # Deg from integral of gyro) / wheel ratio (tuned for 56mm wheels)
+             KPOS       * motorPos +                  # From MotorRotaionCount of both motors
+             KDRIVE     * motorControlDrive +         # To improve start/stop performance
+             KSPEED     * motorSpeed)                 # Motor speed in Deg/Sec
@@ -0,0 +1,363 @@
+#!/usr/bin/env python
+#
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2016 Dexter Industries
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information, see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# This code is a simulator for the BrickPi3 BalanceBot, used to try out controller gains without the robot.
+#
+# The balance loop math (gyro offset tracking, gyro angle integration, encoder handling and the power
+# equation) is in balance_control.py, which BalanceBot.py uses too, and runs here against a model of the robot: an inverted pendulum on two wheels,
+# driven by two DC motors, with an integer-degree encoder and an integer-DPS EV3 gyro. Every array
+# operation works on thousands of gain sets at once, and sweep() spreads the sets over all CPU cores.
+#
+# Results: For every gain set the simulator reports
+#     stable   -- if the robot was still standing at the end of the run
+#     margin   -- gain margin in dB of the linearized closed loop (how much the total controller output can be
+#                 scaled up or down before the robot can no longer balance). 0 if the loop is not stable.
+#     settle   -- seconds until the body tilt stays within SETTLE_BAND degrees
+#     drift    -- average wheel travel speed over the last second of the run, in mm/s
+#
+# Run this file directly for an example sweep around the BalanceBot.py gains.
+
+from __future__ import print_function # use python 3 syntax but make it compatible with python 2
+from __future__ import division       #                           ''
+
+import math
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import balance_control
+
+# balance loop constants, as defined in BalanceBot.py
+WHEEL_DIAMETER = 43.2  # Lego wheel diameter in mm
+LOOP_SPEED = 120       # balance loop speed in Hz
+TIME_FALL_LIMIT = 2    # if the motors have been running at full power for 2 seconds, assume that the robot fell.
+
+WHEEL_RATIO = (WHEEL_DIAMETER / 56) # tuned for 56mm wheels
+LOOP_TIME = (1 / LOOP_SPEED)
+
+# the names of the gains that can be swept, and their values in BalanceBot.py (with an EV3 gyro)
+GAIN_NAMES = ["KGYROANGLE", "KGYROSPEED", "KPOS", "KSPEED", "KDRIVE", "KGYROSPEEDCORRECT", "KGYROANGLECORRECT"]
+DEFAULT_GAINS = {
+    "KGYROANGLE"        : 14,
+    "KGYROSPEED"        : 1.2,
+    "KPOS"              : 0.07,
+    "KSPEED"            : 0.1,
+    "KDRIVE"            : -0.02,
+    "KGYROSPEEDCORRECT" : 0.01,
+    "KGYROANGLECORRECT" : 0.25,
+}
+
+# robot model. Measure your robot and adjust these if the simulation doesn't match what the robot does.
+GRAVITY        = 9.81                         # m/s^2
+WHEEL_RADIUS   = WHEEL_DIAMETER / 2000        # m
+WHEEL_MASS     = 0.03                         # kg, for one wheel and tire
+BODY_MASS      = 0.9                          # kg, Raspberry Pi, BrickPi3, batteries, motors and frame
+BODY_HEIGHT    = 0.18                         # m
+BODY_COM       = BODY_HEIGHT / 2              # m, distance from the wheel axle to the body center of mass
+BODY_INERTIA   = BODY_MASS * BODY_COM ** 2 / 3
+WHEEL_INERTIA  = WHEEL_MASS * WHEEL_RADIUS ** 2 / 2
+MOTOR_INERTIA  = 1e-5                         # kg m^2, motor rotor (referred to the output shaft)
+MOTOR_GEAR     = 1                            # gear ratio between the motor output shaft and the wheel
+MOTOR_R        = 6.69                         # ohm, armature resistance of a LEGO large motor
+MOTOR_KB       = 0.468                        # V s/rad, back EMF constant
+MOTOR_KT       = 0.317                        # N m/A, torque constant
+MOTOR_FRICTION = 0.0022                       # friction between the body and the motor
+BATTERY_VOLTAGE = 8.1                         # V available to the motors at 100% power
+
+FALL_ANGLE  = 45  # degrees of body tilt at which the robot is considered to have fallen over
+SETTLE_BAND = 1   # degrees of body tilt considered to be balanced
+
+PLANT_SUBSTEPS = 4 # physics steps per balance loop
+
+# derived model constants
+_ALPHA = MOTOR_GEAR * MOTOR_KT / MOTOR_R
+_BETA = MOTOR_GEAR * MOTOR_KT * MOTOR_KB / MOTOR_R + MOTOR_FRICTION
+_A11 = (2 * WHEEL_MASS + BODY_MASS) * WHEEL_RADIUS ** 2 + 2 * WHEEL_INERTIA + 2 * MOTOR_GEAR ** 2 * MOTOR_INERTIA
+_A12 = BODY_MASS * BODY_COM * WHEEL_RADIUS
+_A12_MOTOR = 2 * MOTOR_GEAR ** 2 * MOTOR_INERTIA
+_A22 = BODY_MASS * BODY_COM ** 2 + BODY_INERTIA + 2 * MOTOR_GEAR ** 2 * MOTOR_INERTIA
+_MGL = BODY_MASS * GRAVITY * BODY_COM
+
+_RAD_TO_DEG = 180 / math.pi
+
+# the states used for the linearized stability analysis
+_LINEAR_STATES = ["psi", "dtheta", "dpsi", "pending", "gyroAngle", "gOffset", "motorPos"]
+
+# loop gain scale factors tried when searching for the gain margin
+_MARGIN_SCALES = np.geomspace(0.05, 20, 121)
+
+
+def make_gains(count = None, **gains):
+    """
+    Build a dictionary of gain arrays, filling in any gain that isn't specified with the BalanceBot.py value
+
+    Keyword arguments:
+    count -- the number of gain sets. Defaults to the length of the longest gain array specified.
+    gains -- gain name and value (or array of values) pairs, e.g. KPOS = [0.05, 0.07, 0.09]
+
+    Returns:
+    dictionary of gain name and numpy array pairs, all with the same length
+    """
+    for name in gains:
+        if name not in DEFAULT_GAINS:
+            raise ValueError("balance_sim error: unknown gain %s" % name)
+    arrays = {name : np.atleast_1d(np.asarray(value, dtype = float)) for name, value in gains.items()}
+    if count is None:
+        count = max([len(a) for a in arrays.values()] + [1])
+    result = {}
+    for name in GAIN_NAMES:
+        result[name] = np.broadcast_to(arrays.get(name, DEFAULT_GAINS[name]), (count,)).astype(float)
+    return result
+
+
+def gain_grid(**ranges):
+    """
+    Build every combination of the specified gain values
+
+    Keyword arguments:
+    ranges -- gain name and list of values pairs, e.g. KGYROANGLE = np.linspace(8, 20, 13)
+
+    Returns:
+    dictionary of gain name and numpy array pairs (see make_gains)
+    """
+    names = list(ranges.keys())
+    combos = list(itertools.product(*[np.atleast_1d(ranges[name]) for name in names]))
+    return make_gains(len(combos), **{name : [c[i] for c in combos] for i, name in enumerate(names)})
+
+
+def _new_state(count, tilt, gyro_bias):
+    # the robot is held still at the start tilt while the gyro offset is measured (as BalanceBot.py does
+    # while waiting for Blue Up), then released.
+    zero = np.zeros(count)
+    return {
+        "theta"         : zero.copy(),                       # average wheel angle (rad)
+        "psi"           : np.full(count, math.radians(tilt)), # body tilt (rad), positive leaning forward
+        "dtheta"        : zero.copy(),
+        "dpsi"          : zero.copy(),
+        "gyroAngle"     : zero.copy(),
+        "gOffset"       : np.full(count, float(gyro_bias)),
+        "mrcSum"        : np.round(-2 * _RAD_TO_DEG * np.full(count, math.radians(tilt))),
+        "motorPos"      : zero.copy(),
+        "tMotorPosOK"   : zero.copy(),
+        "fallen"        : np.zeros(count, dtype = bool),
+    }
+
+
+def _plant(state, power, dt):
+    # integrate the inverted pendulum and motor model for dt seconds with the motor power held constant.
+    # theta is the wheel angle and psi the body tilt, so the motor (encoder) angle is theta - psi.
+    voltage = 2 * _ALPHA * (power / 100) * BATTERY_VOLTAGE # both motors
+    h = dt / PLANT_SUBSTEPS
+    theta, psi, dtheta, dpsi = state["theta"], state["psi"], state["dtheta"], state["dpsi"]
+    for _ in range(PLANT_SUBSTEPS):
+        sin_psi = np.sin(psi)
+        a12 = _A12 * np.cos(psi) - _A12_MOTOR
+        f_theta = voltage - 2 * _BETA * (dtheta - dpsi) + _A12 * dpsi ** 2 * sin_psi
+        f_psi = -voltage + 2 * _BETA * (dtheta - dpsi) + _MGL * sin_psi
+        det = _A11 * _A22 - a12 ** 2
+        dtheta = dtheta + h * (_A22 * f_theta - a12 * f_psi) / det
+        dpsi = dpsi + h * (_A11 * f_psi - a12 * f_theta) / det
+        theta = theta + h * dtheta
+        psi = psi + h * dpsi
+    state["theta"], state["psi"], state["dtheta"], state["dpsi"] = theta, psi, dtheta, dpsi
+
+
+def _balance_step(state, gains, CurrentTime, tInterval, gyro_bias = 0, quantize = True, power_scale = 1):
+    # one pass of the BalanceBot.py balance loop, with the robot standing still (no remote buttons pressed).
+    # Returns the motor power.
+    motorControlDrive = 0
+
+    gyroReading = state["dpsi"] * _RAD_TO_DEG + gyro_bias
+    mrcReading = 2 * _RAD_TO_DEG * (state["theta"] - state["psi"]) # left + right
+    if quantize:
+        gyroReading = np.round(gyroReading)
+        mrcReading = np.round(mrcReading)
+
+    gyroSpeed = gyroReading - state["gOffset"]
+
+    state["gOffset"], state["gyroAngle"] = balance_control.update_gyro(
+        gyroSpeed, state["gOffset"], state["gyroAngle"], tInterval,
+        gains["KGYROSPEEDCORRECT"], gains["KGYROANGLECORRECT"])
+
+    state["motorPos"], motorSpeed = balance_control.update_motor_position(
+        mrcReading, state["mrcSum"], state["motorPos"], motorControlDrive, tInterval)
+    state["mrcSum"] = mrcReading
+
+    power = balance_control.balance_power(gyroSpeed, state["gyroAngle"], state["motorPos"], motorSpeed,
+                                          motorControlDrive, gains["KGYROSPEED"], gains["KGYROANGLE"],
+                                          gains["KPOS"], gains["KSPEED"], gains["KDRIVE"], WHEEL_RATIO)
+    power = power * power_scale
+
+    state["tMotorPosOK"] = np.where(np.abs(power) < 100, CurrentTime, state["tMotorPosOK"])
+    return power
+
+
+def simulate(gains, duration = 5, tilt = 3, gyro_bias = 1):
+    """
+    Run the balance loop against the robot model for a set of gains
+
+    Keyword arguments:
+    gains -- dictionary of gain arrays (see make_gains)
+    duration -- simulated time in seconds
+    tilt -- the body tilt in degrees when the robot is released
+    gyro_bias -- the gyro offset in DPS (the gyro reading while the robot is still)
+
+    Returns:
+    dictionary of numpy arrays, one entry per gain set: "stable", "margin", "settle", "drift"
+    """
+    gains = make_gains(len(np.atleast_1d(next(iter(gains.values())))), **gains)
+    count = len(gains["KPOS"])
+    state = _new_state(count, tilt, gyro_bias)
+
+    steps = int(round(duration * LOOP_SPEED))
+    drift_steps = min(steps, LOOP_SPEED)
+    settle = np.zeros(count)
+    drift_start = state["theta"].copy()
+    tilt_limit = math.radians(FALL_ANGLE)
+    settle_band = math.radians(SETTLE_BAND)
+
+    for step in range(steps):
+        CurrentTime = step * LOOP_TIME
+        if step == steps - drift_steps:
+            drift_start = state["theta"].copy()
+
+        power = _balance_step(state, gains, CurrentTime, LOOP_TIME, gyro_bias)
+        power = np.clip(power, -100, 100)
+
+        # the robot stops when BalanceBot.py would detect a fall, or when it is lying on the ground
+        fallen = state["fallen"] | ((CurrentTime - state["tMotorPosOK"]) > TIME_FALL_LIMIT) | (np.abs(state["psi"]) > tilt_limit)
+        state["fallen"] = fallen
+        power = np.where(fallen, 0, power)
+
+        _plant(state, power, LOOP_TIME)
+
+        settle = np.where(np.abs(state["psi"]) > settle_band, CurrentTime + LOOP_TIME, settle)
+
+    stable = ~state["fallen"] & (np.abs(state["psi"]) < tilt_limit)
+    drift = (state["theta"] - drift_start) * WHEEL_RADIUS * 1000 / (drift_steps * LOOP_TIME)
+
+    return {
+        "stable" : stable,
+        "margin" : np.where(stable, gain_margin(gains), 0),
+        "settle" : np.where(stable, settle, np.inf),
+        "drift"  : np.where(stable, drift, np.nan),
+    }
+
+
+def _linear_step(vectors, gains, power_scale):
+    # one loop of the model and controller without quantization, using the states in _LINEAR_STATES.
+    # "pending" is the encoder movement that the controller hasn't read yet.
+    count = vectors.shape[0]
+    state = {name : vectors[:, i] for i, name in enumerate(_LINEAR_STATES)}
+    state["theta"] = np.zeros(count)
+    state["mrcSum"] = -2 * _RAD_TO_DEG * state["psi"] - state["pending"]
+    state["tMotorPosOK"] = np.zeros(count)
+    power = _balance_step(state, gains, 0, LOOP_TIME, quantize = False, power_scale = power_scale)
+    _plant(state, power, LOOP_TIME)
+    state["pending"] = 2 * _RAD_TO_DEG * (state["theta"] - state["psi"]) - state["mrcSum"]
+    return np.stack([state[name] for name in _LINEAR_STATES], axis = 1)
+
+
+def _jacobian(gains, power_scale, eps = 1e-6):
+    # central difference jacobian of one loop around the upright, still robot. Returns an array of shape
+    # (gain sets, states, states).
+    count = len(gains["KPOS"])
+    n = len(_LINEAR_STATES)
+    tiled = {name : np.repeat(value, 2 * n) for name, value in gains.items()}
+    vectors = np.zeros((count, 2 * n, n))
+    for i in range(n):
+        vectors[:, 2 * i, i] = eps
+        vectors[:, 2 * i + 1, i] = -eps
+    result = _linear_step(vectors.reshape(count * 2 * n, n), tiled, power_scale).reshape(count, 2 * n, n)
+    return np.transpose((result[:, 0::2, :] - result[:, 1::2, :]) / (2 * eps), (0, 2, 1))
+
+
+def gain_margin(gains):
+    """
+    Calculate the gain margin of the linearized balance loop
+
+    Keyword arguments:
+    gains -- dictionary of gain arrays (see make_gains)
+
+    Returns:
+    numpy array of gain margins in dB, 0 where the loop isn't stable with the gains as specified
+    """
+    gains = make_gains(len(np.atleast_1d(next(iter(gains.values())))), **gains)
+    # the loop is linear in the motor power, so the jacobian for any scale of the controller output is
+    # an interpolation between the open loop (scale 0) and the nominal closed loop (scale 1).
+    open_loop = _jacobian(gains, 0)
+    closed_loop = _jacobian(gains, 1)
+    scales = _MARGIN_SCALES[None, :, None, None]
+    loops = open_loop[:, None] + scales * (closed_loop - open_loop)[:, None]
+    radius = np.abs(np.linalg.eigvals(loops)).max(axis = 2)
+    stable = radius < 1
+
+    nominal = np.abs(np.linalg.eigvals(closed_loop)).max(axis = 1) < 1
+    below = _MARGIN_SCALES < 1
+    above = _MARGIN_SCALES > 1
+    # the closest scale factor on either side of 1 where the loop is no longer stable
+    lower = np.where(~stable & below, _MARGIN_SCALES, 0).max(axis = 1)
+    upper = np.where(~stable & above, _MARGIN_SCALES, np.inf).min(axis = 1)
+    with np.errstate(divide = "ignore"):
+        margin = 20 * np.log10(np.minimum(1 / np.maximum(lower, _MARGIN_SCALES[0]), upper))
+    return np.where(nominal, np.minimum(margin, 20 * np.log10(_MARGIN_SCALES[-1])), 0)
+
+
+def _simulate_chunk(args):
+    gains, kwargs = args
+    return simulate(gains, **kwargs)
+
+
+def sweep(gains, workers = None, chunk_size = 1024, **kwargs):
+    """
+    Simulate many gain sets, split across processes
+
+    Keyword arguments:
+    gains -- dictionary of gain arrays (see make_gains and gain_grid)
+    workers -- number of processes. Defaults to the number of CPU cores.
+    chunk_size -- the number of gain sets each process simulates at once
+    kwargs -- passed on to simulate
+
+    Returns:
+    dictionary of numpy arrays (see simulate)
+    """
+    count = len(gains["KPOS"])
+    chunks = [({name : value[start:start + chunk_size] for name, value in gains.items()}, kwargs)
+              for start in range(0, count, chunk_size)]
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if workers <= 1 or len(chunks) == 1:
+        results = [_simulate_chunk(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers = workers) as executor:
+            results = list(executor.map(_simulate_chunk, chunks))
+    return {key : np.concatenate([r[key] for r in results]) for key in results[0]}
+
+
+if __name__ == "__main__":
+    import time
+
+    grid = gain_grid(KGYROANGLE = np.linspace(6, 24, 10),
+                     KGYROSPEED = np.linspace(0.4, 2.0, 9),
+                     KPOS       = np.linspace(0.02, 0.14, 7),
+                     KSPEED     = np.linspace(0.04, 0.2, 5))
+
+    start = time.time()
+    results = sweep(grid)
+    print("Simulated %d gain sets in %.2f seconds." % (len(grid["KPOS"]), time.time() - start))
+    print("%d gain sets balanced." % np.count_nonzero(results["stable"]))
+
+    order = np.lexsort((results["settle"], -results["margin"]))
+    print("")
+    print("KGYROANGLE KGYROSPEED   KPOS  KSPEED   margin(dB) settle(s) drift(mm/s)")
+    for i in order[:10]:
+        print("%10.2f %10.2f %6.3f %7.3f %12.1f %9.2f %11.1f" % (grid["KGYROANGLE"][i], grid["KGYROSPEED"][i], grid["KPOS"][i],
+              grid["KSPEED"][i], results["margin"][i], results["settle"][i], results["drift"][i]))
@@ -0,0 +1,43 @@
+from __future__ import division
+
+import numpy as np
+
+import balance_control
+import balance_sim
+
+
+def test_default_gains_balance():
+    results = balance_sim.simulate(balance_sim.make_gains())
+    assert(results["stable"][0])
+    assert(results["margin"][0] > 0)
+    assert(results["settle"][0] < 5)
+
+
+def test_no_gyro_gains_fall():
+    results = balance_sim.simulate(balance_sim.make_gains(KGYROANGLE = 0, KGYROSPEED = 0))
+    assert(not results["stable"][0])
+    assert(results["margin"][0] == 0)
+
+
+def test_sweep_matches_simulate():
+    gains = balance_sim.gain_grid(KGYROANGLE = [10, 14, 18], KPOS = [0.05, 0.07])
+    swept = balance_sim.sweep(gains, workers = 1, chunk_size = 4, duration = 2)
+    simulated = balance_sim.simulate(gains, duration = 2)
+    for key in simulated:
+        assert(np.array_equal(swept[key], simulated[key]))
+
+
+def test_control_on_arrays():
+    # the simulator runs the balance loop on arrays, BalanceBot.py on numbers
+    gOffset = np.array([1.0, 2.0])
+    gyroAngle = np.array([0.5, -0.5])
+    new_offset, new_angle = balance_control.update_gyro(3, gOffset, gyroAngle, 0.01, 0.01, 0.25)
+    assert(list(gOffset) == [1.0, 2.0] and list(gyroAngle) == [0.5, -0.5]) # not changed in place
+    for i in range(2):
+        assert((new_offset[i], new_angle[i]) == balance_control.update_gyro(3, gOffset[i], gyroAngle[i], 0.01, 0.01, 0.25))
+
+if __name__ == '__main__':
+    test_default_gains_balance()
+    test_no_gyro_gains_fall()
+    test_sweep_matches_simulate()
+    test_control_on_arrays()
@@ -13,7 +13,7 @@
 # 
 # Results: Place an unsolved Rubik's cube into the solver, and run this program.
 #     The robot will turn the cube to each face and the camera will take pictures.
-#     The Raspberry Pi will use rubiks-cube-tracker and rubiks-color-resolver to
+#     The Raspberry Pi will use rubiks-cube-tracker and brickuber_colors to
 #     determine the cube configuration from the six pictures. The cube configuration
 #     will get passed to kociemba to find an efficient solution. Once a solution is
 #     generated, the robot will execute the moves to solve the Rubik's cube.
@@ -22,8 +22,8 @@ from __future__ import print_function # use python 3 syntax but make it compatib
 from __future__ import division       #                           ''
 
 import time          # import the time library for the sleep function
-import brickuber_lib # Rubik's cube move and read
-import kociemba      # Rubik's cube solver
+import brickuber_lib    # Rubik's cube move and read
+import brickuber_solver # Rubik's cube solver (kociemba), running in the background
 
 # Use this line if using the NXT1 mindcuber design
 # RobotStyle = "NXT1"
@@ -34,6 +34,9 @@ RobotStyle = "EV3"
 # Print debug information?
 PrintDebugInfo = True
 
+# Start the solver first, so that it is ready by the time the cube has been scanned.
+Solver = brickuber_solver.SolverService()
+
 Cuber = brickuber_lib.BricKuberLib(RobotStyle, PrintDebugInfo)
 
 try:
@@ -48,7 +51,8 @@ try:
     # Use kociemba to solve the cube based on the configuration string.
     if PrintDebugInfo:
         print("Using kociemba to compute an efficient solve solution.")
-    SolutionCmds = kociemba.solve(UnsolvedString)
+    with Cuber.profiler.span("solve", brickuber_lib.EXTERNAL):
+        SolutionCmds = Solver.solve(UnsolvedString)
     if PrintDebugInfo:
         print(SolutionCmds)
     
@@ -67,3 +71,10 @@ except Exception as e:
 
 # Unconfigure the sensors, disable the motors, and restore the LED to the control of the BrickPi3 firmware.
 Cuber.BP.reset_all()
+Cuber.camera.stop()
+Solver.stop()
+
+# Save where the time went. Open the trace in https://ui.perfetto.dev to see every motion and encoder reading.
+Cuber.write_trace("/tmp/BricKuber_trace.json")
+if PrintDebugInfo:
+    Cuber.print_profile()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+#
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2017 Dexter Industries
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information, see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# This code captures pictures of the Rubik's cube faces and finds the sticker colors.
+#
+# The camera is started once and kept running, and each picture is captured straight into memory. Finding
+# the sticker colors in a picture (with rubiks-cube-tracker) runs on a worker thread, so the robot can
+# carry on flipping the cube to the next face while the previous picture is analyzed.
+#
+# Where the pictures come from is pluggable: PiCameraSource uses the Raspberry Pi camera, and FileSource
+# reads stored pictures (e.g. for testing without the robot).
+
+from __future__ import print_function # use python 3 syntax but make it compatible with python 2
+from __future__ import division       #                           ''
+
+from concurrent.futures import ThreadPoolExecutor
+
+# the index and name rubiks-cube-tracker uses for each face, in the order they are read
+FACE_SIDES = {
+    "top"    : (0, "U"),
+    "left"   : (1, "L"),
+    "front"  : (2, "F"),
+    "right"  : (3, "R"),
+    "back"   : (4, "B"),
+    "bottom" : (5, "D"),
+}
+
+IMAGE_SIZE = (300, 300) # width and height of the pictures, in pixels
+
+
+class PiCameraSource(object):
+    """
+    Captures pictures from the Raspberry Pi camera, keeping the camera running between pictures
+    """
+
+    def __init__(self, size = IMAGE_SIZE, sharpness = 0):
+        """
+        Keyword arguments:
+        size -- the picture width and height in pixels
+        sharpness -- the camera sharpening (0 is none, the same as raspistill --sharpness -100)
+        """
+        self.size = size
+        self.sharpness = sharpness
+        self.camera = None
+
+    def start(self):
+        """
+        Start the camera, if it isn't already running
+        """
+        if self.camera is None:
+            from picamera2 import Picamera2 # only needed on the robot
+            self.camera = Picamera2()
+            self.camera.configure(self.camera.create_still_configuration(main = {"size" : self.size, "format" : "RGB888"}))
+            self.camera.set_controls({"Sharpness" : self.sharpness})
+            self.camera.start()
+
+    def capture(self, face):
+        """
+        Capture a picture
+
+        Keyword arguments:
+        face -- the name of the face being captured (see FACE_SIDES)
+
+        Returns:
+        the picture as a numpy array of BGR pixels (as used by OpenCV)
+        """
+        self.start()
+        return self.camera.capture_array()
+
+    def stop(self):
+        """
+        Stop the camera
+        """
+        if self.camera is not None:
+            self.camera.stop()
+            self.camera.close()
+            self.camera = None
+
+
+class FileSource(object):
+    """
+    Reads stored pictures instead of using the camera
+    """
+
+    def __init__(self, filename = "/tmp/BricKuber_{}_face.jpg"):
+        """
+        Keyword arguments:
+        filename -- the picture file name, with {} in place of the face name
+        """
+        self.filename = filename
+
+    def start(self):
+        pass
+
+    def capture(self, face):
+        import cv2
+        image = cv2.imread(self.filename.format(face))
+        if image is None:
+            raise IOError("Could not read " + self.filename.format(face))
+        return image
+
+    def stop(self):
+        pass
+
+
+def find_sticker_colors(image, face):
+    """
+    Find the RGB color of each of the 9 stickers in a picture of a face, with rubiks-cube-tracker
+
+    Keyword arguments:
+    image -- the picture as a numpy array of BGR pixels
+    face -- the name of the face in the picture (see FACE_SIDES)
+
+    Returns:
+    dictionary of sticker number and [R, G, B] pairs, numbered the same as rubiks-cube-tracker
+    """
+    from rubikscubetracker import RubiksImage # only needed on the robot
+    side_index, side_name = FACE_SIDES[face]
+    rimg = RubiksImage(side_index, side_name)
+    rimg.image = image
+    rimg.analyze(webcam = False)
+    return dict((int(square), list(rgb)) for square, rgb in rimg.data.items())
+
+
+class CaptureService(object):
+    """
+    Captures pictures of the cube faces, and finds the sticker colors in the background
+    """
+
+    def __init__(self, source = None, extract = find_sticker_colors):
+        """
+        Keyword arguments:
+        source -- where the pictures come from. Defaults to a PiCameraSource.
+        extract -- the function used to find the sticker colors in a picture (see find_sticker_colors)
+        """
+        self.source = source if source is not None else PiCameraSource()
+        self.extract = extract
+        self.worker = ThreadPoolExecutor(max_workers = 1)
+        self.pending = []
+
+    def start(self):
+        """
+        Start the picture source, so that the first capture doesn't have to wait for it
+        """
+        self.source.start()
+
+    def capture(self, face):
+        """
+        Capture a picture of a face, and start finding the sticker colors in the background
+
+        Returns once the picture has been captured, so the cube can be moved straight away.
+
+        Keyword arguments:
+        face -- the name of the face being captured (see FACE_SIDES)
+
+        Returns:
+        a future for the sticker colors (see find_sticker_colors)
+        """
+        if face not in FACE_SIDES:
+            raise ValueError(face)
+        image = self.source.capture(face)
+        future = self.worker.submit(self.extract, image, face)
+        self.pending.append(future)
+        return future
+
+    def wait(self):
+        """
+        Wait for all the captured faces to be analyzed
+
+        Returns:
+        dictionary of sticker number and [R, G, B] pairs for all the captured faces
+        """
+        rgb_values = {}
+        for future in self.pending:
+            rgb_values.update(future.result())
+        self.pending = []
+        return rgb_values
+
+    def stop(self):
+        """
+        Stop the picture source and the worker thread
+        """
+        self.worker.shutdown()
+        self.source.stop()
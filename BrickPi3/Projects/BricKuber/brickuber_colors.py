@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+#
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2017 Dexter Industries
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information, see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# This code works out which of the six colors each of the 54 Rubik's cube stickers is, from the RGB values
+# read by the camera, and returns the cube as a kociemba facelet string.
+#
+# The RGB values are converted to the CIE Lab color space (where distances match how different colors
+# look), and grouped into six colors of exactly nine stickers each, starting from the center stickers. The
+# result is checked to be a cube that can actually be solved before it is returned.
+#
+# Run this file with a JSON file of recorded RGB values (as saved by BricKuberLib.ReadCubeColors) to compare
+# the time taken with running rubiks-color-resolver:
+#
+#     python brickuber_colors.py /tmp/BricKuber_rgb.json
+#
+# The scans directory has example scans of known cubes (see test_brickuber_colors.py):
+#
+#     python brickuber_colors.py scans/*.json
+
+from __future__ import print_function # use python 3 syntax but make it compatible with python 2
+from __future__ import division       #                           ''
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+# the order of the faces in the RGB values (sticker numbers 1-9 are U, 10-18 are L, etc.)
+SCAN_ORDER = "ULFRBD"
+
+# the order of the faces in a kociemba facelet string
+KOCIEMBA_ORDER = "URFDLB"
+
+# the sticker number of each center sticker, starting from 0
+CENTERS = [face * 9 + 4 for face in range(6)]
+
+# facelets of each corner and edge in a kociemba facelet string (URF, UFL, ULB, UBR, DFR, DLF, DBL, DRB and
+# UR, UF, UL, UB, DR, DF, DL, DB, FR, FL, BL, BR), and the colors of the corners and edges of a solved cube
+_U, _R, _F, _D, _L, _B = [9 * f for f in range(6)]
+CORNER_FACELETS = [[_U + 8, _R + 0, _F + 2], [_U + 6, _F + 0, _L + 2], [_U + 0, _L + 0, _B + 2], [_U + 2, _B + 0, _R + 2],
+                   [_D + 2, _F + 8, _R + 6], [_D + 0, _L + 8, _F + 6], [_D + 6, _B + 8, _L + 6], [_D + 8, _R + 8, _B + 6]]
+EDGE_FACELETS = [[_U + 5, _R + 1], [_U + 7, _F + 1], [_U + 3, _L + 1], [_U + 1, _B + 1], [_D + 5, _R + 7], [_D + 1, _F + 7],
+                 [_D + 3, _L + 7], [_D + 7, _B + 7], [_F + 5, _R + 3], [_F + 3, _L + 5], [_B + 5, _L + 3], [_B + 3, _R + 5]]
+CORNER_COLORS = ["URF", "UFL", "ULB", "UBR", "DFR", "DLF", "DBL", "DRB"]
+EDGE_COLORS = ["UR", "UF", "UL", "UB", "DR", "DF", "DL", "DB", "FR", "FL", "BL", "BR"]
+
+MAX_ITERATIONS = 10
+
+# sRGB to XYZ (D65) matrix, and the D65 white point
+_RGB_TO_XYZ = np.array([[0.4124564, 0.3575761, 0.1804375],
+                        [0.2126729, 0.7151522, 0.0721750],
+                        [0.0193339, 0.1191920, 0.9503041]])
+_WHITE = np.array([0.95047, 1.0, 1.08883])
+
+
+def rgb_to_lab(rgb):
+    """
+    Convert RGB colors to CIE Lab
+
+    Keyword arguments:
+    rgb -- array of shape (n, 3) of RGB values from 0 to 255
+
+    Returns:
+    array of shape (n, 3) of L, a, b values
+    """
+    rgb = np.asarray(rgb, dtype = float) / 255
+    linear = np.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+    xyz = linear.dot(_RGB_TO_XYZ.T) / _WHITE
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack([116 * f[:, 1] - 16, 500 * (f[:, 0] - f[:, 1]), 200 * (f[:, 1] - f[:, 2])], axis = 1)
+
+
+def cluster(lab):
+    """
+    Group 54 sticker colors into six colors of nine stickers each
+
+    Keyword arguments:
+    lab -- array of shape (54, 3) of sticker colors, in the scan order
+
+    Returns:
+    array of 54 color numbers. Color n is the color of the center sticker of face n (in the scan order).
+    """
+    means = lab[CENTERS]
+    labels = None
+    for iteration in range(MAX_ITERATIONS):
+        # assign the stickers to 6 x 9 slots, minimizing the total distance to the color means
+        distances = ((lab[:, None, :] - means[None, :, :]) ** 2).sum(axis = 2)
+        distances[CENTERS] = np.inf
+        distances[CENTERS, range(6)] = 0 # center stickers always belong to their own color
+        stickers, slots = linear_sum_assignment(np.repeat(distances, 9, axis = 1))
+        new_labels = np.empty(54, dtype = int)
+        new_labels[stickers] = slots // 9
+        if labels is not None and (new_labels == labels).all():
+            break
+        labels = new_labels
+        means = np.array([lab[labels == color].mean(axis = 0) for color in range(6)])
+    return labels
+
+
+def to_facelets(labels):
+    """
+    Build a kociemba facelet string from the color numbers of the stickers (see cluster)
+    """
+    names = [SCAN_ORDER[color] for color in labels]
+    return "".join("".join(names[SCAN_ORDER.index(face) * 9:SCAN_ORDER.index(face) * 9 + 9]) for face in KOCIEMBA_ORDER)
+
+
+def _parity(permutation):
+    parity = 0
+    for i in range(len(permutation)):
+        for j in range(i):
+            if permutation[j] > permutation[i]:
+                parity += 1
+    return parity % 2
+
+
+def validate(facelets):
+    """
+    Check that a kociemba facelet string is a cube that can be solved
+
+    Keyword arguments:
+    facelets -- the 54 character facelet string
+
+    Raises ValueError if it isn't.
+    """
+    if len(facelets) != 54:
+        raise ValueError("Facelet string must be 54 characters long")
+    for face in KOCIEMBA_ORDER:
+        if facelets.count(face) != 9:
+            raise ValueError("There must be 9 stickers of each color, not %d of %s" % (facelets.count(face), face))
+    if "".join(facelets[9 * f + 4] for f in range(6)) != KOCIEMBA_ORDER:
+        raise ValueError("The center stickers are in the wrong order")
+
+    corners, twist = [], 0
+    for facelet in CORNER_FACELETS:
+        colors = [facelets[i] for i in facelet]
+        orientation = [o for o in range(3) if colors[o] in "UD"]
+        if len(orientation) != 1:
+            raise ValueError("Impossible corner " + "".join(colors))
+        o = orientation[0]
+        piece = colors[o] + colors[(o + 1) % 3] + colors[(o + 2) % 3]
+        if piece not in CORNER_COLORS:
+            raise ValueError("Impossible corner " + "".join(colors))
+        corners.append(CORNER_COLORS.index(piece))
+        twist += o
+
+    edges, flip = [], 0
+    for facelet in EDGE_FACELETS:
+        colors = "".join(facelets[i] for i in facelet)
+        if colors in EDGE_COLORS:
+            edges.append(EDGE_COLORS.index(colors))
+        elif colors[::-1] in EDGE_COLORS:
+            edges.append(EDGE_COLORS.index(colors[::-1]))
+            flip += 1
+        else:
+            raise ValueError("Impossible edge " + colors)
+
+    if len(set(corners)) != 8:
+        raise ValueError("Some corners are missing or duplicated")
+    if len(set(edges)) != 12:
+        raise ValueError("Some edges are missing or duplicated")
+    if twist % 3 != 0:
+        raise ValueError("A corner is twisted")
+    if flip % 2 != 0:
+        raise ValueError("An edge is flipped")
+    if _parity(corners) != _parity(edges):
+        raise ValueError("Two pieces are swapped")
+
+
+def resolve_colors(rgb_values):
+    """
+    Work out the cube configuration from the sticker RGB values
+
+    Keyword arguments:
+    rgb_values -- dictionary of sticker number (1 to 54, in the scan order) and [R, G, B] pairs, as read by
+        BricKuberLib.CameraReadFaceColors
+
+    Returns:
+    kociemba facelet string
+
+    Raises ValueError if the colors don't make a cube that can be solved.
+    """
+    rgb = np.array([rgb_values[square] for square in range(1, 55)], dtype = float)
+    facelets = to_facelets(cluster(rgb_to_lab(rgb)))
+    validate(facelets)
+    return facelets
+
+
+def resolve_colors_subprocess(rgb_values):
+    """
+    Work out the cube configuration with rubiks-color-resolver, for comparison
+    """
+    import json
+    import subprocess
+    cmd = ['rubiks-color-resolver.py', '--rgb', json.dumps(rgb_values)]
+    return subprocess.check_output(cmd).decode("utf-8").strip()
+
+
+if __name__ == "__main__":
+    import sys
+    import json
+    import time
+
+    for filename in sys.argv[1:]:
+        with open(filename) as f:
+            rgb_values = dict((int(square), rgb) for square, rgb in json.load(f).items())
+
+        start = time.time()
+        result = resolve_colors(rgb_values)
+        elapsed = time.time() - start
+        print("%s: %s in %.1f ms" % (filename, result, elapsed * 1000))
+
+        try:
+            start = time.time()
+            other = resolve_colors_subprocess(rgb_values)
+            elapsed = time.time() - start
+            print("%s: %s in %.1f ms with rubiks-color-resolver%s" % (filename, other, elapsed * 1000,
+                  "" if other == result else " (different result)"))
+        except OSError:
+            print("rubiks-color-resolver is not installed")
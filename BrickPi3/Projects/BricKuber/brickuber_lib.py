@@ -15,11 +15,22 @@ from __future__ import division       #                           ''
 import json
 import time     # import the time library for the sleep function
 import brickpi3 # import the BrickPi3 drivers
-import subprocess
+import brickuber_planner # plan the flips and spins for a whole solution
+import brickuber_camera  # capture and analyze pictures of the cube faces
+import brickuber_colors  # work out the cube configuration from the sticker colors
+import brickuber_profiler # record where the time goes
+from brickuber_profiler import PRIMITIVE, MOTION, SETTLE, EXTERNAL
 
 debug_print_commands_on = False
 debug_motor_commands_on = False
 
+# settle detection: a motor has settled once its encoder has moved no more than SETTLE_DEGREES for
+# SETTLE_SAMPLES readings in a row (read every SETTLE_POLL_TIME seconds), or after SETTLE_TIMEOUT seconds.
+SETTLE_DEGREES   = 1
+SETTLE_SAMPLES   = 3
+SETTLE_POLL_TIME = 0.01
+SETTLE_TIMEOUT   = 0.5
+
 def debug_print_commands(string_in):
     if debug_print_commands_on:
         print(str(string_in))
@@ -38,9 +49,13 @@ class BricKuberLib(object):
     MOTOR_GRAB = 0
     MOTOR_TURN = 1
     MOTOR_PORTS = [BP.PORT_B, BP.PORT_A]
+    MOTOR_NAMES = ["grab", "turn"]
 
-    def __init__(self, robot_style, debug = False):
+    def __init__(self, robot_style, debug = False, camera_source = None):
         self.debug = debug
+        self.profiler = brickuber_profiler.Profiler()
+        self.camera = brickuber_camera.CaptureService(camera_source,
+            self.profiler.wrap(brickuber_camera.find_sticker_colors, "find sticker colors"))
         self.rgb_values = {}
 
         if robot_style == "NXT1":
@@ -58,6 +73,9 @@ class BricKuberLib(object):
             self.MOTOR_GRAB_POSITION_GRAB      = -130
             self.MOTOR_GRAB_POSITION_FLIP      = -240
 
+            # once the arm is past this position on the way to rest, it is clear of the cube and the turntable can spin
+            self.MOTOR_GRAB_POSITION_CLEAR     = -60
+
             # motor speed constants
             self.MOTOR_GRAB_SPEED_GRAB = 400
             self.MOTOR_GRAB_SPEED_FLIP = 600
@@ -77,6 +95,9 @@ class BricKuberLib(object):
             self.MOTOR_GRAB_POSITION_GRAB      = -220
             self.MOTOR_GRAB_POSITION_FLIP      = -100
 
+            # once the arm is past this position on the way to rest, it is clear of the cube and the turntable can spin
+            self.MOTOR_GRAB_POSITION_CLEAR     = -296
+
             # motor speed constants
             self.MOTOR_GRAB_SPEED_GRAB = 200
             self.MOTOR_GRAB_SPEED_FLIP = 240
@@ -86,6 +107,8 @@ class BricKuberLib(object):
 
         self.BP.set_motor_limits(self.MOTOR_PORTS[self.MOTOR_TURN], 0, ((250 * self.TurnTableGear) / self.TurnTablePinion))
 
+        self.planner = brickuber_planner.Planner(brickuber_planner.MechanicalCosts(self))
+
         self.home_all()
 
     # This function is for troubleshooting the arm motor encoder.
@@ -117,52 +140,108 @@ class BricKuberLib(object):
         debug_motor_commands("Current Position: " + str(self.BP.get_motor_encoder(self.MOTOR_PORTS[port])))
         debug_motor_commands("Running Motor: " + str(port))
 
-        self.BP.set_motor_position(self.MOTOR_PORTS[port], position)
+        with self.profiler.span("run " + self.MOTOR_NAMES[port] + " to " + str(position), MOTION, "run " + self.MOTOR_NAMES[port],
+                                target = position):
+            self.BP.set_motor_position(self.MOTOR_PORTS[port], position)
+            encoder = self.get_encoder(port)
+            while((encoder > (position + tolerance)) or (encoder < (position - tolerance))):
+                time.sleep(0.01)
+                encoder = self.get_encoder(port)
+                debug_motor_commands("Current Position: " + str(encoder))
+
+    # read a motor encoder, and record the reading in the profiler
+    def get_encoder(self, port):
         encoder = self.BP.get_motor_encoder(self.MOTOR_PORTS[port])
-        while((encoder > (position + tolerance)) or (encoder < (position - tolerance))):
-            time.sleep(0.01)
-            encoder = self.BP.get_motor_encoder(self.MOTOR_PORTS[port])
-            debug_motor_commands("Current Position: " + str(self.BP.get_motor_encoder(self.MOTOR_PORTS[port])))
+        self.profiler.sample(self.MOTOR_NAMES[port], encoder)
+        return encoder
+
+    # wait for a motor to stop moving, e.g. for the arm to finish pressing on the cube
+    def wait_settled(self, port):
+        with self.profiler.span("settle " + self.MOTOR_NAMES[port], SETTLE):
+            start = time.time()
+            EncoderLast = self.get_encoder(port)
+            samples = 0
+            while samples < SETTLE_SAMPLES and (time.time() - start) < SETTLE_TIMEOUT:
+                time.sleep(SETTLE_POLL_TIME)
+                EncoderNow = self.get_encoder(port)
+                if abs(EncoderNow - EncoderLast) <= SETTLE_DEGREES:
+                    samples += 1
+                else:
+                    samples = 0
+                EncoderLast = EncoderNow
+
+    # print the primitives and external calls in the order they ran, with the time between them when nothing was recorded
+    def print_timeline(self):
+        self.profiler.print_timeline()
+
+    # print how much time each primitive and external call took in total
+    def print_profile(self):
+        self.profiler.print_summary()
+
+    # save everything the profiler recorded as a Chrome trace, to view in https://ui.perfetto.dev
+    def write_trace(self, filename = "/tmp/BricKuber_trace.json"):
+        self.profiler.write_trace(filename)
 
     # spin the cube the specified number of degrees. Opionally overshoot and return (helps with the significant mechanical play while making a face turn).
     def spin(self, deg, overshoot = 0):
         debug_motor_commands("Start Spin!")
-        deg = deg * self.SPIN_DIRECTION      # NXT and EV3 robot styles require the turntable motor to run in different directions.
-
-        if deg < 0:
-            overshoot = -overshoot
-        self.TurnTableTarget -= (deg + overshoot)
-        self.run_to_position(self.MOTOR_TURN, ((self.TurnTableTarget * self.TurnTableGear) / self.TurnTablePinion))
-        if overshoot != 0:
-            self.TurnTableTarget += overshoot
+        with self.profiler.span("spin " + str(deg), PRIMITIVE, "spin", overshoot = overshoot):
+            deg = deg * self.SPIN_DIRECTION      # NXT and EV3 robot styles require the turntable motor to run in different directions.
+
+            if deg < 0:
+                overshoot = -overshoot
+            self.TurnTableTarget -= (deg + overshoot)
             self.run_to_position(self.MOTOR_TURN, ((self.TurnTableTarget * self.TurnTableGear) / self.TurnTablePinion))
+            if overshoot != 0:
+                self.TurnTableTarget += overshoot
+                self.run_to_position(self.MOTOR_TURN, ((self.TurnTableTarget * self.TurnTableGear) / self.TurnTablePinion))
 
     # grab the cube
     def grab(self):
-        self.BP.set_motor_limits(self.MOTOR_PORTS[self.MOTOR_GRAB], 0, self.MOTOR_GRAB_SPEED_GRAB)
-        self.run_to_position(self.MOTOR_GRAB, self.MOTOR_GRAB_POSITION_GRAB)
-        time.sleep(0.2)
+        with self.profiler.span("grab"):
+            self.BP.set_motor_limits(self.MOTOR_PORTS[self.MOTOR_GRAB], 0, self.MOTOR_GRAB_SPEED_GRAB)
+            self.run_to_position(self.MOTOR_GRAB, self.MOTOR_GRAB_POSITION_GRAB)
+            self.wait_settled(self.MOTOR_GRAB)
 
     # release the cube
     def release(self):
         debug_motor_commands("Call release")
-        self.read_encoder()
-        self.BP.set_motor_limits(self.MOTOR_PORTS[self.MOTOR_GRAB], 0, self.MOTOR_GRAB_SPEED_REST)
-        self.run_to_position(self.MOTOR_GRAB, self.MOTOR_GRAB_POSITION_REST)
+        with self.profiler.span("release"):
+            self.read_encoder()
+            self.BP.set_motor_limits(self.MOTOR_PORTS[self.MOTOR_GRAB], 0, self.MOTOR_GRAB_SPEED_REST)
+            self.run_to_position(self.MOTOR_GRAB, self.MOTOR_GRAB_POSITION_REST)
         debug_motor_commands("End release")
 
+    # release the cube, and spin it as soon as the arm is clear of the cube (without waiting for the arm to reach rest)
+    def release_and_spin(self, deg):
+        debug_motor_commands("Call release and spin")
+        with self.profiler.span("release and spin"):
+            with self.profiler.span("release (until clear)", MOTION):
+                self.BP.set_motor_limits(self.MOTOR_PORTS[self.MOTOR_GRAB], 0, self.MOTOR_GRAB_SPEED_REST)
+                self.BP.set_motor_position(self.MOTOR_PORTS[self.MOTOR_GRAB], self.MOTOR_GRAB_POSITION_REST)
+
+                # the rest position is on the clear side of MOTOR_GRAB_POSITION_CLEAR
+                direction = 1 if self.MOTOR_GRAB_POSITION_REST > self.MOTOR_GRAB_POSITION_CLEAR else -1
+                encoder = self.get_encoder(self.MOTOR_GRAB)
+                while (encoder - self.MOTOR_GRAB_POSITION_CLEAR) * direction < 0:
+                    time.sleep(0.005)
+                    encoder = self.get_encoder(self.MOTOR_GRAB)
+
+            self.spin(deg)
+            self.run_to_position(self.MOTOR_GRAB, self.MOTOR_GRAB_POSITION_REST)
+
     # flip the cube, and optionally release it afterwards
     def flip(self, release = False):
         debug_motor_commands("Call flip.")
-        self.run_to_position(self.MOTOR_GRAB, self.MOTOR_GRAB_POSITION_FLIP_PUSH)
-        time.sleep(0.05)
-        self.grab()
-        time.sleep(0.2)
+        with self.profiler.span("flip"):
+            self.run_to_position(self.MOTOR_GRAB, self.MOTOR_GRAB_POSITION_FLIP_PUSH)
+            self.wait_settled(self.MOTOR_GRAB)
+            self.grab()
 
-        self.BP.set_motor_limits(self.MOTOR_PORTS[self.MOTOR_GRAB], 0, self.MOTOR_GRAB_SPEED_FLIP)
-        self.run_to_position(self.MOTOR_GRAB, self.MOTOR_GRAB_POSITION_FLIP)
+            self.BP.set_motor_limits(self.MOTOR_PORTS[self.MOTOR_GRAB], 0, self.MOTOR_GRAB_SPEED_FLIP)
+            self.run_to_position(self.MOTOR_GRAB, self.MOTOR_GRAB_POSITION_FLIP)
 
-        self.run_to_position(self.MOTOR_GRAB, self.MOTOR_GRAB_POSITION_FLIP_PUSH)
+            self.run_to_position(self.MOTOR_GRAB, self.MOTOR_GRAB_POSITION_FLIP_PUSH)
 
         if release:
             self.release()
@@ -222,8 +301,7 @@ class BricKuberLib(object):
             # target is front
             # rotate 180 and flip
 
-            self.release()
-            self.spin(180)
+            self.release_and_spin(180)
             self.CCO[1] = self.OF(self.CCO[1])
             self.CCO[2] = self.OF(self.CCO[2])
 
@@ -235,8 +313,7 @@ class BricKuberLib(object):
             # target is right
             # rotate -90 and flip
 
-            self.release()
-            self.spin(-90)
+            self.release_and_spin(-90)
             tmp = self.CCO[2]
             self.CCO[2] = self.CCO[1]
             self.CCO[1] = self.OF(tmp)
@@ -262,8 +339,7 @@ class BricKuberLib(object):
             # target is left
             # rotate 90 and flip
 
-            self.release()
-            self.spin(90)
+            self.release_and_spin(90)
             tmp = self.CCO[1]
             self.CCO[1] = self.CCO[2]
             self.CCO[2] = self.OF(tmp)
@@ -276,72 +352,45 @@ class BricKuberLib(object):
         self.grab()
         self.spin(DegreesToTurnFace, RecoverFace)
 
-    # Execute a string of moves
+    # Execute a string of moves. The flips and spins for the whole solution are planned up front (see
+    # brickuber_planner), which takes less time than executing the moves one at a time with Move.
     def Moves(self, cmds):
-        for cmd in cmds.split():
-            self.Move(cmd)
+        with self.profiler.span("plan", EXTERNAL):
+            cost, plan, cco = self.planner.plan(cmds, self.CCO)
+        debug_print_commands("Planned " + str(len(plan)) + " primitives, estimated " + str(round(cost, 1)) + " seconds")
+        self.RunPlan(plan)
         self.run_to_position(self.MOTOR_GRAB, self.MOTOR_GRAB_POSITION_REST)
 
-    # Use the camera to read the RGB colors for each of the 9 squares on the face
+    # Execute a list of primitives from brickuber_planner
+    def RunPlan(self, plan):
+        for index, primitive in enumerate(plan):
+            if primitive[0] == "release" and index + 1 < len(plan) and plan[index + 1][0] == "spin":
+                pass # the arm is released while spinning, with release_and_spin
+            elif primitive[0] == "release":
+                self.release()
+            elif primitive[0] == "spin" and index > 0 and plan[index - 1][0] == "release":
+                self.release_and_spin(primitive[1])
+            elif primitive[0] == "spin":
+                self.spin(primitive[1])
+            elif primitive[0] == "flip":
+                self.flip()
+            elif primitive[0] == "turn":
+                self.grab()
+                self.spin(primitive[1], brickuber_planner.RECOVER_FACE)
+            self.CCO = list(brickuber_planner.apply(self.CCO, primitive))
+
+    # Use the camera to read the RGB colors for each of the 9 squares on the face. The picture is analyzed in
+    # the background, and the colors are collected into self.rgb_values by ReadCubeColors.
     def CameraReadFaceColors(self, face):
         debug_print_commands("START: Read Face Colors: " + str(face))
-        filename = '/tmp/BricKuber_{}_face.jpg'.format(face)
-        # Choose one of these. Use the one which gives consistent results with the lighting available.
-        # subprocess.run(['raspistill', '-w', '300', '-h', '300', '-t', '1', '--imxfx', 'cartoon', '-o', filename])
-        # subprocess.run(['raspistill', '-w', '300', '-h', '300', '-t', '1', '--sharpness', '-100', '--awb', 'auto', '--imxfx', 'cartoon', '-o', filename])
-        # subprocess.run(['raspistill', '-w', '300', '-h', '300', '-t', '1', '--imxfx', 'cartoon', '-o', filename])
-        subprocess.run(['raspistill', '-w', '300', '-h', '300', '-t', '1', '--sharpness', '-100', '-o', filename])
-
-
+        with self.profiler.span("capture " + face, EXTERNAL, "capture"):
+            self.camera.capture(face)
         debug_print_commands("Picture taken")
-        if face == "top":
-            side_index = 0
-            side_name = "U"
-        elif face == "left":
-            side_index = 1
-            side_name = "L"
-        elif face == "front":
-            side_index = 2
-            side_name = "F"
-        elif face == "right":
-            side_index = 3
-            side_name = "R"
-        elif face == "back":
-            side_index = 4
-            side_name = "B"
-        elif face == "bottom":
-            side_index = 5
-            side_name = "D"
-        else:
-            raise ValueError(face)
-
-        cmd = ['rubiks-cube-tracker.py', '--filename', filename, '--index', str(side_index), '--name', side_name]
-        raw_result = subprocess.check_output(cmd).decode("utf-8")
-
-        # raw_result will be a JSON string where the key is the square number and
-        # the value is a tuple of RGB ints
-        # {
-        #   "1": [234, 126, 92],
-        #   "2": [253, 246, 253],
-        #   "3": [253, 254, 252],
-        #   "4": [232, 123, 89],
-        #   "5": [34, 87, 189],
-        #   "6": [253, 252, 159],
-        #   "7": [230, 118, 87],
-        #   "8": [37, 85, 185],
-        #   "9": [253, 172, 131]
-        # }
-        raw_data = json.loads(raw_result)
-        debug_print_commands(raw_data)
-
-        for square, rgb in raw_data.items():
-            self.rgb_values[int(square)] = rgb
-
-        debug_print_commands("END: Read Face Colors")
 
     # Read the entire cube, and retun the result as a string that can be fed directly into kociemba.
     def ReadCubeColors(self):
         self.rgb_values = {}
+        self.camera.start()
         self.release()
         self.CameraReadFaceColors("top")
         self.flip(True)
@@ -349,22 +398,26 @@ class BricKuberLib(object):
         self.flip(True)
         self.CameraReadFaceColors("bottom")
         self.spin(90)
-        self.flip(True)
-        self.spin(180)
+        self.flip()
+        self.release_and_spin(180)
         self.CameraReadFaceColors("right")
         self.spin(90)
-        self.flip(True)
-        self.spin(-90)
+        self.flip()
+        self.release_and_spin(-90)
         self.CameraReadFaceColors("back")
         self.spin(90)
-        self.flip(True)
-        self.spin(-90)
+        self.flip()
+        self.release_and_spin(-90)
         self.CameraReadFaceColors("left")
         self.CCO = [5, 3, 1]
 
-        cmd = ['rubiks-color-resolver.py', '--rgb', json.dumps(self.rgb_values)]
+        with self.profiler.span("wait for sticker colors", EXTERNAL):
+            self.rgb_values = self.camera.wait()
+        debug_print_commands(self.rgb_values)
 
-        if self.debug:
-            print(cmd)
+        # save the colors, so that brickuber_colors can be tested and benchmarked with them later
+        with open('/tmp/BricKuber_rgb.json', 'w') as f:
+            json.dump(self.rgb_values, f)
 
-        return subprocess.check_output(cmd).decode("utf-8")
+        with self.profiler.span("resolve colors", EXTERNAL):
+            return brickuber_colors.resolve_colors(self.rgb_values)
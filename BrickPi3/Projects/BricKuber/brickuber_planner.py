@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+#
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2017 Dexter Industries
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information, see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# This code plans how the Rubik's cube solving robot executes a whole kociemba solution.
+#
+# The robot can only turn the face that is on the bottom, so before every move the cube has to be flipped
+# and spun until the face to turn is on the bottom. BricKuberLib.Move does that one move at a time. This
+# planner looks at the whole solution instead: for every move it considers all four ways the cube can sit
+# with that face on the bottom, and picks the sequence of flips, spins, grabs and releases that takes the
+# least time overall, based on how long each mechanical primitive takes.
+#
+# A plan is a list of primitives:
+#     ("release",)            move the arm to the rest position
+#     ("spin", degrees)       spin the whole cube (the arm must be at rest)
+#     ("flip",)               flip the cube
+#     ("turn", degrees)       grab the cube and turn the bottom face
+
+from __future__ import print_function # use python 3 syntax but make it compatible with python 2
+from __future__ import division       #                           ''
+
+import heapq
+
+# faces, in the same numbering as BricKuberLib
+FACES = "UFRDBL"
+
+# arm states. The arm is at rest after a release, at the flip push position after a flip, and holding the
+# cube after a face turn.
+ARM_REST = "rest"
+ARM_PUSH = "push"
+ARM_GRAB = "grab"
+
+RECOVER_FACE = 22 # degrees of turntable overshoot used when turning a face (see BricKuberLib.Move)
+TURNTABLE_DPS = 250 # turntable speed limit, in degrees per second of the turntable (see BricKuberLib.__init__)
+SETTLE_TIME = 0.01 # time taken by run_to_position to notice the motor reached the target
+ARM_SETTLE_TIME = 0.03 # time taken by BricKuberLib.wait_settled once the arm reached the target
+
+
+# Return Opposite Face.
+def OF(f):
+    if f < 3:
+        return f + 3
+    return f - 3
+
+
+# The effect of each primitive on the cube orientation. An orientation is a tuple of the faces facing up,
+# front and right (as BricKuberLib.CCO).
+def flipped(cco):
+    return (cco[1], OF(cco[0]), cco[2])
+
+def spun(cco, deg):
+    if deg == 90:
+        return (cco[0], cco[2], OF(cco[1]))
+    elif deg == -90:
+        return (cco[0], OF(cco[2]), cco[1])
+    return (cco[0], OF(cco[1]), OF(cco[2]))
+
+def bottom(cco):
+    return OF(cco[0])
+
+
+def parse_move(cmd):
+    """
+    Parse a kociemba move
+
+    Keyword arguments:
+    cmd -- the move, e.g. "U", "F'" or "R2"
+
+    Returns:
+    (face to turn, degrees to turn the turntable)
+    """
+    face = FACES.find(cmd[0])
+    if face < 0:
+        raise ValueError("Unknown move " + cmd)
+    if cmd.find("'") != -1:
+        return face, 90
+    elif cmd.find("2") != -1:
+        return face, -180
+    return face, -90
+
+
+class MechanicalCosts(object):
+    """
+    Estimated time in seconds taken by each mechanical primitive
+
+    The estimates are based on the arm positions and speeds of the robot (a BricKuberLib, or any object with
+    the same MOTOR_GRAB_POSITION_* and MOTOR_GRAB_SPEED_* attributes), and include the time BricKuberLib.grab
+    and BricKuberLib.flip wait for the arm to settle.
+    """
+
+    def __init__(self, robot):
+        self.robot = robot
+        self.positions = {ARM_REST : robot.MOTOR_GRAB_POSITION_REST,
+                          ARM_PUSH : robot.MOTOR_GRAB_POSITION_FLIP_PUSH,
+                          ARM_GRAB : robot.MOTOR_GRAB_POSITION_GRAB}
+
+    def arm(self, start, end, speed):
+        return abs(end - start) / speed + SETTLE_TIME
+
+    def release(self, arm):
+        r = self.robot
+        return self.arm(self.positions[arm], r.MOTOR_GRAB_POSITION_REST, r.MOTOR_GRAB_SPEED_REST)
+
+    def grab(self, arm):
+        r = self.robot
+        return self.arm(self.positions[arm], r.MOTOR_GRAB_POSITION_GRAB, r.MOTOR_GRAB_SPEED_GRAB) + ARM_SETTLE_TIME
+
+    def flip(self, arm):
+        r = self.robot
+        return (self.arm(self.positions[arm], r.MOTOR_GRAB_POSITION_FLIP_PUSH, r.MOTOR_GRAB_SPEED_REST) + ARM_SETTLE_TIME +
+                self.grab(ARM_PUSH) +
+                self.arm(r.MOTOR_GRAB_POSITION_GRAB, r.MOTOR_GRAB_POSITION_FLIP, r.MOTOR_GRAB_SPEED_FLIP) +
+                self.arm(r.MOTOR_GRAB_POSITION_FLIP, r.MOTOR_GRAB_POSITION_FLIP_PUSH, r.MOTOR_GRAB_SPEED_FLIP))
+
+    def spin(self, deg, overshoot = 0):
+        time = abs(deg) / TURNTABLE_DPS + SETTLE_TIME
+        if overshoot:
+            time += 2 * overshoot / TURNTABLE_DPS + SETTLE_TIME
+        return time
+
+    def turn(self, arm, deg):
+        return self.grab(arm) + self.spin(deg, RECOVER_FACE)
+
+    def primitive(self, arm, primitive):
+        # the cost of a primitive, starting with the arm in the specified state
+        if primitive[0] == "release":
+            return self.release(arm)
+        elif primitive[0] == "spin":
+            return self.spin(primitive[1])
+        elif primitive[0] == "flip":
+            return self.flip(arm)
+        return self.turn(arm, primitive[1])
+
+
+def arm_after(arm, primitive):
+    if primitive[0] == "release":
+        return ARM_REST
+    elif primitive[0] == "flip":
+        return ARM_PUSH
+    elif primitive[0] == "turn":
+        return ARM_GRAB
+    return arm
+
+
+def apply(cco, primitive):
+    """
+    Return the cube orientation after a primitive
+    """
+    if primitive[0] == "flip":
+        return flipped(cco)
+    elif primitive[0] == "spin":
+        return spun(cco, primitive[1])
+    return cco
+
+
+class Planner(object):
+    """
+    Plans the cheapest sequence of primitives for a whole solution
+    """
+
+    def __init__(self, costs):
+        """
+        Keyword arguments:
+        costs -- a MechanicalCosts instance
+        """
+        self.costs = costs
+        self._reorient_cache = {}
+
+    def reorient(self, cco, arm):
+        """
+        Find the cheapest way to get from one orientation to every other orientation
+
+        Keyword arguments:
+        cco -- the starting cube orientation
+        arm -- the starting arm state
+
+        Returns:
+        dictionary keyed by (orientation, arm state) of (cost, list of primitives)
+        """
+        key = (tuple(cco), arm)
+        if key in self._reorient_cache:
+            return self._reorient_cache[key]
+
+        # Dijkstra over the 24 orientations x 3 arm states
+        best = {key : (0, [])}
+        queue = [(0, 0, key, [])]
+        count = 0
+        while queue:
+            cost, _, state, plan = heapq.heappop(queue)
+            if cost > best[state][0]:
+                continue
+            state_cco, state_arm = state
+            if state_arm == ARM_REST:
+                primitives = [("flip",), ("spin", 90), ("spin", -90), ("spin", 180)]
+            else:
+                primitives = [("flip",), ("release",)]
+            for primitive in primitives:
+                new = (apply(state_cco, primitive), arm_after(state_arm, primitive))
+                new_cost = cost + self.costs.primitive(state_arm, primitive)
+                if new not in best or new_cost < best[new][0]:
+                    best[new] = (new_cost, plan + [primitive])
+                    count += 1
+                    heapq.heappush(queue, (new_cost, count, new, plan + [primitive]))
+
+        self._reorient_cache[key] = best
+        return best
+
+    def plan(self, cmds, cco = (0, 1, 2), arm = ARM_REST):
+        """
+        Plan a whole solution
+
+        Keyword arguments:
+        cmds -- the kociemba solution string, e.g. "R U2 F' D"
+        cco -- the cube orientation at the start
+        arm -- the arm state at the start
+
+        Returns:
+        (estimated time in seconds, list of primitives, cube orientation at the end)
+        """
+        moves = [parse_move(cmd) for cmd in cmds.split()]
+
+        # dynamic programming over the moves. After each move the arm is holding the cube, and the cube is
+        # in one of the four orientations with the turned face on the bottom.
+        options = {(tuple(cco), arm) : (0, [])}
+        for face, deg in moves:
+            new_options = {}
+            for (start_cco, start_arm), (cost, plan) in options.items():
+                for (end_cco, end_arm), (move_cost, move_plan) in self.reorient(start_cco, start_arm).items():
+                    if bottom(end_cco) != face:
+                        continue
+                    total = cost + move_cost + self.costs.turn(end_arm, deg)
+                    key = (end_cco, ARM_GRAB)
+                    if key not in new_options or total < new_options[key][0]:
+                        new_options[key] = (total, plan + move_plan + [("turn", deg)])
+            options = new_options
+
+        (end_cco, end_arm), (cost, plan) = min(options.items(), key = lambda option: option[1][0])
+        return cost, plan, end_cco
+
+
+def greedy_plan(cmds, cco = (0, 1, 2)):
+    """
+    Return the primitives BricKuberLib.Move would execute for each move of a solution, for comparison
+    """
+    plan = []
+    cco = tuple(cco)
+    for cmd in cmds.split():
+        face, deg = parse_move(cmd)
+        if face == cco[0]:
+            steps = [("flip",), ("flip",)]
+        elif face == cco[1]:
+            steps = [("release",), ("spin", 180), ("flip",)]
+        elif face == cco[2]:
+            steps = [("release",), ("spin", -90), ("flip",)]
+        elif face == OF(cco[1]):
+            steps = [("flip",)]
+        elif face == OF(cco[2]):
+            steps = [("release",), ("spin", 90), ("flip",)]
+        else:
+            steps = []
+        for step in steps:
+            cco = apply(cco, step)
+        plan += steps + [("turn", deg)]
+    return plan
+
+
+def plan_cost(costs, plan, arm = ARM_REST):
+    """
+    Return the estimated time in seconds to execute a plan
+    """
+    total = 0
+    for primitive in plan:
+        total += costs.primitive(arm, primitive)
+        arm = arm_after(arm, primitive)
+    return total
+
+
+if __name__ == "__main__":
+    # compare the planner with BricKuberLib.Move, using the EV3 robot style constants
+    class EV3(object):
+        MOTOR_GRAB_POSITION_REST      = -312
+        MOTOR_GRAB_POSITION_FLIP_PUSH = -280
+        MOTOR_GRAB_POSITION_GRAB      = -220
+        MOTOR_GRAB_POSITION_FLIP      = -100
+        MOTOR_GRAB_SPEED_GRAB = 200
+        MOTOR_GRAB_SPEED_FLIP = 240
+        MOTOR_GRAB_SPEED_REST = 160
+
+    costs = MechanicalCosts(EV3())
+    solution = "D2 R' D' F2 B D R2 D2 R' F2 D' F2 U' B2 L2 U2 D R2 U"
+    cost, plan, cco = Planner(costs).plan(solution, (5, 3, 1))
+    greedy = greedy_plan(solution, (5, 3, 1))
+    print("Solution:", solution)
+    print("Move by move: %3d primitives, %5.1f seconds" % (len(greedy), plan_cost(costs, greedy)))
+    print("Planned:      %3d primitives, %5.1f seconds" % (len(plan), cost))
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+#
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2017 Dexter Industries
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information, see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# This code records where the time goes while the Rubik's cube solving robot runs.
+#
+# Each mechanical primitive (spin, grab, flip, ...) and each call out to other code (the camera, the color
+# resolver, the solver) is recorded as a span with a start and end time. Spans can be nested, e.g. the time
+# the arm takes to settle is recorded inside the grab it belongs to, and is also added up for the grab. The
+# motor encoder readings taken while waiting for the motors are recorded too.
+#
+# The recording can be saved as a Chrome trace (open it in https://ui.perfetto.dev or chrome://tracing), and
+# summarized as a table of the time taken by each primitive. As primitives can be nested (a flip grabs the
+# cube), the table has each primitive's self time, without the primitives nested in it, and those add up to
+# the time the robot spent.
+
+from __future__ import print_function # use python 3 syntax but make it compatible with python 2
+from __future__ import division       #                           ''
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+# span categories
+PRIMITIVE = "primitive" # a mechanical primitive
+MOTION    = "motion"    # running a motor to a position
+SETTLE    = "settle"    # waiting for a motor to stop moving
+EXTERNAL  = "external"  # a call out to the camera, the color resolver or the solver
+
+
+class Profiler(object):
+    """
+    Records spans and encoder readings
+    """
+
+    def __init__(self):
+        self.spans = []    # list of dictionaries with name, group, cat, start, end, thread and args
+        self.samples = []  # list of (time, motor name, encoder) tuples
+        self.local = threading.local()
+
+    def clear(self):
+        """
+        Forget everything recorded so far
+        """
+        self.spans = []
+        self.samples = []
+
+    def _stack(self):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    @contextmanager
+    def span(self, name, cat = PRIMITIVE, group = None, **args):
+        """
+        Record the time taken by a block of code
+
+        Keyword arguments:
+        name -- the name of the span, e.g. "grab" or "spin 90"
+        cat -- the span category (PRIMITIVE, MOTION, SETTLE or EXTERNAL)
+        group -- the name to add the span up under in the summary, e.g. "spin". Defaults to name.
+        args -- any other information to save with the span
+        """
+        span = {"name" : name, "group" : group or name, "cat" : cat, "start" : time.time(), "end" : None,
+                "thread" : threading.current_thread().name, "args" : dict(args, settle = 0.0)}
+        stack = self._stack()
+        stack.append(span)
+        try:
+            yield span
+        finally:
+            stack.pop()
+            span["end"] = time.time()
+            if cat == SETTLE:
+                for parent in stack:
+                    parent["args"]["settle"] += span["end"] - span["start"]
+            self.spans.append(span)
+
+    def wrap(self, function, name, cat = EXTERNAL):
+        """
+        Return a function that calls function, recording each call as a span
+        """
+        def wrapper(*args, **kwargs):
+            with self.span(name, cat):
+                return function(*args, **kwargs)
+        return wrapper
+
+    def sample(self, motor, encoder):
+        """
+        Record a motor encoder reading
+
+        Keyword arguments:
+        motor -- the name of the motor
+        encoder -- the encoder value in degrees
+        """
+        self.samples.append((time.time(), motor, encoder))
+
+    def trace(self):
+        """
+        Return the recording in the Chrome trace event format
+        """
+        first = min([span["start"] for span in self.spans] + [sample[0] for sample in self.samples] or [0])
+        threads = {}
+        events = []
+        for span in sorted(self.spans, key = lambda span: span["start"]):
+            tid = threads.setdefault(span["thread"], len(threads) + 1)
+            events.append({"name" : span["name"], "cat" : span["cat"], "ph" : "X", "pid" : 1, "tid" : tid,
+                           "ts" : (span["start"] - first) * 1e6, "dur" : (span["end"] - span["start"]) * 1e6,
+                           "args" : span["args"]})
+        for t, motor, encoder in self.samples:
+            events.append({"name" : motor + " encoder", "ph" : "C", "pid" : 1, "ts" : (t - first) * 1e6,
+                           "args" : {"degrees" : encoder}})
+        for thread, tid in threads.items():
+            events.append({"name" : "thread_name", "ph" : "M", "pid" : 1, "tid" : tid, "args" : {"name" : thread}})
+        return {"traceEvents" : events, "displayTimeUnit" : "ms"}
+
+    def write_trace(self, filename):
+        """
+        Save the recording as a Chrome trace JSON file
+        """
+        temp = filename + ".tmp"
+        with open(temp, "w") as f:
+            json.dump(self.trace(), f)
+        os.replace(temp, filename)
+
+    def summary(self, cats = (PRIMITIVE, EXTERNAL)):
+        """
+        Add up the time taken by each kind of span
+
+        Keyword arguments:
+        cats -- the span categories to include
+
+        Returns:
+        list of (name, count, self, total, mean, max, settle) tuples, with the most self time first. Times are
+        in seconds. total is the whole time taken by the spans, and self the time not taken by other spans in
+        the summary nested in them, so that self times add up to the time covered by the spans. settle is the
+        self time spent waiting for motors to settle.
+        """
+        spans = [span for span in self.spans if span["cat"] in cats]
+
+        # the time taken by the spans nested directly in each span
+        nested = dict((id(span), (0.0, 0.0)) for span in spans)
+        stacks = {}
+        for span in sorted(spans, key = lambda span: (span["start"], -span["end"])):
+            stack = stacks.setdefault(span["thread"], [])
+            while stack and stack[-1]["end"] < span["end"]:
+                stack.pop()
+            if stack:
+                time_nested, settle_nested = nested[id(stack[-1])]
+                nested[id(stack[-1])] = (time_nested + span["end"] - span["start"],
+                                         settle_nested + span["args"]["settle"])
+            stack.append(span)
+
+        totals = {}
+        for span in spans:
+            name = span["group"]
+            duration = span["end"] - span["start"]
+            time_nested, settle_nested = nested[id(span)]
+            count, own, total, longest, settle = totals.get(name, (0, 0.0, 0.0, 0.0, 0.0))
+            totals[name] = (count + 1, own + duration - time_nested, total + duration, max(longest, duration),
+                            settle + span["args"]["settle"] - settle_nested)
+        rows = [(name, count, own, total, total / count, longest, settle)
+                for name, (count, own, total, longest, settle) in totals.items()]
+        return sorted(rows, key = lambda row: -row[2])
+
+    def print_summary(self, cats = (PRIMITIVE, EXTERNAL)):
+        """
+        Print the summary table (see summary)
+        """
+        print("%-24s %6s %9s %9s %9s %9s %9s" % ("", "count", "self s", "total s", "mean ms", "max ms", "settle s"))
+        for name, count, own, total, mean, longest, settle in self.summary(cats):
+            print("%-24s %6d %9.3f %9.3f %9.1f %9.1f %9.3f" % (name, count, own, total, mean * 1000, longest * 1000, settle))
+
+    def print_timeline(self, cats = (PRIMITIVE, EXTERNAL)):
+        """
+        Print the spans in the order they started, with the time between spans when nothing was recorded
+        """
+        spans = sorted([span for span in self.spans if span["cat"] in cats], key = lambda span: span["start"])
+        if not spans:
+            return
+        first = spans[0]["start"]
+        last = first
+        for span in spans:
+            if span["start"] - last > 0.001:
+                print("%8.3f %8.3f  (idle)" % (last - first, span["start"] - last))
+            print("%8.3f %8.3f  %s" % (span["start"] - first, span["end"] - span["start"], span["name"]))
+            last = max(last, span["end"])
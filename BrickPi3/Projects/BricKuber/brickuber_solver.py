@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+#
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2017 Dexter Industries
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information, see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# This code runs the kociemba Rubik's cube solver in a background process, and remembers solutions.
+#
+# kociemba loads (or on the first run, generates) its tables the first time it solves a cube. The solver
+# process is started when the robot starts, and solves a cube straight away to load the tables, so that
+# happens while the robot is still scanning the cube. Solutions are saved in a file, so a cube that has been
+# solved before (e.g. a demo scramble) doesn't need solving again.
+
+from __future__ import print_function # use python 3 syntax but make it compatible with python 2
+from __future__ import division       #                           ''
+
+import os
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+
+CACHE_FILE = os.path.expanduser("~/.brickuber_solutions.json")
+CACHE_SIZE = 1000 # the number of solutions to remember. The least recently used are forgotten first.
+
+# a cube used to load the kociemba tables
+WARM_UP_CUBE = "DRLUUBFBRBLURRLRUBLRDDFDLFUFUFFDBRDUBRUFLLFDDBFLUBLRBD"
+
+
+def _solve(facelets):
+    import kociemba # Rubik's cube solver
+    return kociemba.solve(facelets)
+
+
+def normalize(facelets):
+    """
+    Return the facelet string in the form used as the cache key
+    """
+    return "".join(facelets.split()).upper()
+
+
+class SolutionCache(object):
+    """
+    Solutions saved in a file, keyed by the cube facelet string, with least recently used eviction
+
+    The file is saved after every change, including a cached solution being used, so that the least
+    recently used solutions are forgotten first across runs too. The methods can be called from any thread.
+    """
+
+    def __init__(self, filename = CACHE_FILE, size = CACHE_SIZE):
+        self.filename = filename
+        self.size = size
+        self.lock = threading.Lock()
+        self.solutions = OrderedDict()
+        try:
+            with open(filename) as f:
+                self.solutions = OrderedDict(json.load(f))
+        except (IOError, OSError, ValueError):
+            pass
+
+    def get(self, facelets):
+        """
+        Return the saved solution for a cube, or None
+        """
+        key = normalize(facelets)
+        with self.lock:
+            solution = self.solutions.get(key)
+            if solution is not None:
+                self.solutions.move_to_end(key)
+                self._save()
+        return solution
+
+    def put(self, facelets, solution):
+        """
+        Save a solution
+        """
+        key = normalize(facelets)
+        with self.lock:
+            self.solutions[key] = solution
+            self.solutions.move_to_end(key)
+            while len(self.solutions) > self.size:
+                self.solutions.popitem(last = False)
+            self._save()
+
+    def save(self):
+        """
+        Save the solutions to the file
+        """
+        with self.lock:
+            self._save()
+
+    def _save(self):
+        temp = self.filename + ".tmp"
+        with open(temp, "w") as f:
+            json.dump(list(self.solutions.items()), f)
+        os.replace(temp, self.filename)
+
+
+class SolverService(object):
+    """
+    Solves cubes with kociemba in a background process that is started (and warmed up) straight away
+    """
+
+    def __init__(self, cache = None):
+        """
+        Keyword arguments:
+        cache -- the SolutionCache to use. Defaults to one using CACHE_FILE.
+        """
+        self.cache = cache if cache is not None else SolutionCache()
+        self.executor = ProcessPoolExecutor(max_workers = 1)
+        self.warm = self.executor.submit(_solve, WARM_UP_CUBE)
+
+    def submit(self, facelets):
+        """
+        Start solving a cube
+
+        Keyword arguments:
+        facelets -- the kociemba facelet string
+
+        Returns:
+        a future for the solution string
+        """
+        solution = self.cache.get(facelets)
+        if solution is not None:
+            future = Future()
+            future.set_result(solution)
+            return future
+
+        future = self.executor.submit(_solve, normalize(facelets))
+        future.add_done_callback(lambda f: self._solved(facelets, f))
+        return future
+
+    def _solved(self, facelets, future):
+        if future.exception() is None:
+            self.cache.put(facelets, future.result())
+
+    def solve(self, facelets):
+        """
+        Solve a cube, and wait for the solution
+
+        Keyword arguments:
+        facelets -- the kociemba facelet string
+
+        Returns:
+        the solution string
+        """
+        return self.submit(facelets).result()
+
+    def stop(self):
+        """
+        Stop the solver process
+        """
+        self.executor.shutdown()
@@ -0,0 +1,72 @@
+from __future__ import print_function
+from __future__ import division
+
+import os
+import json
+
+from brickuber_colors import resolve_colors, validate
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# RGB scans in the format saved by BricKuberLib.ReadCubeColors, and the cube each one is of
+SCANS = {
+    "readme_scramble.json" : "DRLUUBFBRBLURRLRUBLRDDFDLFUFUFFDBRDUBRUFLLFDDBFLUBLRBD",
+    "superflip.json"       : "UBULURUFURURFRBRDRFUFLFRFDFDFDLDRDBDLULBLFLDLBUBRBLBDB",
+}
+
+SOLVED = "UUUUUUUUURRRRRRRRRFFFFFFFFFDDDDDDDDDLLLLLLLLLBBBBBBBBB"
+
+
+def load_scan(name):
+    with open(os.path.join(HERE, "scans", name)) as f:
+        return dict((int(square), rgb) for square, rgb in json.load(f).items())
+
+
+def raises(facelets, message):
+    try:
+        validate(facelets)
+    except ValueError as error:
+        return str(error) == message
+    return False
+
+
+def swap(facelets, *pairs):
+    facelets = list(facelets)
+    for a, b in pairs:
+        facelets[a], facelets[b] = facelets[b], facelets[a]
+    return "".join(facelets)
+
+
+def test_scans():
+    for name, facelets in SCANS.items():
+        assert(resolve_colors(load_scan(name)) == facelets)
+
+
+def test_validate():
+    validate(SOLVED)
+    for facelets in SCANS.values():
+        validate(facelets)
+
+
+def test_validate_twisted_corner():
+    # turn the URF corner (U9, R1, F3) in place
+    facelets = list(SOLVED)
+    facelets[8], facelets[9], facelets[20] = SOLVED[20], SOLVED[8], SOLVED[9]
+    assert(raises("".join(facelets), "A corner is twisted"))
+
+
+def test_validate_flipped_edge():
+    # flip the UR edge (U6, R2) in place
+    assert(raises(swap(SOLVED, (5, 10)), "An edge is flipped"))
+
+
+def test_validate_swapped_pair():
+    # swap the UR and UF edges
+    assert(raises(swap(SOLVED, (5, 7), (10, 19)), "Two pieces are swapped"))
+
+if __name__ == '__main__':
+    test_scans()
+    test_validate()
+    test_validate_twisted_corner()
+    test_validate_flipped_edge()
+    test_validate_swapped_pair()
@@ -0,0 +1,74 @@
+from __future__ import print_function
+from __future__ import division
+
+import random
+
+import brickuber_planner
+from brickuber_planner import Planner, MechanicalCosts, apply, arm_after, bottom, greedy_plan, parse_move, plan_cost
+
+
+class EV3(object):
+    MOTOR_GRAB_POSITION_REST      = -312
+    MOTOR_GRAB_POSITION_FLIP_PUSH = -280
+    MOTOR_GRAB_POSITION_GRAB      = -220
+    MOTOR_GRAB_POSITION_FLIP      = -100
+    MOTOR_GRAB_SPEED_GRAB = 200
+    MOTOR_GRAB_SPEED_FLIP = 240
+    MOTOR_GRAB_SPEED_REST = 160
+
+costs = MechanicalCosts(EV3())
+MOVES = [face + turn for face in brickuber_planner.FACES for turn in ["", "'", "2"]]
+
+
+def orientations():
+    # all 24 cube orientations
+    found = [(0, 1, 2)]
+    for cco in found:
+        for primitive in [("flip",), ("spin", 90)]:
+            new = apply(cco, primitive)
+            if new not in found:
+                found.append(new)
+    return found
+
+
+def check_plan(cmds, cco):
+    # replay the plan, checking that every turn turns the right face, and that it costs no more than BricKuberLib.Move
+    start = cco
+    cost, plan, end_cco = Planner(costs).plan(cmds, cco)
+    moves = [parse_move(cmd) for cmd in cmds.split()]
+    arm = brickuber_planner.ARM_REST
+    for primitive in plan:
+        if primitive[0] == "turn":
+            face, deg = moves.pop(0)
+            assert(bottom(cco) == face)
+            assert(primitive[1] == deg)
+        elif primitive[0] == "spin":
+            assert(arm == brickuber_planner.ARM_REST) # the cube can only spin with the arm out of the way
+        cco = apply(cco, primitive)
+        arm = arm_after(arm, primitive)
+    assert(moves == [])
+    assert(cco == end_cco)
+    assert(abs(cost - plan_cost(costs, plan)) < 1e-9)
+    assert(cost <= plan_cost(costs, greedy_plan(cmds, start)) + 1e-9)
+
+
+def test_orientations():
+    assert(len(orientations()) == 24)
+
+
+def test_every_move():
+    for cco in orientations():
+        for move in MOVES:
+            check_plan(move, cco)
+
+
+def test_solutions():
+    check_plan("D2 R' D' F2 B D R2 D2 R' F2 D' F2 U' B2 L2 U2 D R2 U", (5, 3, 1))
+    rng = random.Random(1)
+    for i in range(20):
+        check_plan(" ".join(rng.choice(MOVES) for m in range(rng.randint(2, 25))), rng.choice(orientations()))
+
+if __name__ == '__main__':
+    test_orientations()
+    test_every_move()
+    test_solutions()
@@ -0,0 +1,58 @@
+from __future__ import print_function
+from __future__ import division
+
+import brickuber_profiler
+from brickuber_profiler import Profiler, MOTION, SETTLE, EXTERNAL
+
+
+class FakeTime(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def record(profiler, clock):
+    # a flip that grabs the cube, a release and spin that spins, and a solve
+    with profiler.span("flip"):
+        clock.sleep(0.5)
+        with profiler.span("grab"):
+            clock.sleep(0.25)
+            with profiler.span("settle grab", SETTLE):
+                clock.sleep(0.125)
+        with profiler.span("run grab", MOTION):
+            clock.sleep(0.5)
+    with profiler.span("release and spin"):
+        with profiler.span("spin 90", group = "spin"):
+            clock.sleep(1)
+        clock.sleep(0.25)
+    with profiler.span("solve", EXTERNAL):
+        clock.sleep(2)
+
+
+def test_summary_self_time():
+    clock = FakeTime()
+    saved = brickuber_profiler.time
+    brickuber_profiler.time = clock
+    try:
+        profiler = Profiler()
+        record(profiler, clock)
+    finally:
+        brickuber_profiler.time = saved
+
+    rows = profiler.summary()
+    assert([row[0] for row in rows] == ["solve", "flip", "spin", "grab", "release and spin"])
+    rows = dict((row[0], row[1:]) for row in rows)
+    assert(rows["flip"] == (1, 1.0, 1.375, 1.375, 1.375, 0.0))
+    assert(rows["grab"] == (1, 0.375, 0.375, 0.375, 0.375, 0.125))
+    assert(rows["release and spin"] == (1, 0.25, 1.25, 1.25, 1.25, 0.0))
+    assert(rows["spin"][1] == 1.0)
+    # the self times add up to the time taken
+    assert(sum(row[1] for row in rows.values()) == clock.now)
+
+if __name__ == '__main__':
+    test_summary_self_time()
@@ -0,0 +1,53 @@
+from __future__ import print_function
+from __future__ import division
+
+import os
+import shutil
+import tempfile
+import threading
+
+from brickuber_solver import SolutionCache
+
+
+def test_cache_lru_across_runs():
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, "solutions.json")
+        cache = SolutionCache(filename, size = 3)
+        cache.put("a", "R")
+        cache.put("b", "U")
+        cache.put("c", "F")
+        assert(cache.get(" A ") == "R") # a is now the most recently used
+        assert(cache.get("d") is None)
+
+        cache = SolutionCache(filename, size = 3) # the next run
+        cache.put("d", "D")
+        assert(cache.get("b") is None) # the least recently used was forgotten
+        assert([cache.get(key) for key in "acd"] == ["R", "F", "D"])
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_cache_threads():
+    directory = tempfile.mkdtemp()
+    try:
+        cache = SolutionCache(os.path.join(directory, "solutions.json"), size = 50)
+
+        def put(thread):
+            for i in range(100):
+                cache.put("%d %d" % (thread, i), "U")
+                cache.get("%d %d" % (thread, i // 2))
+
+        threads = [threading.Thread(target = put, args = (thread,)) for thread in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert(len(cache.solutions) == 50)
+        assert(len(SolutionCache(cache.filename).solutions) == 50)
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    test_cache_lru_across_runs()
+    test_cache_threads()
@@ -19,7 +19,7 @@
 # 	Right Motor - Port D
 #
 # PREREQUISITES
-#	Tornado Web Server for Python
+#	Python 3 and Tornado Web Server for Python (version 5 or later, which runs on asyncio)
 #
 # TROUBLESHOOTING:
 #	Don't use Ctrl+Z to stop the program, use Ctrl+c.
@@ -35,88 +35,63 @@
 #		"kill -9 pid"
 #	If the error does not go away, try changin the port number '9093' both in the client and server code
 
-import brickpi3 #import BrickPi3.py file to use BrickPi3 operations
-BP = brickpi3.BrickPi3()
-import time
-import threading
-import tornado.ioloop
+import os
+import argparse
+import asyncio
+import logging
 import tornado.web
 import tornado.websocket
-import tornado.template
+import brickpi3 #import BrickPi3.py file to use BrickPi3 operations
+import teleop   # applies the newest command to the motors, without lagging behind
+import telemetry # sends the motor and battery state to the browsers
+import webapp   # serves the web page and static files
+BP = brickpi3.BrickPi3()
 
-c=0
-#Initialize TOrnado to use 'GET' and load index.html
-class MainHandler(tornado.web.RequestHandler):
-  def get(self):
-    loader = tornado.template.Loader(".")
-    self.write(loader.load("index.html").generate())
+FOLDER = os.path.dirname(os.path.abspath(__file__))
+PAGE = "Browser_Client_Code.html"
 
 #Code for handling the data sent from the webpage
 class WSHandler(tornado.websocket.WebSocketHandler):
+	def initialize(self, robot):
+		self.robot = robot
 	def open(self):
-		print 'connection opened...'
+		logging.info("connection opened...")
 	def check_origin(self,origin):
 		return True
-	def on_message(self, message):      # receives the data from the webpage and is stored in the variable message
-		global c
-		print 'received:', message        # prints the revived from the webpage 
-		if message == "u":                # checks for the received data and assigns different values to c which controls the movement of robot.
-		  c = "8";
-		if message == "d":
-		  c = "2"
-		if message == "l":
-		  c = "6"
-		if message == "r":
-		  c = "4"
-		if message == "b":
-		  c = "5"
-		print c
-		if c == '8' :
-		  print "Running Forward"
-		  BP.set_motor_power(BP.PORT_A, 200)  #Set the speed of MotorA (-255 to 255)
-		  BP.set_motor_power(BP.PORT_D, 200)  #Set the speed of MotorD (-255 to 255)
-		elif c == '2' :
-		  print "Running Reverse"
-		  BP.set_motor_power(BP.PORT_A, -200)  
-		  BP.set_motor_power(BP.PORT_D, -200)  
-		elif c == '4' :
-		  print "Turning Right"
-		  BP.set_motor_power(BP.PORT_A, 200) 
-		  BP.set_motor_power(BP.PORT_D, 0)  
-		elif c == '6' :
-		  print "Turning Left"
-		  BP.set_motor_power(BP.PORT_A, 0)  
-		  BP.set_motor_power(BP.PORT_D, 200)  
-		elif c == '5' :
-		  print "Stopped"
-		  BP.set_motor_power(BP.PORT_A, 0)
-		  BP.set_motor_power(BP.PORT_D, 0)
+	def on_message(self, message):      # receives the data from the webpage ("u", "d", "l", "r" or "b")
+		self.robot.command(message)       # the motors are updated in the background, with only the newest command applied
 	def on_close(self):
-		print 'connection closed...'
-
-application = tornado.web.Application([
-  (r'/ws', WSHandler),
-  (r'/', MainHandler),
-  (r"/(.*)", tornado.web.StaticFileHandler, {"path": "./resources"}),
-])
+		logging.info("connection closed...")
 
-class myThread (threading.Thread):
-    def __init__(self, threadID, name, counter):
-        threading.Thread.__init__(self)
-        self.threadID = threadID
-        self.name = name
-        self.counter = counter
-    def run(self):
-        print "Ready"
-        while running:
-            time.sleep(.2)              # sleep for 200 ms
+async def main(port, rate):
+	robot = teleop.Teleop(BP, BP.PORT_A, BP.PORT_D, teleop.fixed_drive, rate)
+	robot.start()
+	state = telemetry.Telemetry(BP, {"left": BP.PORT_A, "right": BP.PORT_D}, worker=robot.worker)
+	state.start()
+	application = tornado.web.Application([
+	  (r'/ws', WSHandler, {"robot": robot}),
+	  (r'/telemetry', telemetry.TelemetrySocketHandler, {"telemetry": state}),
+	  (r'/', webapp.PageHandler, {"page": PAGE}),
+	],
+	  template_loader=webapp.load_templates(FOLDER, [PAGE]),   # the page is compiled once, here
+	  static_path=os.path.join(FOLDER, "css"),
+	  static_url_prefix="/css/",
+	  static_handler_class=webapp.PrecompressedStaticFileHandler)
+	webapp.precompress(os.path.join(FOLDER, "css"))
+	application.listen(port)          	#starts the websockets connection
+	logging.info("Ready")
+	try:
+		await robot.report()
+	finally:
+		await robot.stop()
 
 if __name__ == "__main__":
-	running = True
-	thread1 = myThread(1, "Thread-1", 1)
-	thread1.setDaemon(True)
-	thread1.start()  
-	application.listen(9093)          	#starts the websockets connection
-	tornado.ioloop.IOLoop.instance().start()
-  
-
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--port", type=int, default=9093, help="web server port")
+	parser.add_argument("--rate", type=float, default=teleop.RATE, help="maximum motor updates per second")
+	args = parser.parse_args()
+	logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+	try:
+		asyncio.run(main(args.port, args.rate))
+	except KeyboardInterrupt:
+		BP.reset_all()
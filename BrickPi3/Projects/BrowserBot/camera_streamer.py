@@ -1,13 +1,14 @@
 #!/usr/bin/env python
-##############################################################################################################                                                              
+##############################################################################################################
 # This example is for streaming video and controlling the GoPiGo from a web browser
-# http://www.dexterindustries.com/GoPiGo/                                                                
+# http://www.dexterindustries.com/GoPiGo/
 # History
 # ------------------------------------------------
 # Author     Date      		Comments
-# Karan      24 July 14  	Initial Authoring                                                          
+# Karan      24 July 14  	Initial Authoring
+#                           Stream in-process with picamera2, instead of running raspberry_pi_camera_streamer
 # These files have been made available online through a Creative Commons Attribution-ShareAlike 3.0  license.
-# (http://creativecommons.org/licenses/by-sa/3.0/)           
+# (http://creativecommons.org/licenses/by-sa/3.0/)
 #
 # This example is derived from the Dawn Robotics Raspberry Pi Camera Bot
 # https://bitbucket.org/DawnRobotics/raspberry_pi_camera_bot
@@ -16,80 +17,320 @@
 # Copyright (c) 2014, Dawn Robotics Ltd
 # All rights reserved.
 
-# Redistribution and use in source and binary forms, with or without 
+# Redistribution and use in source and binary forms, with or without
 # modification, are permitted provided that the following conditions are met:
 
 # 1. Redistributions of source code must retain the above copyright notice, this
 # list of conditions and the following disclaimer.
 
-# 2. Redistributions in binary form must reproduce the above copyright notice, 
-# this list of conditions and the following disclaimer in the documentation 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
 # and/or other materials provided with the distribution.
 
-# 3. Neither the name of the Dawn Robotics Ltd nor the names of its contributors 
-# may be used to endorse or promote products derived from this software without 
+# 3. Neither the name of the Dawn Robotics Ltd nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
 # specific prior written permission.
 
 # THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
-# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED 
-# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE 
-# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE 
-# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL 
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
 # DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
 # SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
 # CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
-# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE 
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-import copy
-import os
-import os.path
-import subprocess
 import time
-import logging
+import asyncio
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import tornado.web
+import tornado.iostream
+import tornado.websocket
+
+BOUNDARY = "frame"
+
+#---------------------------------------------------------------------------------------------------
+class PiCameraSource:
+
+    """Captures JPEG frames from the Raspberry Pi camera with picamera2, encoding them on the
+       camera's hardware MJPEG encoder"""
+
+    #-----------------------------------------------------------------------------------------------
+    def __init__( self, size=( 320, 240 ), framerate=15 ):
+
+        self.size = size
+        self.framerate = framerate
+        self.camera = None
+
+    #-----------------------------------------------------------------------------------------------
+    def start( self, publish ):
+
+        from picamera2 import Picamera2 # only needed on the robot
+        from picamera2.encoders import MJPEGEncoder
+        from picamera2.outputs import FileOutput
+
+        class Output:
+            def write( self, frame ):
+                publish( bytes( frame ) )
+                return len( frame )
+            def flush( self ):
+                pass
+
+        self.camera = Picamera2()
+        self.camera.configure( self.camera.create_video_configuration(
+            main={ "size" : self.size }, controls={ "FrameRate" : self.framerate } ) )
+        self.camera.start_recording( MJPEGEncoder(), FileOutput( Output() ) )
+
+    #-----------------------------------------------------------------------------------------------
+    def stop( self ):
+
+        if self.camera != None:
+            self.camera.stop_recording()
+            self.camera.close()
+            self.camera = None
+
+#---------------------------------------------------------------------------------------------------
+class SyntheticSource:
+
+    """Publishes made-up frames of a fixed size at a fixed rate, for testing the streaming
+       without a camera"""
+
+    #-----------------------------------------------------------------------------------------------
+    def __init__( self, frameSize=20000, framerate=15 ):
+
+        self.frameSize = frameSize
+        self.framerate = framerate
+        self.thread = None
+        self.running = False
+
+    #-----------------------------------------------------------------------------------------------
+    def start( self, publish ):
+
+        self.running = True
+        self.thread = threading.Thread( target=self.run, args=( publish, ), daemon=True )
+        self.thread.start()
+
+    #-----------------------------------------------------------------------------------------------
+    def run( self, publish ):
+
+        count = 0
+        nextTime = time.monotonic()
+        while self.running:
+            # JPEG start and end markers around a frame counter and padding
+            header = b"\xff\xd8" + count.to_bytes( 4, "big" )
+            publish( header + bytes( max( 0, self.frameSize - len( header ) - 2 ) ) + b"\xff\xd9" )
+            count += 1
+            nextTime += 1.0 / self.framerate
+            time.sleep( max( 0, nextTime - time.monotonic() ) )
+
+    #-----------------------------------------------------------------------------------------------
+    def stop( self ):
+
+        self.running = False
+        if self.thread != None:
+            self.thread.join()
+            self.thread = None
 
 #---------------------------------------------------------------------------------------------------
 class CameraStreamer:
-    
+
     """A class to look after streaming images from the Raspberry Pi camera.
-       Ideally, the camera should only be on when somebody wants to stream images.
-       Therefore, startStreaming must be called periodically. If startStreaming
-       is not called before a timeout period expires then the streaming will stop"""
+       The camera is only on when somebody wants to stream images. It is started when the first
+       client connects, and stopped once there have been no clients for the timeout period.
+       Every client is sent the same frame objects; a client that can't keep up skips straight
+       to the newest frame instead of falling behind"""
 
     DEFAULT_TIMEOUT = 4.0
-    
+    DEFAULT_RING_SIZE = 4
+
     #-----------------------------------------------------------------------------------------------
-    def __init__( self, timeout=DEFAULT_TIMEOUT ):
-            
-        self.cameraStreamerProcess = None
-        self.streamingStartTime = 0
+    def __init__( self, source=None, timeout=DEFAULT_TIMEOUT, ringSize=DEFAULT_RING_SIZE ):
+
+        self.source = source if source != None else PiCameraSource()
         self.streamingTimeout = timeout
+        self.frames = collections.deque( maxlen=ringSize )  # the newest ( sequence number, frame ) pairs
+        self.sequence = 0
+        self.clients = 0
+        self.streaming = False
+        self.stopTimer = None
+        self.loop = None
+        self.newFrame = None
+        self.control = ThreadPoolExecutor( max_workers=1 )  # starts and stops the source, in order
+
+        # statistics
+        self.framesCaptured = 0
+        self.framesSent = 0
+        self.framesDropped = 0
 
     #-----------------------------------------------------------------------------------------------
-    def __del__( self ):
+    def publish( self, frame ):
+
+        # called by the source, from its own thread
+        self.loop.call_soon_threadsafe( self.addFrame, frame )
 
-        self.stopStreaming()
-        
     #-----------------------------------------------------------------------------------------------
-    def startStreaming( self ):
-        
-        # Start raspberry_pi_camera_streamer if needed
-        if self.cameraStreamerProcess == None or self.cameraStreamerProcess.poll() != None:
-            
-            self.cameraStreamerProcess = subprocess.Popen( 
-                [ "/usr/local/bin/raspberry_pi_camera_streamer","-w 320","-h 240" ] )
-        
-        self.streamingStartTime = time.time()         
-                
+    def addFrame( self, frame ):
+
+        if not self.streaming:
+            return
+        self.sequence += 1
+        self.frames.append( ( self.sequence, frame ) )
+        self.framesCaptured += 1
+        newFrame, self.newFrame = self.newFrame, asyncio.Event()
+        newFrame.set()
+
     #-----------------------------------------------------------------------------------------------
-    def update( self ):
-        
-        if time.time() - self.streamingStartTime > self.streamingTimeout:
-            
-            self.stopStreaming()
-                
+    def startStreaming( self ):
+
+        if self.stopTimer != None:
+            self.stopTimer.cancel()
+            self.stopTimer = None
+        if not self.streaming:
+            self.loop = asyncio.get_event_loop()
+            if self.newFrame == None:
+                self.newFrame = asyncio.Event()
+            self.streaming = True
+            self.loop.run_in_executor( self.control, self.source.start, self.publish )
+
     #-----------------------------------------------------------------------------------------------
     def stopStreaming( self ):
 
-        if self.cameraStreamerProcess != None:
-            self.cameraStreamerProcess.terminate()
+        if self.stopTimer != None:
+            self.stopTimer.cancel()
+            self.stopTimer = None
+        if self.streaming:
+            self.streaming = False
+            self.frames.clear()
+            self.loop.run_in_executor( self.control, self.source.stop )
+
+    #-----------------------------------------------------------------------------------------------
+    async def nextFrame( self, after=0 ):
+
+        """Wait for a frame newer than sequence number after, and return the newest
+           ( sequence number, frame )"""
+
+        while not self.frames or self.frames[ -1 ][ 0 ] <= after:
+            await self.newFrame.wait()
+        sequence, frame = self.frames[ -1 ]
+        if after:
+            self.framesDropped += max( 0, sequence - after - 1 )
+        self.framesSent += 1
+        return sequence, frame
+
+    #-----------------------------------------------------------------------------------------------
+    def addClient( self ):
+
+        self.clients += 1
+        self.startStreaming()
+
+    #-----------------------------------------------------------------------------------------------
+    def removeClient( self ):
+
+        self.clients -= 1
+        if self.clients == 0 and self.streaming:
+            self.stopTimer = self.loop.call_later( self.streamingTimeout, self.stopStreaming )
+
+#---------------------------------------------------------------------------------------------------
+class MJPEGHandler( tornado.web.RequestHandler ):
+
+    """Streams the camera to a browser as multipart JPEG, e.g. <img src="/stream.mjpg">"""
+
+    def initialize( self, streamer ):
+        self.streamer = streamer
+        self.waiter = None      # the wait for the next frame
+        self.closed = False
+        self.counted = False    # whether the client is counted in the streamer's clients
+
+    async def get( self ):
+        self.set_header( "Content-Type", "multipart/x-mixed-replace; boundary=" + BOUNDARY )
+        self.set_header( "Cache-Control", "no-cache, private" )
+        if self.closed:
+            return
+        self.streamer.addClient()
+        self.counted = True
+        try:
+            sequence = 0
+            while not self.closed:
+                self.waiter = asyncio.ensure_future( self.streamer.nextFrame( sequence ) )
+                sequence, frame = await self.waiter
+                self.write( b"--" + BOUNDARY.encode() + b"\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                            + str( len( frame ) ).encode() + b"\r\n\r\n" )
+                self.write( frame )
+                self.write( b"\r\n" )
+                await self.flush()  # frames published while this client is still being sent the last one are skipped
+        except tornado.iostream.StreamClosedError:
+            pass
+        except asyncio.CancelledError:
+            if not self.closed:
+                raise
+        finally:
+            self.removeClient()
+
+    def on_connection_close( self ):
+        # the client may leave while waiting for a frame (e.g. when the camera is stalled), when no write fails
+        self.closed = True
+        if self.waiter != None:
+            self.waiter.cancel()
+        self.removeClient()
+
+    def removeClient( self ):
+        if self.counted:
+            self.counted = False
+            self.streamer.removeClient()
+
+#---------------------------------------------------------------------------------------------------
+class FrameSocketHandler( tornado.websocket.WebSocketHandler ):
+
+    """Streams the camera over a websocket, one binary message per JPEG frame"""
+
+    def initialize( self, streamer ):
+        self.streamer = streamer
+        self.task = None
+
+    def check_origin( self, origin ):
+        return True
+
+    def open( self ):
+        self.streamer.addClient()
+        self.task = asyncio.ensure_future( self.send() )
+
+    async def send( self ):
+        sequence = 0
+        try:
+            while True:
+                sequence, frame = await self.streamer.nextFrame( sequence )
+                await self.write_message( frame, binary=True )
+        except ( tornado.websocket.WebSocketClosedError, tornado.iostream.StreamClosedError ):
+            pass
+
+    def on_close( self ):
+        if self.task != None:
+            self.task.cancel()
+        self.streamer.removeClient()
+
+#---------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+
+    # stream on its own, e.g. to test with made-up frames: python3 camera_streamer.py --synthetic
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument( "--port", type=int, default=8080 )
+    parser.add_argument( "--synthetic", action="store_true", help="stream made-up frames instead of the camera" )
+    args = parser.parse_args()
+
+    async def main():
+        streamer = CameraStreamer( SyntheticSource() if args.synthetic else None )
+        tornado.web.Application( [
+            ( r"/stream.mjpg", MJPEGHandler, { "streamer" : streamer } ),
+            ( r"/stream.ws", FrameSocketHandler, { "streamer" : streamer } ),
+        ] ).listen( args.port )
+        while True:
+            await asyncio.sleep( 10 )
+            print( "%d clients, %d frames captured, %d sent, %d dropped" % ( streamer.clients,
+                   streamer.framesCaptured, streamer.framesSent, streamer.framesDropped ) )
+
+    asyncio.run( main() )
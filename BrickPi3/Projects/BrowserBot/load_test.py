@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+#
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2017 Dexter Industries
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information, see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# This code measures how many requests per second the BrowserBot web server can handle, by requesting pages
+# from many simulated browsers at once. For example, with the server running on the robot:
+#
+#     python3 load_test.py http://robot:9093/ http://robot:9093/css/style.css --clients 20 --duration 10
+#
+# With --revalidate, each simulated browser sends back the ETag it got (like a browser with the file in its
+# cache), so the server can answer "304 Not Modified".
+
+import time
+import asyncio
+import argparse
+import tornado.httpclient
+
+
+async def browser(client, urls, deadline, revalidate, results):
+    etags = {}
+    while time.monotonic() < deadline:
+        for url in urls:
+            headers = {"Accept-Encoding" : "gzip, br"}
+            if revalidate and url in etags:
+                headers["If-None-Match"] = etags[url]
+            start = time.monotonic()
+            response = await client.fetch(url, headers = headers, decompress_response = False, raise_error = False)
+            results.append((time.monotonic() - start, response.code, len(response.body or b"")))
+            if response.headers.get("Etag"):
+                etags[url] = response.headers["Etag"]
+
+
+async def main(urls, clients, duration, revalidate):
+    client = tornado.httpclient.AsyncHTTPClient(max_clients = clients)
+    results = []
+    start = time.monotonic()
+    await asyncio.gather(*[browser(client, urls, start + duration, revalidate, results) for i in range(clients)])
+    elapsed = time.monotonic() - start
+
+    latencies = sorted(result[0] for result in results)
+    codes = {}
+    for latency, code, size in results:
+        codes[code] = codes.get(code, 0) + 1
+    print("%d requests in %.1f seconds: %.1f requests/second" % (len(results), elapsed, len(results) / elapsed))
+    print("latency: mean %.1f ms, 95%% %.1f ms, max %.1f ms" % (1000 * sum(latencies) / len(latencies),
+          1000 * latencies[int(0.95 * (len(latencies) - 1))], 1000 * latencies[-1]))
+    print("%.0f bytes per response" % (sum(result[2] for result in results) / len(results)))
+    print("status codes: " + ", ".join("%d: %d" % (code, count) for code, count in sorted(codes.items())))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("urls", nargs = "+", help = "the pages to request, in turn")
+    parser.add_argument("--clients", type = int, default = 10, help = "number of simulated browsers")
+    parser.add_argument("--duration", type = float, default = 10, help = "seconds to run for")
+    parser.add_argument("--revalidate", action = "store_true", help = "send If-None-Match with the last ETag")
+    args = parser.parse_args()
+    asyncio.run(main(args.urls, args.clients, args.duration, args.revalidate))
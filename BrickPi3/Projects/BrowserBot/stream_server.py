@@ -15,11 +15,11 @@
 ###############################################################################################################
 
 # CONNECTIONS-
-# 	Left Motor  - Port A
+# 	Left Motor  - Port B
 # 	Right Motor - Port D
 #
 # PREREQUISITES
-#	Tornado Web Server for Python
+#	Python 3 and Tornado Web Server for Python (version 5 or later, which runs on asyncio)
 #
 # TROUBLESHOOTING:
 #	Don't use Ctrl+Z to stop the program, use Ctrl+c.
@@ -35,160 +35,69 @@
 #		"kill -9 pid"
 #	If the error does not go away, try changin the port number '9093' both in the client and server code
 
-import brickpi3 #import BrickPi3.py file to use BrickPi3 operations
-BP = brickpi3.BrickPi3()
-import threading
-import tornado.ioloop
+import os
+import argparse
+import asyncio
+import logging
 import tornado.web
 import tornado.websocket
-import tornado.template
+import brickpi3 #import BrickPi3.py file to use BrickPi3 operations
+import teleop   # applies the newest command to the motors, without lagging behind
 import camera_streamer
+import telemetry # sends the motor and battery state to the browsers
+import webapp   # serves the web page and static files
+BP = brickpi3.BrickPi3()
 
-cameraStreamer = None
-c=0
-global left_power
-global right_power
-right_power = 0
-left_power = 0
-
-#Initialize TOrnado to use 'GET' and load index.html
-class MainHandler(tornado.web.RequestHandler):
-    def get(self):
-        loader = tornado.template.Loader(".")
-        self.write(loader.load("index.html").generate())
+FOLDER = os.path.dirname(os.path.abspath(__file__))
+PAGE = "streaming_client.html"
 
 #Code for handling the data sent from the webpage
 class WSHandler(tornado.websocket.WebSocketHandler):
+    def initialize(self, robot):
+        self.robot = robot
     def open(self):
-        print 'connection opened...'
-        cameraStreamer.startStreaming()
+        logging.info("connection opened...")
     def check_origin(self,origin):
         return True
-    def on_message(self, message):      # receives the data from the webpage and is stored in the variable message
-        global c
-        global left_power
-        global right_power
-        cameraStreamer.update
-        print 'received:', message        # prints the revived from the webpage 
-        if message == "u":                # checks for the received data and assigns different values to c which controls the movement of robot.
-            c = "8";
-        if message == "d":
-            c = "2"
-        if message == "l":
-            c = "6"
-        if message == "r":
-            c = "4"
-        if message == "b":
-            c = "5"
-        if message == "lu":
-            c = "7"
-        if message == "ru":
-            c = "9"
-        if message == "ld":
-            c = "1"
-        if message == "rd":
-            c = "3"
-        print c
-        if c == '8' :
-            print "Running Forward"
-            # first check which side has higher power and set it to the lowest setting before increasing it
-            if right_power > left_power:
-                right_power = left_power
-            if left_power > right_power:
-                left_power = right_power
-            right_power = right_power + 50
-            if right_power > 255:
-                right_power = 255
-            left_power = right_power
-            BP.set_motor_power[BP.PORT_B] = left_power  #Set the speed of MotorB (-255 to 255)
-            BP.set_motor_power[BP.PORT_D] = right_power  #Set the speed of MotorD (-255 to 255)
-        elif c == '2' :
-            print "Running Reverse"
-            # first check which side has lower power and set it to the lowest setting before increasing it
-            if right_power < left_power:
-                right_power = left_power
-            if left_power < right_power:
-                left_power = right_power
-            right_power = right_power - 50
-            if right_power < -255:
-                right_power = -255
-            left_power = right_power
-            BP.set_motor_power(BP.PORT_B) = left_power  
-            BP.set_motor_power(BP.PORT_D) = right_power  
-        elif c == '4' :
-            print "Turning Left"
-            left_power = left_power + 100
-            right_power = 0
-            if left_power > 255:
-                left_power = 255
-            BP.set_motor_power(BP.PORT_B) = left_power
-            BP.set_motor_power(BP.PORT_D) = right_power
-        elif c == '7' :
-            print "Turning diagonal Left"
-            if right_power > 200:
-                right_power = 100
-            right_power = right_power + 50
-            left_power = right_power / 2
-            if right_power > 255:
-                right_power = 255
-            BP.set_motor_power(BP.PORT_B) = left_power
-            BP.set_motor_power(BP.PORT_D) = right_power
-        elif c == '6' :
-            print "Turning Right"
-            right_power = right_power + 100
-            left_power = 0
-            if right_power > 255:
-                right_power = 255
-            BP.set_motor_power(BP.PORT_B) = left_power  
-            BP.set_motor_power(BP.PORT_D) = right_power  
-        elif c == '9' :
-            print "Turning diagonal Right"
-            if left_power > 200:
-                left_power = 100
-            left_power = left_power + 50
-            right_power = left_power / 2
-            if left_power > 255:
-                left_power = 255
-            BP.set_motor_power(BP.PORT_B) = left_power
-            BP.set_motor_power(BP.PORT_D) = right_power
-        elif c == '5' :
-            print "Stopped"
-            right_power = 0
-            left_power = 0
-            BP.set_motor_power(BP.PORT_B) = left_power
-            BP.set_motor_power(BP.PORT_D) = right_power
-        print "Values Updated"
+    def on_message(self, message):      # receives the data from the webpage ("u", "d", "l", "r", "lu", "ru" or "b")
+        self.robot.command(message)       # the motors are updated in the background, with only the newest command applied
     def on_close(self):
-        cameraStreamer.stopStreaming()
-        print 'connection closed...'
-
-application = tornado.web.Application([
-    (r'/ws', WSHandler),
-    (r'/', MainHandler),
-    (r"/(.*)", tornado.web.StaticFileHandler, {"path": "./resources"}),
-])
+        logging.info("connection closed...")
 
-class myThread (threading.Thread):
-    def __init__(self, threadID, name, counter):
-        threading.Thread.__init__(self)
-        self.threadID = threadID
-        self.name = name
-        self.counter = counter
-    def run(self):
-        print "Ready"
-        while running:
-            time.sleep(.2)              # sleep for 200 ms
+async def main(port, rate):
+    # the camera runs while somebody is watching /stream.mjpg, and stops a few seconds after the last one leaves
+    cameraStreamer = camera_streamer.CameraStreamer()
+    robot = teleop.Teleop(BP, BP.PORT_B, BP.PORT_D, teleop.ramp_drive, rate)
+    robot.start()
+    state = telemetry.Telemetry(BP, {"left": BP.PORT_B, "right": BP.PORT_D}, worker=robot.worker)
+    state.start()
+    application = tornado.web.Application([
+        (r'/ws', WSHandler, {"robot": robot}),
+        (r'/telemetry', telemetry.TelemetrySocketHandler, {"telemetry": state}),
+        (r'/stream.mjpg', camera_streamer.MJPEGHandler, {"streamer": cameraStreamer}),
+        (r'/stream.ws', camera_streamer.FrameSocketHandler, {"streamer": cameraStreamer}),
+        (r'/', webapp.PageHandler, {"page": PAGE}),
+    ],
+        template_loader=webapp.load_templates(FOLDER, [PAGE]),   # the page is compiled once, here
+        static_path=os.path.join(FOLDER, "css"),
+        static_url_prefix="/css/",
+        static_handler_class=webapp.PrecompressedStaticFileHandler)
+    webapp.precompress(os.path.join(FOLDER, "css"))
+    application.listen(port)          	#starts the websockets connection
+    logging.info("Ready")
+    try:
+        await robot.report()
+    finally:
+        await robot.stop()
         cameraStreamer.stopStreaming()
 
 if __name__ == "__main__":
-    running = True
-    thread1 = myThread(1, "Thread-1", 1)
-    thread1.setDaemon(True)
-    thread1.start()  
-    application.listen(9093)          	#starts the websockets connection
-    
-    cameraStreamer = camera_streamer.CameraStreamer()
-    
-    tornado.ioloop.IOLoop.instance().start()
-  
-
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=9093, help="web server port")
+    parser.add_argument("--rate", type=float, default=teleop.RATE, help="maximum motor updates per second")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    try:
+        asyncio.run(main(args.port, args.rate))
+    except KeyboardInterrupt:
+        BP.reset_all()
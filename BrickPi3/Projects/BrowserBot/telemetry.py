@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+#
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2017 Dexter Industries
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information, see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# This code sends the BrowserBot's state (motor power, encoders and speed, battery voltage and sensor values)
+# to every connected browser.
+#
+# The BrickPi3 is read once per tick, however many browsers are connected (and not at all when none are). Each
+# tick is packed into a small binary frame holding only the values that changed since the last tick, and the
+# same frame is sent to every browser. A browser that hasn't finished receiving the last frame when the next
+# one is ready misses frames until it catches up, and is then sent all the values again (a key frame).
+#
+# When a browser connects it is sent a JSON text message with the field names:
+#     {"fields": ["left.flags", "left.power", ...], "rate": 10}
+# followed by binary frames, all little endian:
+#     key frame:    uint8 0, uint16 sequence number, int32 value of each field
+#     delta frame:  uint8 1, uint16 sequence number, bit mask of the fields that changed (one bit per field,
+#                   bit 0 of byte 0 for field 0), then the change of each of those fields as a zigzag varint
+
+import time
+import json
+import struct
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import tornado.websocket
+
+RATE = 10 # ticks per second
+
+log = logging.getLogger("telemetry")
+
+KEY_FRAME = 0
+DELTA_FRAME = 1
+_HEADER = struct.Struct("<BH")
+
+
+def _varint(value):
+    # zigzag encode, so small negative changes are small too, then 7 bits per byte
+    value = (value << 1) ^ (value >> 63)
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return out
+
+
+def encode_key(sequence, values):
+    """
+    Return a key frame holding all the values
+    """
+    return _HEADER.pack(KEY_FRAME, sequence & 0xFFFF) + struct.pack("<%di" % len(values), *values)
+
+
+def encode_delta(sequence, previous, values):
+    """
+    Return a delta frame holding the values that changed since previous
+    """
+    mask = bytearray((len(values) + 7) // 8)
+    changes = bytearray()
+    for i, (old, new) in enumerate(zip(previous, values)):
+        if new != old:
+            mask[i >> 3] |= 1 << (i & 7)
+            changes += _varint(new - old)
+    return _HEADER.pack(DELTA_FRAME, sequence & 0xFFFF) + mask + changes
+
+
+def decode(frame, previous):
+    """
+    Return the values in a frame (the same as the browser does). previous is the values before a delta frame.
+    """
+    kind, sequence = _HEADER.unpack_from(frame)
+    if kind == KEY_FRAME:
+        return list(struct.unpack_from("<%di" % ((len(frame) - _HEADER.size) // 4), frame, _HEADER.size))
+    values = list(previous)
+    offset = _HEADER.size + (len(values) + 7) // 8
+    for i in range(len(values)):
+        if frame[_HEADER.size + (i >> 3)] & (1 << (i & 7)):
+            value = shift = 0
+            while True:
+                byte = frame[offset]
+                offset += 1
+                value |= (byte & 0x7F) << shift
+                shift += 7
+                if not byte & 0x80:
+                    break
+            values[i] += (value >> 1) ^ -(value & 1)
+    return values
+
+
+class Telemetry(object):
+    """
+    Samples the BrickPi3 once per tick while any browser is connected, and sends the values to all of them
+    """
+
+    def __init__(self, BP, motors, sensors = None, rate = RATE, worker = None):
+        """
+        Keyword arguments:
+        BP -- the BrickPi3 instance
+        motors -- dictionary of motor name and port, e.g. {"left" : BP.PORT_B}
+        sensors -- dictionary of sensor name and port, for sensors that have been configured. A sensor that
+            returns a list of values is reported as the first value.
+        rate -- ticks per second
+        worker -- the executor to read the BrickPi3 on. Pass Teleop.worker to use the same SPI thread.
+        """
+        self.BP = BP
+        self.motors = sorted(motors.items())
+        self.sensors = sorted((sensors or {}).items())
+        self.interval = 1 / rate
+        self.rate = rate
+        self.worker = worker if worker is not None else ThreadPoolExecutor(max_workers = 1, thread_name_prefix = "spi")
+
+        self.fields = []
+        for name, port in self.motors:
+            self.fields += [name + ".flags", name + ".power", name + ".encoder", name + ".dps"]
+        self.fields.append("battery_mV")
+        self.fields += [name for name, port in self.sensors]
+
+        # websocket handler: [the future of its last write, whether it has had every frame since a key frame]
+        self.clients = {}
+        self.connected = None   # set while any browser is connected
+        self.values = [0] * len(self.fields)
+        self.sequence = 0
+        self.task = None
+
+        # statistics
+        self.ticks = 0
+        self.frames_sent = 0
+        self.frames_skipped = 0
+        self.bytes_sent = 0
+
+    def start(self):
+        """
+        Start sampling. Must be called from the asyncio event loop.
+        """
+        self.connected = asyncio.Event()
+        self.task = asyncio.ensure_future(self._run())
+
+    def add_client(self, client):
+        self.clients[client] = [None, False]
+        client.write_message(json.dumps({"fields" : self.fields, "rate" : self.rate}))
+        self.connected.set()
+
+    def remove_client(self, client):
+        self.clients.pop(client, None)
+        if not self.clients:
+            self.connected.clear()
+
+    def sample(self):
+        """
+        Read the BrickPi3, and return the value of each field
+        """
+        values = []
+        for name, port in self.motors:
+            values += self.BP.get_motor_status(port)
+        values.append(int(round(self.BP.get_voltage_battery() * 1000)))
+        for name, port in self.sensors:
+            field = len(values)
+            try:
+                value = self.BP.get_sensor(port)
+                if isinstance(value, (list, tuple)):
+                    value = value[0]
+                values.append(int(round(value)))
+            except Exception: # the sensor isn't ready (SensorError) or isn't a number; keep the last value
+                values.append(self.values[field])
+        return values
+
+    def broadcast(self, values):
+        """
+        Send one tick of values to every browser
+        """
+        self.sequence += 1
+        delta = key = None
+        for client, state in list(self.clients.items()):
+            writing, synced = state
+            if writing is not None and not writing.done():
+                # still sending an earlier frame: skip this one, and send a key frame once it has caught up
+                state[1] = False
+                self.frames_skipped += 1
+                continue
+            if synced:
+                if values == self.values:
+                    continue
+                if delta is None:
+                    delta = encode_delta(self.sequence, self.values, values)
+                frame = delta
+            else:
+                if key is None:
+                    key = encode_key(self.sequence, values)
+                frame = key
+            try:
+                state[0] = client.write_message(frame, binary = True)
+            except tornado.websocket.WebSocketClosedError:
+                self.remove_client(client)
+                continue
+            state[1] = True
+            self.frames_sent += 1
+            self.bytes_sent += len(frame)
+        self.values = values
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            await self.connected.wait()
+            start = time.monotonic()
+            try:
+                values = await loop.run_in_executor(self.worker, self.sample)
+            except IOError as error:
+                log.warning("Could not read the BrickPi3: %s", error)
+            else:
+                self.ticks += 1
+                self.broadcast(values)
+            await asyncio.sleep(max(0, self.interval - (time.monotonic() - start)))
+
+
+class TelemetrySocketHandler(tornado.websocket.WebSocketHandler):
+    """
+    Sends the telemetry to a browser
+    """
+
+    def initialize(self, telemetry):
+        self.telemetry = telemetry
+
+    def check_origin(self, origin):
+        return True
+
+    def open(self):
+        self.telemetry.add_client(self)
+
+    def on_close(self):
+        self.telemetry.remove_client(self)
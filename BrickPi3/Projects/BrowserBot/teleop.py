@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+#
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2017 Dexter Industries
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information, see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# This code drives the BrowserBot motors from the commands sent by the browser.
+#
+# The browser can send key presses much faster than the motors can be updated over SPI. Instead of setting
+# the motors for every message, each message just updates the wanted motor powers (which is quick), and a
+# separate task applies the newest wanted powers at most RATE times per second. Commands that arrive while
+# the motors are being updated are collapsed into one, so the robot always follows the newest command and
+# never lags behind. The SPI writes run on a single worker thread, so they never hold up the web server.
+
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+RATE = 50 # the maximum number of motor updates per second
+MAX_POWER = 100 # BrickPi3.set_motor_power takes -100 to 100
+
+log = logging.getLogger("teleop")
+
+
+def _limit(power):
+    return max(-MAX_POWER, min(MAX_POWER, power))
+
+
+def fixed_drive(message, left, right):
+    """
+    Return the new (left, right) motor powers for a command, driving at fixed powers (as RPi_Server_Code.py,
+    scaled to the BrickPi3's -100 to 100)
+
+    Keyword arguments:
+    message -- the command from the browser: "u", "d", "l", "r" or "b"
+    left, right -- the current motor powers
+
+    Unknown commands leave the powers unchanged.
+    """
+    return {"u" : (80, 80),
+            "d" : (-80, -80),
+            "l" : (0, 80),
+            "r" : (80, 0),
+            "b" : (0, 0)}.get(message, (left, right))
+
+
+def ramp_drive(message, left, right):
+    """
+    Return the new (left, right) motor powers for a command, speeding up with each key press (as the old
+    stream_server.py, scaled to the BrickPi3's -100 to 100)
+
+    Keyword arguments:
+    message -- the command from the browser: "u", "d", "l", "r", "lu", "ru", "ld", "rd" or "b"
+    left, right -- the current motor powers
+
+    Unknown commands leave the powers unchanged.
+    """
+    if message == "u":
+        # start from the slower side, and speed up
+        right = _limit(min(left, right) + 20)
+        left = right
+    elif message == "d":
+        right = _limit(max(left, right) - 20)
+        left = right
+    elif message == "r":
+        left = _limit(left + 40)
+        right = 0
+    elif message == "l":
+        right = _limit(right + 40)
+        left = 0
+    elif message == "lu":
+        if right > 80:
+            right = 40
+        right = _limit(right + 20)
+        left = right // 2
+    elif message == "ru":
+        if left > 80:
+            left = 40
+        left = _limit(left + 20)
+        right = left // 2
+    elif message == "b":
+        left, right = 0, 0
+    return left, right
+
+
+class Teleop(object):
+    """
+    Applies the newest drive command to the motors, at most rate times per second
+    """
+
+    def __init__(self, BP, left_port, right_port, drive = fixed_drive, rate = RATE):
+        """
+        Keyword arguments:
+        BP -- the BrickPi3 instance
+        left_port, right_port -- the motor ports
+        drive -- the function that works out the new motor powers for a command (see fixed_drive)
+        rate -- the maximum number of motor updates per second
+        """
+        self.BP = BP
+        self.left_port = left_port
+        self.right_port = right_port
+        self.drive = drive
+        self.interval = 1 / rate
+
+        self.wanted = (0, 0)    # the newest wanted (left, right) powers
+        self.applied = None     # the powers the motors were last set to
+        self.received = None    # when the newest command was received
+        self.changed = None     # set when there is a new command
+        self.worker = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = "spi")
+        self.task = None
+
+        # statistics
+        self.commands = 0       # commands received
+        self.updates = 0        # motor updates
+        self.latencies = []     # seconds from receiving each applied command to the motors being set
+
+    def start(self):
+        """
+        Start applying commands. Must be called from the asyncio event loop.
+        """
+        self.changed = asyncio.Event()
+        self.task = asyncio.ensure_future(self._run())
+
+    def command(self, message):
+        """
+        Handle a command from the browser. Returns straight away; the motors are updated in the background.
+        """
+        self.commands += 1
+        self.wanted = self.drive(message, *self.wanted)
+        self.received = time.monotonic()
+        self.changed.set()
+
+    def _set_motors(self, left, right):
+        if left == right:
+            self.BP.set_motor_power(self.left_port + self.right_port, left)
+        else:
+            self.BP.set_motor_power(self.left_port, left)
+            self.BP.set_motor_power(self.right_port, right)
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            await self.changed.wait()
+            self.changed.clear()
+            wanted, received = self.wanted, self.received
+            if wanted != self.applied:
+                await loop.run_in_executor(self.worker, self._set_motors, *wanted)
+                self.applied = wanted
+                self.updates += 1
+                self.latencies.append(time.monotonic() - received)
+                del self.latencies[:-1000]
+            # anything received while waiting here is collapsed into one update
+            await asyncio.sleep(self.interval)
+
+    def stats(self):
+        """
+        Return a dictionary of the number of commands received, the number of motor updates, and the mean, 95th
+        percentile and maximum command-to-actuation latency in milliseconds (of the last 1000 updates)
+        """
+        latencies = sorted(self.latencies)
+        return {"commands" : self.commands,
+                "updates" : self.updates,
+                "latency_mean_ms" : 1000 * sum(latencies) / len(latencies) if latencies else 0,
+                "latency_p95_ms" : 1000 * latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0,
+                "latency_max_ms" : 1000 * latencies[-1] if latencies else 0}
+
+    async def report(self, period = 10):
+        """
+        Log the statistics every period seconds, when there have been commands
+        """
+        last = 0
+        while True:
+            await asyncio.sleep(period)
+            if self.commands != last:
+                last = self.commands
+                log.info("%(commands)d commands, %(updates)d motor updates, latency mean %(latency_mean_ms).1f ms, "
+                         "95%% %(latency_p95_ms).1f ms, max %(latency_max_ms).1f ms", self.stats())
+
+    async def stop(self):
+        """
+        Stop the motors and the worker thread
+        """
+        if self.task is not None:
+            self.task.cancel()
+        await asyncio.get_event_loop().run_in_executor(self.worker, self._set_motors, 0, 0)
+        self.worker.shutdown()
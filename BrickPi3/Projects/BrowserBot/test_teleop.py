@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+#
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2017 Dexter Industries
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information, see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# Tests for the BrowserBot drive commands in teleop.py
+
+import itertools
+
+import teleop
+
+COMMANDS = ["u", "d", "l", "r", "lu", "ru", "ld", "rd", "b", "x"]
+
+
+def test_drive_limits():
+    # BrickPi3.set_motor_power takes -100 to 100, sent as one signed byte, so nothing outside that may be sent
+    for drive in (teleop.fixed_drive, teleop.ramp_drive):
+        for first in COMMANDS:
+            # hold one key, then another
+            for second in COMMANDS:
+                left, right = 0, 0
+                for message in itertools.chain([first] * 20, [second] * 20):
+                    left, right = drive(message, left, right)
+                    assert(-100 <= left <= 100 and -100 <= right <= 100)
+
+
+def test_ramp_drive():
+    left, right = 0, 0
+    powers = []
+    for i in range(6):
+        left, right = teleop.ramp_drive("u", left, right)
+        powers.append(left)
+    # speeds up with each key press, up to full power
+    assert(powers == [20, 40, 60, 80, 100, 100])
+    assert(right == left)
+    assert(teleop.ramp_drive("b", left, right) == (0, 0))
+    assert(teleop.ramp_drive("lu", 0, 100) == (30, 60))
+    assert(teleop.fixed_drive("l", 0, 0) == (0, 80))
+
+
+if __name__ == '__main__':
+    test_drive_limits()
+    test_ramp_drive()
+    print("All tests passed")
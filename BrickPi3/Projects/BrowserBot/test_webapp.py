@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+#
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2017 Dexter Industries
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information, see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# Tests for the Accept-Encoding handling in webapp.py
+
+import webapp
+
+
+def test_accepts():
+    assert(webapp.accepts("gzip, deflate, br", "br"))
+    assert(webapp.accepts("gzip, deflate, br", "gzip"))
+    assert(not webapp.accepts("gzip, deflate", "br"))
+    assert(not webapp.accepts("", "gzip"))
+    # q=0 refuses the encoding
+    assert(not webapp.accepts("gzip, br;q=0", "br"))
+    assert(webapp.accepts("gzip, br;q=0", "gzip"))
+    assert(not webapp.accepts("gzip;q=0, deflate", "gzip"))
+    assert(not webapp.accepts("gzip; q=0.000", "gzip"))
+    assert(webapp.accepts("GZIP;Q=0.5", "gzip"))
+    # not a substring test
+    assert(not webapp.accepts("x-gzip-foo, brx", "gzip"))
+    assert(not webapp.accepts("x-gzip-foo, brx", "br"))
+    # * stands for the encodings that aren't listed
+    assert(webapp.accepts("*", "br"))
+    assert(not webapp.accepts("*, br;q=0", "br"))
+    assert(not webapp.accepts("*;q=0", "gzip"))
+
+
+if __name__ == '__main__':
+    test_accepts()
+    print("All tests passed")
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+#
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2017 Dexter Industries
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information, see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# This code serves the BrowserBot web page and its static files (e.g. the style sheet), doing as little work
+# per request as possible, so a Raspberry Pi can serve a whole classroom of tablets.
+#
+# The page templates are compiled once at startup, and each page is rendered and compressed once, the first
+# time it is asked for (the pages are the same for everybody). The static files are read and compressed once at startup
+# (gzip, and brotli when the brotli module is installed), kept in memory, and sent compressed to browsers that
+# accept it. Every response has a strong ETag, so a browser that already has a file gets a "304 Not Modified"
+# instead of the file. Links made with static_url() include a hash of the file, so those can be cached for
+# a long time.
+
+import os
+import gzip
+import hashlib
+import mimetypes
+import datetime
+import tornado.web
+import tornado.template
+
+try:
+    import brotli # optional, for smaller files
+except ImportError:
+    brotli = None
+
+# files smaller than this aren't worth compressing
+MIN_COMPRESS_SIZE = 256
+
+# file types that are already compressed
+COMPRESSED_TYPES = (".jpg", ".jpeg", ".png", ".gif", ".gz", ".br", ".zip", ".woff", ".woff2")
+
+# compressed file suffix for each content encoding, best first
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+
+def load_templates(path, names):
+    """
+    Create a template loader, and compile the templates straight away
+
+    Keyword arguments:
+    path -- the folder the templates are in
+    names -- the templates to compile
+
+    Returns:
+    the loader, to pass to tornado.web.Application as the template_loader setting
+    """
+    loader = tornado.template.Loader(path)
+    for name in names:
+        loader.load(name)
+    return loader
+
+
+def _compress(encoding, data):
+    if encoding == "br":
+        return brotli.compress(data, quality = 11)
+    return gzip.compress(data, 9, mtime = 0)
+
+
+def accepts(header, encoding):
+    """
+    Return whether an Accept-Encoding header accepts a content encoding
+
+    Keyword arguments:
+    header -- the Accept-Encoding header, e.g. "gzip, br;q=0". An encoding with q=0 is refused, and "*" stands
+        for the encodings that aren't listed.
+    encoding -- the content encoding, e.g. "gzip"
+    """
+    qvalues = {}
+    for token in header.split(","):
+        parts = token.split(";")
+        name = parts[0].strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qvalues[name] = q
+    return qvalues.get(encoding, qvalues.get("*", 0.0)) > 0
+
+
+def _modified(abspath):
+    return datetime.datetime.fromtimestamp(int(os.path.getmtime(abspath)), datetime.timezone.utc)
+
+
+# absolute path (with .gz or .br added for the compressed copies): (content, modified time)
+_files = {}
+
+# page name: dictionary of content encoding (None for uncompressed) and (content, ETag)
+_pages = {}
+
+
+def precompress(path):
+    """
+    Read the static files into memory, with a compressed copy of each one that is worth compressing
+
+    Keyword arguments:
+    path -- the static files folder
+    """
+    for folder, subfolders, names in os.walk(path):
+        for name in names:
+            abspath = os.path.abspath(os.path.join(folder, name))
+            with open(abspath, "rb") as f:
+                content = f.read()
+            modified = _modified(abspath)
+            _files[abspath] = (content, modified)
+            if len(content) < MIN_COMPRESS_SIZE or name.lower().endswith(COMPRESSED_TYPES):
+                continue
+            for encoding, suffix in ENCODINGS:
+                if encoding == "br" and brotli is None:
+                    continue
+                compressed = _compress(encoding, content)
+                if len(compressed) < len(content):
+                    _files[abspath + suffix] = (compressed, modified)
+
+
+class PageHandler(tornado.web.RequestHandler):
+    """
+    Serves a page template (compiled at startup by load_templates). The page is rendered once, so it mustn't
+    depend on the request.
+    """
+
+    def initialize(self, page):
+        self.page = page
+        self.etag = None
+
+    def _variants(self):
+        if self.page not in _pages:
+            content = self.render_string(self.page)
+            variants = {None : content}
+            for encoding, suffix in ENCODINGS:
+                if encoding != "br" or brotli is not None:
+                    variants[encoding] = _compress(encoding, content)
+            _pages[self.page] = dict((encoding, (data, '"%s"' % hashlib.sha1(data).hexdigest()))
+                                     for encoding, data in variants.items())
+        return _pages[self.page]
+
+    def get(self):
+        variants = self._variants()
+        accepted = self.request.headers.get("Accept-Encoding", "")
+        encoding = None
+        for name, suffix in ENCODINGS:
+            if name in variants and accepts(accepted, name):
+                encoding = name
+                break
+        content, self.etag = variants[encoding]
+        self.set_header("Content-Type", "text/html; charset=UTF-8")
+        self.set_header("Vary", "Accept-Encoding")
+        if encoding is not None:
+            self.set_header("Content-Encoding", encoding)
+        self.write(content)
+
+    def compute_etag(self):
+        return self.etag
+
+
+class PrecompressedStaticFileHandler(tornado.web.StaticFileHandler):
+    """
+    Serves static files from memory, sending the compressed copy (see precompress) when the browser accepts it.
+    Use it as the static_handler_class setting of tornado.web.Application.
+    """
+
+    def validate_absolute_path(self, root, absolute_path):
+        absolute_path = super().validate_absolute_path(root, absolute_path)
+        self.encoding = None
+        if absolute_path is None:
+            return None
+        accepted = self.request.headers.get("Accept-Encoding", "")
+        for encoding, suffix in ENCODINGS:
+            if absolute_path + suffix in _files and accepts(accepted, encoding):
+                self.encoding = encoding
+                return absolute_path + suffix
+        return absolute_path
+
+    @classmethod
+    def _load(cls, abspath):
+        # files added after precompress are read (uncompressed) the first time they are asked for
+        if abspath not in _files:
+            with open(abspath, "rb") as f:
+                _files[abspath] = (f.read(), _modified(abspath))
+        return _files[abspath]
+
+    @classmethod
+    def get_content(cls, abspath, start = None, end = None):
+        return cls._load(abspath)[0][start:end]
+
+    def get_content_size(self):
+        return len(self._load(self.absolute_path)[0])
+
+    def get_modified_time(self):
+        return self._load(self.absolute_path)[1]
+
+    def get_content_type(self):
+        path = self.absolute_path
+        if self.encoding is not None:
+            path = path[:-len(dict(ENCODINGS)[self.encoding])]
+        mime_type, encoding = mimetypes.guess_type(path)
+        return mime_type or "application/octet-stream"
+
+    def set_extra_headers(self, path):
+        self.set_header("Vary", "Accept-Encoding")
+        if self.encoding is not None:
+            self.set_header("Content-Encoding", self.encoding)
@@ -18,14 +18,7 @@ from __future__ import division       #                           ''
 
 import time     # import the time library for the sleep function
 import brickpi3 # import the BrickPi3 drivers
-
-import math
-
-# temperature conversion lists
-_a = [0.003357042,         0.003354017,        0.0033530481,       0.0033536166]
-_b = [0.00025214848,       0.00025617244,      0.00025420230,      0.000253772]
-_c = [0.0000033743283,     0.0000021400943,    0.0000011431163,    0.00000085433271]
-_d = [-0.000000064957311, -0.000000072405219, -0.000000069383563, -0.000000087912262]
+import brickpi3_analog # import the analog sensor conversions (the temperature conversion table)
 
 BP = brickpi3.BrickPi3() # Create an instance of the BrickPi3 class. BP will be the BrickPi3 object.
 
@@ -43,21 +36,7 @@ try:
         try:
             value = BP.get_sensor(BP.PORT_1)[0] # read the sensor port values
             if(value < 4095): # if the value is < 4095, the sensor is connected
-                # do the conversion from the raw value to degrees C
-                RtRt25 = (float)(value) / (4095 - value)
-                lnRtRt25 = math.log(RtRt25)
-                
-                if (RtRt25 > 3.277) :
-                    i = 0
-                elif (RtRt25 > 0.3599) :
-                    i = 1
-                elif (RtRt25 > 0.06816) :
-                    i = 2
-                else :
-                    i = 3
-                
-                temp =  1.0 / (_a[i] + (_b[i] * lnRtRt25) + (_c[i] * lnRtRt25 * lnRtRt25) + (_d[i] * lnRtRt25 * lnRtRt25 * lnRtRt25))
-                temp = temp - 273.15
+                temp = brickpi3_analog.TEMPERATURE[value] # look up the temperature in degrees C for the raw value
                 print("Temperature: %.1fC" % temp) # print the temperature in degrees C
             else:             # else the value is 4095, so the sensor is disconnected
                 print("Temperature: (disconnected)")
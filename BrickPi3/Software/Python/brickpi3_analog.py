@@ -0,0 +1,125 @@
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2017 Dexter Industries
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# Conversions for analog sensors read with SENSOR_TYPE.CUSTOM and SENSOR_CUSTOM.PIN1_ADC.
+#
+# The pin 1 ADC value is 12 bits (0 to 4095), so each conversion is worked out once for every possible value
+# when this module is imported, and reading a sensor is just a table lookup:
+#
+#     import brickpi3
+#     import brickpi3_analog
+#
+#     BP = brickpi3.BrickPi3()
+#     BP.set_sensor_type(BP.PORT_1, BP.SENSOR_TYPE.CUSTOM, [(BP.SENSOR_CUSTOM.PIN1_ADC)])
+#     ...
+#     value = BP.get_sensor(BP.PORT_1)[0]
+#     print("Temperature: %.1fC" % brickpi3_analog.TEMPERATURE[value])
+#
+# A table can also convert a whole list of samples at once (a numpy array of samples gives a numpy array).
+# Values that can't be converted (e.g. 4095, which means the sensor is disconnected) convert to NaN.
+
+from __future__ import print_function
+from __future__ import division
+
+import math
+
+ADC_MAX = 4095 # the highest ADC value. The ADC reads this with nothing connected.
+
+# Steinhart-Hart coefficients for the Dexter Industries temperature sensor (dTemp) thermistor, for each range of
+# resistance ratio (see THERMISTOR_RANGES)
+_a = [0.003357042,         0.003354017,        0.0033530481,       0.0033536166]
+_b = [0.00025214848,       0.00025617244,      0.00025420230,      0.000253772]
+_c = [0.0000033743283,     0.0000021400943,    0.0000011431163,    0.00000085433271]
+_d = [-0.000000064957311, -0.000000072405219, -0.000000069383563, -0.000000087912262]
+THERMISTOR_RANGES = [3.277, 0.3599, 0.06816] # the lowest resistance ratio for coefficients 0, 1 and 2
+
+
+def thermistor_temperature(value):
+    """
+    Convert a dTemp ADC value to degrees C
+
+    Returns NaN for 0 and ADC_MAX (disconnected)
+    """
+    if value <= 0 or value >= ADC_MAX:
+        return float("nan")
+    RtRt25 = float(value) / (ADC_MAX - value)
+    lnRtRt25 = math.log(RtRt25)
+    i = len(THERMISTOR_RANGES)
+    for range_index, lowest in enumerate(THERMISTOR_RANGES):
+        if RtRt25 > lowest:
+            i = range_index
+            break
+    temp = 1.0 / (_a[i] + (_b[i] * lnRtRt25) + (_c[i] * lnRtRt25 * lnRtRt25) + (_d[i] * lnRtRt25 * lnRtRt25 * lnRtRt25))
+    return temp - 273.15
+
+
+def pin1_voltage(value):
+    """
+    Convert a pin 1 ADC value to volts, assuming a 5v reference (use BP.get_voltage_5v() for a measured one)
+    """
+    return value * 5.0 / ADC_MAX
+
+
+def pressure_500(value):
+    """
+    Convert a Dexter Industries dPressure 500 ADC value to kPa. Returns NaN for ADC_MAX (disconnected).
+    """
+    if value >= ADC_MAX:
+        return float("nan")
+    return ((value / ADC_MAX) - 0.04) / 0.0018
+
+
+def pressure_250(value):
+    """
+    Convert a Dexter Industries dPressure 250 ADC value to kPa. Returns NaN for ADC_MAX (disconnected).
+    """
+    if value >= ADC_MAX:
+        return float("nan")
+    return ((value / ADC_MAX) - 0.04) / 0.00369
+
+
+class ADCTable(object):
+    """
+    A conversion worked out for every ADC value
+    """
+
+    def __init__(self, conversion):
+        """
+        Keyword arguments:
+        conversion -- a function taking an ADC value (0 to ADC_MAX) and returning the converted value
+        """
+        self.conversion = conversion
+        self.values = [conversion(value) for value in range(ADC_MAX + 1)]
+        self._array = None
+
+    def __getitem__(self, value):
+        """
+        Convert one ADC value
+        """
+        return self.values[value]
+
+    def __len__(self):
+        return len(self.values)
+
+    def convert(self, samples):
+        """
+        Convert a list (or other sequence) of ADC values, returning a list. A numpy array of ADC values is
+        converted to a numpy array of floats.
+        """
+        if type(samples).__module__ == "numpy": # numpy is only imported by programs that use it
+            import numpy
+            if self._array is None:
+                self._array = numpy.array(self.values, dtype = float)
+            return self._array[samples]
+        values = self.values
+        return [values[sample] for sample in samples]
+
+
+TEMPERATURE = ADCTable(thermistor_temperature)  # dTemp, degrees C
+VOLTAGE = ADCTable(pin1_voltage)                # volts
+PRESSURE_500 = ADCTable(pressure_500)           # dPressure 500, kPa
+PRESSURE_250 = ADCTable(pressure_250)           # dPressure 250, kPa
@@ -0,0 +1,729 @@
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2017 Dexter Industries
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# Emulated BrickPi3 for running BrickPi3 programs without the hardware.
+#
+# The emulator stands in for the BrickPi3 firmware on the other end of the SPI bus. It answers the same SPI
+# messages as the real firmware, runs the motor position/speed control loops, and drives a physical model
+# of each motor (see DCMotor) so that the encoder and speed readings respond realistically to
+# set_motor_power, set_motor_position, set_motor_dps, set_motor_limits and the kP/kD constants.
+#
+# Time is simulated by SimClock. While a clock is installed, time.time and time.sleep (and friends) use
+# simulated time, so whole robot programs can run headless faster than real time:
+#
+#     python brickpi3_emulator.py --duration 30 ../../Projects/LineBot/LineBot.py
+#
+# Or from Python:
+#
+#     import brickpi3_emulator
+#     firmware = brickpi3_emulator.install()
+#     import brickpi3
+#     BP = brickpi3.BrickPi3()
+
+from __future__ import print_function
+from __future__ import division
+
+import sys
+import math
+import time
+import types
+
+BATTERY_VOLTAGE = 9.0 # the default emulated battery voltage
+
+TICK_TIME = 0.002          # how often the emulated firmware updates the motor control loops and motor models
+SPI_TRANSFER_TIME = 0.0002 # simulated time taken by each SPI transfer
+SENSOR_CONFIG_TIME = 0.1   # how long a sensor takes to become valid after set_sensor_type
+
+MANUFACTURER = "Dexter Industries"
+BOARD = "BrickPi3"
+HARDWARE_VERSION = 3002001
+FIRMWARE_VERSION = 1004000
+
+# message types and sensor types, as defined in brickpi3.py
+MESSAGE_TYPES = """
+    NONE,
+    GET_MANUFACTURER,
+    GET_NAME,
+    GET_HARDWARE_VERSION,
+    GET_FIRMWARE_VERSION,
+    GET_ID,
+    SET_LED,
+    GET_VOLTAGE_3V3,
+    GET_VOLTAGE_5V,
+    GET_VOLTAGE_9V,
+    GET_VOLTAGE_VCC,
+    SET_ADDRESS,
+    SET_SENSOR_TYPE,
+    GET_SENSOR_1,
+    GET_SENSOR_2,
+    GET_SENSOR_3,
+    GET_SENSOR_4,
+    I2C_TRANSACT_1,
+    I2C_TRANSACT_2,
+    I2C_TRANSACT_3,
+    I2C_TRANSACT_4,
+    SET_MOTOR_POWER,
+    SET_MOTOR_POSITION,
+    SET_MOTOR_POSITION_KP,
+    SET_MOTOR_POSITION_KD,
+    SET_MOTOR_DPS,
+    SET_MOTOR_DPS_KP,
+    SET_MOTOR_DPS_KD,
+    SET_MOTOR_LIMITS,
+    OFFSET_MOTOR_ENCODER,
+    GET_MOTOR_A_ENCODER,
+    GET_MOTOR_B_ENCODER,
+    GET_MOTOR_C_ENCODER,
+    GET_MOTOR_D_ENCODER,
+    GET_MOTOR_A_STATUS,
+    GET_MOTOR_B_STATUS,
+    GET_MOTOR_C_STATUS,
+    GET_MOTOR_D_STATUS,
+"""
+MSG = dict((name.strip(), number) for number, name in enumerate(MESSAGE_TYPES.replace(",", "").split()))
+
+SENSOR_TYPES = """
+    NONE, I2C, CUSTOM,
+    TOUCH, NXT_TOUCH, EV3_TOUCH,
+    NXT_LIGHT_ON, NXT_LIGHT_OFF,
+    NXT_COLOR_RED, NXT_COLOR_GREEN, NXT_COLOR_BLUE, NXT_COLOR_FULL, NXT_COLOR_OFF,
+    NXT_ULTRASONIC,
+    EV3_GYRO_ABS, EV3_GYRO_DPS, EV3_GYRO_ABS_DPS,
+    EV3_COLOR_REFLECTED, EV3_COLOR_AMBIENT, EV3_COLOR_COLOR, EV3_COLOR_RAW_REFLECTED, EV3_COLOR_COLOR_COMPONENTS,
+    EV3_ULTRASONIC_CM, EV3_ULTRASONIC_INCHES, EV3_ULTRASONIC_LISTEN,
+    EV3_INFRARED_PROXIMITY, EV3_INFRARED_SEEK, EV3_INFRARED_REMOTE,
+"""
+SENSOR = dict((name.strip(), number + 1) for number, name in enumerate(SENSOR_TYPES.replace(",", " ").split()))
+
+SENSOR_STATE_VALID_DATA = 0
+SENSOR_STATE_NOT_CONFIGURED = 1
+SENSOR_STATE_CONFIGURING = 2
+
+MOTOR_FLOAT = -128
+MOTOR_STATUS_LOW_VOLTAGE_FLOAT = 0x01
+MOTOR_STATUS_OVERLOADED = 0x02
+MOTOR_OVERLOAD_ERROR = 90   # degrees of position error at which the firmware reports the motor as overloaded
+MOTOR_LOW_VOLTAGE = 6.0     # the motors float when the battery voltage drops below this
+
+# sensor types that the real firmware replies to with the sensor type, state and one byte of data
+_SENSOR_8BIT = ["TOUCH", "NXT_TOUCH", "EV3_TOUCH", "NXT_ULTRASONIC", "EV3_COLOR_REFLECTED", "EV3_COLOR_AMBIENT",
+                "EV3_COLOR_COLOR", "EV3_ULTRASONIC_LISTEN", "EV3_INFRARED_PROXIMITY"]
+# ... with one 16-bit value
+_SENSOR_16BIT = ["NXT_LIGHT_ON", "NXT_LIGHT_OFF", "NXT_COLOR_RED", "NXT_COLOR_GREEN", "NXT_COLOR_BLUE", "NXT_COLOR_OFF",
+                 "EV3_GYRO_ABS", "EV3_GYRO_DPS", "EV3_ULTRASONIC_CM", "EV3_ULTRASONIC_INCHES"]
+# ... with a list of 16-bit values
+_SENSOR_16BIT_LIST = ["EV3_COLOR_RAW_REFLECTED", "EV3_GYRO_ABS_DPS", "EV3_COLOR_COLOR_COMPONENTS"]
+
+# EV3 IR remote button combinations, in the order of the codes sent by the remote (starting at code 1)
+_IR_REMOTE_CODES = [[1, 0, 0, 0, 0], [0, 1, 0, 0, 0], [0, 0, 1, 0, 0], [0, 0, 0, 1, 0], [1, 0, 1, 0, 0],
+                    [1, 0, 0, 1, 0], [0, 1, 1, 0, 0], [0, 1, 0, 1, 0], [0, 0, 0, 0, 1], [1, 1, 0, 0, 0],
+                    [0, 0, 1, 1, 0]]
+
+# the value of a sensor with no source, for the sensor types that don't read a single number
+_SENSOR_DEFAULTS = {"CUSTOM": (0, 0, 0, 0),
+                    "NXT_COLOR_FULL": (0, 0, 0, 0, 0),
+                    "EV3_COLOR_RAW_REFLECTED": (0, 0),
+                    "EV3_GYRO_ABS_DPS": (0, 0),
+                    "EV3_COLOR_COLOR_COMPONENTS": (0, 0, 0, 0),
+                    "EV3_INFRARED_SEEK": [(0, 0)] * 4,
+                    "EV3_INFRARED_REMOTE": [(0, 0, 0, 0, 0)] * 4}
+
+
+def _signed(value, bits):
+    if value & (1 << (bits - 1)):
+        return value - (1 << bits)
+    return value
+
+
+def _split(value, count):
+    # split an integer into a list of count bytes, MSB first
+    return [((int(value) >> (8 * (count - 1 - b))) & 0xFF) for b in range(count)]
+
+
+class SimClock(object):
+    """
+    A simulated clock that can run faster (or slower) than real time
+
+    While installed (see install and uninstall), time.time, time.monotonic, time.perf_counter (where the
+    Python version has them) and time.sleep use simulated time. Sleeping advances the simulated time, and
+    calls the listeners (e.g. the emulated firmware) so that they can update the motor models.
+    """
+
+    def __init__(self, speed = 0, start = None):
+        """
+        Keyword arguments:
+        speed = 0 -- how many times faster than real time to run. 0 runs as fast as possible.
+        start = None -- the initial value returned by time(). Defaults to the current real time.
+        """
+        self.speed = speed
+        self.start = time.time() if start is None else start
+        self.elapsed = 0.0
+        self.deadline = None
+        self.listeners = []
+        self._saved = None
+        self._real_sleep = time.sleep
+
+    def time(self):
+        """
+        Get the simulated time in seconds
+        """
+        return self.start + self.elapsed
+
+    def monotonic(self):
+        """
+        Get the simulated time in seconds since the clock was created
+        """
+        return self.elapsed
+
+    def advance(self, seconds):
+        """
+        Advance the simulated time, updating the listeners along the way
+
+        Keyword arguments:
+        seconds -- how far to advance the simulated time
+
+        Raises KeyboardInterrupt once the deadline (if set) has passed, so that programs exit the same way as
+        when Ctrl+C is pressed.
+        """
+        if seconds > 0:
+            for listener in self.listeners:
+                listener.advance_to(self.elapsed + seconds)
+            self.elapsed += seconds
+            if self.speed > 0:
+                self._real_sleep(seconds / self.speed)
+        if self.deadline is not None and self.elapsed >= self.deadline:
+            self.deadline = None
+            raise KeyboardInterrupt
+
+    def sleep(self, seconds):
+        """
+        Sleep for the specified simulated time
+        """
+        self.advance(max(seconds, 0))
+
+    def install(self):
+        """
+        Replace the time module functions with the simulated ones
+        """
+        if self._saved is None:
+            replacements = {"time" : self.time, "monotonic" : self.monotonic, "perf_counter" : self.monotonic,
+                            "sleep" : self.sleep}
+            # Python 2 has no time.monotonic or time.perf_counter
+            self._saved = dict((name, getattr(time, name)) for name in replacements if hasattr(time, name))
+            for name in self._saved:
+                setattr(time, name, replacements[name])
+
+    def uninstall(self):
+        """
+        Restore the original time module functions
+        """
+        if self._saved is not None:
+            for name, function in self._saved.items():
+                setattr(time, name, function)
+            self._saved = None
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, *args):
+        self.uninstall()
+
+
+class DCMotor(object):
+    """
+    Model of a DC gear motor with an encoder on the output shaft, and optionally an external gear train and load
+
+    The default constants are approximately those of a LEGO EV3 large motor. Subclass and override step to
+    plug in a different model (e.g. one that is coupled to a model of the robot).
+    """
+
+    def __init__(self, resistance = 6.69, kt = 0.317, kb = 0.468, inertia = 0.0012, friction = 0.0022,
+                 static_friction = 0.01, gear_ratio = 1, load_inertia = 0, load_torque = 0):
+        """
+        Keyword arguments:
+        resistance -- armature resistance in ohms
+        kt -- torque constant in Nm/A, at the motor output shaft
+        kb -- back EMF constant in V/(rad/s), at the motor output shaft
+        inertia -- motor and gearbox inertia in kg m^2, at the motor output shaft
+        friction -- viscous friction in Nm/(rad/s)
+        static_friction -- friction torque in Nm that has to be overcome to start the motor turning
+        gear_ratio -- ratio of the load speed to the motor speed (e.g. 12 / 36 for a 12 tooth pinion driving a 36 tooth gear)
+        load_inertia -- inertia of the load in kg m^2, at the load
+        load_torque -- constant torque in Nm opposing the load (e.g. the weight of an arm)
+        """
+        self.resistance = resistance
+        self.kt = kt
+        self.kb = kb
+        self.inertia = inertia
+        self.friction = friction
+        self.static_friction = static_friction
+        self.gear_ratio = gear_ratio
+        self.load_inertia = load_inertia
+        self.load_torque = load_torque
+
+        self.position = 0.0 # output shaft position in degrees
+        self.speed = 0.0    # output shaft speed in radians per second
+
+    def get_dps(self):
+        """
+        Get the motor speed in degrees per second
+        """
+        return math.degrees(self.speed)
+
+    def step(self, voltage, dt):
+        """
+        Update the motor model
+
+        Keyword arguments:
+        voltage -- the voltage applied to the motor, or None if the motor is floating
+        dt -- the time step in seconds
+        """
+        inertia = self.inertia + self.load_inertia * self.gear_ratio ** 2
+        load = self.load_torque * self.gear_ratio
+
+        # the motor speed follows w' = a - c * w over the time step. Solve it exactly, so that the electrical
+        # time constant doesn't limit the step size.
+        if voltage is None:
+            drive = 0.0
+            damping = self.friction
+        else:
+            drive = self.kt * voltage / self.resistance
+            damping = self.kt * self.kb / self.resistance + self.friction
+
+        if self.speed == 0 and abs(drive - load) <= self.static_friction:
+            return
+
+        torque = drive - load - math.copysign(self.static_friction, self.speed if self.speed != 0 else (drive - load))
+        c = damping / inertia
+        final = torque / damping
+        speed = final + (self.speed - final) * math.exp(-c * dt)
+        if self.speed != 0 and (speed > 0) != (self.speed > 0):
+            speed = 0.0 # friction stops the motor, rather than reversing it
+        self.position += math.degrees(self.speed + speed) / 2 * dt
+        self.speed = speed
+
+
+class _Motor(object):
+    # the firmware's state for one motor port
+
+    def __init__(self, model):
+        self.model = model
+        self.power = MOTOR_FLOAT
+        self.mode = "power"
+        self.target = 0
+        self.setpoint = 0.0
+        self.target_dps = 0
+        self.kp = 25
+        self.kd = 70
+        self.power_limit = 0
+        self.dps_limit = 0
+        self.offset = 0
+        self.output = 0   # the PWM power actually applied, in percent
+        self.flags = 0
+
+    def encoder(self):
+        return int(math.floor(self.model.position + 0.5)) - self.offset
+
+    def update(self, dt, battery):
+        position = self.model.position - self.offset
+        dps = self.model.get_dps()
+        self.flags = 0
+
+        if self.mode == "power":
+            power = self.power
+        else:
+            if self.mode == "position":
+                # move the setpoint towards the target, at no more than the speed limit
+                error = self.target - self.setpoint
+                if self.dps_limit > 0 and abs(error) > self.dps_limit * dt:
+                    speed = math.copysign(self.dps_limit, error)
+                else:
+                    speed = 0
+                    self.setpoint = self.target
+            else:
+                speed = self.target_dps
+                if self.dps_limit > 0:
+                    speed = max(-self.dps_limit, min(self.dps_limit, speed))
+            self.setpoint += speed * dt
+
+            error = self.setpoint - position
+            power = (self.kp * error / 10) + (self.kd * (speed - dps) / 1000)
+            limit = self.power_limit if self.power_limit > 0 else 100
+            power = max(-limit, min(limit, power))
+            if abs(error) > MOTOR_OVERLOAD_ERROR:
+                self.flags |= MOTOR_STATUS_OVERLOADED
+
+        if battery < MOTOR_LOW_VOLTAGE:
+            self.flags |= MOTOR_STATUS_LOW_VOLTAGE_FLOAT
+            power = MOTOR_FLOAT
+
+        if power == MOTOR_FLOAT:
+            self.output = 0
+            self.model.step(None, dt)
+        else:
+            power = max(-100, min(100, power))
+            self.output = int(power)
+            self.model.step(power / 100 * battery, dt)
+
+
+class _Sensor(object):
+    # the firmware's state for one sensor port
+
+    def __init__(self):
+        self.type = SENSOR["NONE"]
+        self.configured_at = 0
+        self.source = None
+        self.i2c = None
+        self.i2c_reply = []
+
+    def state(self, now):
+        if self.type == SENSOR["NONE"]:
+            return SENSOR_STATE_NOT_CONFIGURED
+        if now < self.configured_at + SENSOR_CONFIG_TIME:
+            return SENSOR_STATE_CONFIGURING
+        return SENSOR_STATE_VALID_DATA
+
+
+class BrickPi3Firmware(object):
+    """
+    Emulated BrickPi3 firmware, with the same interface as spidev.SpiDev
+
+    Motors are modeled by DCMotor instances (one per port, see motors). Sensor values come from the sources
+    set with set_sensor_source.
+    """
+
+    def __init__(self, clock = None, address = 1, battery = BATTERY_VOLTAGE, motors = None):
+        """
+        Keyword arguments:
+        clock = None -- the SimClock to use. Defaults to a new SimClock running as fast as possible.
+        address = 1 -- the SPI address of the emulated BrickPi3
+        battery = BATTERY_VOLTAGE -- the emulated battery voltage
+        motors = None -- a list of 4 motor models for ports A to D. Defaults to four DCMotor instances.
+        """
+        self.clock = clock if clock is not None else SimClock()
+        self.clock.listeners.append(self)
+        self.address = address
+        self.battery = battery
+        self.id = [0x10 + b for b in range(16)]
+        self.led = -1
+        self.now = self.clock.monotonic()
+        if motors is None:
+            motors = [DCMotor() for m in range(4)]
+        self.motors = [_Motor(model) for model in motors]
+        self.sensors = [_Sensor() for s in range(4)]
+        self.trace = None
+        self.transfers = 0
+
+        # spidev.SpiDev attributes
+        self.max_speed_hz = 500000
+        self.mode = 0
+        self.bits_per_word = 8
+
+    def open(self, bus, device):
+        pass
+
+    def close(self):
+        pass
+
+    def set_motor_model(self, port, model):
+        """
+        Replace the model of the motor(s) on a port
+
+        Keyword arguments:
+        port -- The motor port(s). PORT_A, PORT_B, PORT_C, and/or PORT_D.
+        model -- a motor model with position, get_dps and step (see DCMotor)
+        """
+        for p in range(4):
+            if port & (1 << p):
+                self.motors[p].model = model
+
+    def set_sensor_source(self, port, source = None, i2c = None):
+        """
+        Set where the emulated sensor values come from
+
+        Keyword arguments:
+        port -- The sensor port(s). PORT_1, PORT_2, PORT_3, and/or PORT_4.
+        source -- a function taking the simulated time and returning the sensor value, in the same form as
+            brickpi3.BrickPi3.get_sensor returns it, or a constant value.
+        i2c -- for I2C sensors, a function taking the address, the list of bytes written and the number of
+            bytes to read, and returning the list of bytes read
+        """
+        for p in range(4):
+            if port & (1 << p):
+                self.sensors[p].source = source
+                self.sensors[p].i2c = i2c
+
+    def start_trace(self):
+        """
+        Start recording the state of the motors every firmware tick
+
+        Returns the trace list. Each entry is (time, [(power, encoder, dps) for each motor]).
+        """
+        self.trace = []
+        return self.trace
+
+    def advance_to(self, now):
+        """
+        Run the firmware control loops and the motor models up to the specified time. Called by the clock.
+        """
+        while self.now + TICK_TIME <= now:
+            self.now += TICK_TIME
+            self._tick(TICK_TIME)
+        if now > self.now:
+            self._tick(now - self.now)
+            self.now = now
+
+    def _tick(self, dt):
+        for motor in self.motors:
+            motor.update(dt, self.battery)
+        if self.trace is not None:
+            self.trace.append((self.now, [(m.output, m.encoder(), int(m.model.get_dps())) for m in self.motors]))
+
+    def _sensor_value(self, sensor, name):
+        if callable(sensor.source):
+            return sensor.source(self.clock.monotonic())
+        if sensor.source is None:
+            return _SENSOR_DEFAULTS.get(name, 0)
+        return sensor.source
+
+    def _sensor_reply(self, port_index, length):
+        # build the reply bytes for GET_SENSOR_n, starting at byte 4
+        sensor = self.sensors[port_index]
+        state = sensor.state(self.clock.monotonic())
+        if state != SENSOR_STATE_VALID_DATA:
+            return [sensor.type, state]
+
+        name = [n for n in SENSOR if SENSOR[n] == sensor.type][0]
+        if name == "I2C":
+            return [sensor.type, state] + list(sensor.i2c_reply)
+        value = self._sensor_value(sensor, name)
+        if name == "CUSTOM":
+            adc1, adc6, pin5, pin6 = value
+            data = [(pin5 & 0x01) | ((pin6 & 0x01) << 1), (adc6 >> 4) & 0xFF, ((adc6 & 0x0F) << 4) | ((adc1 >> 8) & 0x0F), adc1 & 0xFF]
+        elif name in _SENSOR_8BIT:
+            data = [int(value) & 0xFF]
+        elif name == "NXT_COLOR_FULL":
+            data = [value[0]] + [(v >> 2) & 0xFF for v in value[1:]]
+            data.append(((value[1] & 0x03) << 6) | ((value[2] & 0x03) << 4) | ((value[3] & 0x03) << 2) | (value[4] & 0x03))
+        elif name in _SENSOR_16BIT:
+            if name in ["EV3_ULTRASONIC_CM", "EV3_ULTRASONIC_INCHES"]:
+                value = value * 10
+            data = _split(int(value) & 0xFFFF, 2)
+        elif name in _SENSOR_16BIT_LIST:
+            data = []
+            for v in value:
+                data.extend(_split(int(v) & 0xFFFF, 2))
+        elif name == "EV3_INFRARED_SEEK":
+            data = []
+            for heading, distance in value:
+                data.extend([int(heading) & 0xFF, int(distance) & 0xFF])
+        elif name == "EV3_INFRARED_REMOTE":
+            data = []
+            for buttons in value:
+                buttons = list(buttons)
+                data.append(_IR_REMOTE_CODES.index(buttons) + 1 if buttons in _IR_REMOTE_CODES else 0)
+        else:
+            data = []
+        return [sensor.type, state] + data
+
+    def xfer2(self, data):
+        """
+        Handle one SPI transfer
+
+        Keyword arguments:
+        data -- a list of bytes sent by the Raspberry Pi
+
+        Returns a list of bytes of the same length, as the BrickPi3 would reply.
+        """
+        data = [int(b) for b in data]
+        reply = [0] * len(data)
+        self.transfers += 1
+        self.clock.advance(SPI_TRANSFER_TIME)
+        if len(data) < 2 or (data[0] != self.address and data[0] != 0):
+            return reply
+
+        message = data[1]
+        response = None # bytes to put in the reply starting at byte 4, for messages that read
+
+        if message == MSG["GET_MANUFACTURER"]:
+            response = [ord(c) for c in MANUFACTURER]
+        elif message == MSG["GET_NAME"]:
+            response = [ord(c) for c in BOARD]
+        elif message == MSG["GET_HARDWARE_VERSION"]:
+            response = _split(HARDWARE_VERSION, 4)
+        elif message == MSG["GET_FIRMWARE_VERSION"]:
+            response = _split(FIRMWARE_VERSION, 4)
+        elif message == MSG["GET_ID"]:
+            response = self.id
+        elif message == MSG["SET_LED"]:
+            self.led = _signed(data[2] & 0xFF, 8)
+        elif message == MSG["GET_VOLTAGE_3V3"]:
+            response = _split(3300, 2)
+        elif message == MSG["GET_VOLTAGE_5V"]:
+            response = _split(5000, 2)
+        elif message == MSG["GET_VOLTAGE_9V"]:
+            response = _split(9000, 2)
+        elif message == MSG["GET_VOLTAGE_VCC"]:
+            response = _split(int(self.battery * 1000), 2)
+        elif message == MSG["SET_ADDRESS"]:
+            if data[3:19] == self.id or not any(data[3:19]):
+                self.address = data[2]
+        elif message == MSG["SET_SENSOR_TYPE"]:
+            for p in range(4):
+                if data[2] & (1 << p):
+                    sensor = self.sensors[p]
+                    sensor.type = data[3]
+                    sensor.configured_at = self.clock.monotonic()
+                    sensor.i2c_reply = []
+                    if data[3] == SENSOR["I2C"] and len(data) > 12:
+                        self._i2c_transact(p, data[10], data[13:13 + data[12]], data[11])
+        elif MSG["GET_SENSOR_1"] <= message <= MSG["GET_SENSOR_4"]:
+            response = self._sensor_reply(message - MSG["GET_SENSOR_1"], len(data))
+        elif MSG["I2C_TRANSACT_1"] <= message <= MSG["I2C_TRANSACT_4"]:
+            self._i2c_transact(message - MSG["I2C_TRANSACT_1"], data[2], data[5:5 + data[4]], data[3])
+        elif message == MSG["SET_MOTOR_POWER"]:
+            for motor in self._motors(data[2]):
+                motor.mode = "power"
+                motor.power = _signed(data[3] & 0xFF, 8)
+        elif message == MSG["SET_MOTOR_POSITION"]:
+            for motor in self._motors(data[2]):
+                if motor.mode != "position":
+                    motor.setpoint = motor.model.position - motor.offset
+                motor.mode = "position"
+                motor.target = _signed((data[3] << 24) | (data[4] << 16) | (data[5] << 8) | data[6], 32)
+        elif message == MSG["SET_MOTOR_POSITION_KP"]:
+            for motor in self._motors(data[2]):
+                motor.kp = data[3]
+        elif message == MSG["SET_MOTOR_POSITION_KD"]:
+            for motor in self._motors(data[2]):
+                motor.kd = data[3]
+        elif message == MSG["SET_MOTOR_DPS"]:
+            for motor in self._motors(data[2]):
+                if motor.mode != "dps":
+                    motor.setpoint = motor.model.position - motor.offset
+                motor.mode = "dps"
+                motor.target_dps = _signed((data[3] << 8) | data[4], 16)
+        elif message == MSG["SET_MOTOR_LIMITS"]:
+            for motor in self._motors(data[2]):
+                motor.power_limit = data[3]
+                motor.dps_limit = (data[4] << 8) | data[5]
+        elif message == MSG["OFFSET_MOTOR_ENCODER"]:
+            offset = _signed((data[3] << 24) | (data[4] << 16) | (data[5] << 8) | data[6], 32)
+            for motor in self._motors(data[2]):
+                motor.offset += offset
+                motor.target -= offset
+                motor.setpoint -= offset
+        elif MSG["GET_MOTOR_A_ENCODER"] <= message <= MSG["GET_MOTOR_D_ENCODER"]:
+            motor = self.motors[message - MSG["GET_MOTOR_A_ENCODER"]]
+            response = _split(motor.encoder() & 0xFFFFFFFF, 4)
+        elif MSG["GET_MOTOR_A_STATUS"] <= message <= MSG["GET_MOTOR_D_STATUS"]:
+            motor = self.motors[message - MSG["GET_MOTOR_A_STATUS"]]
+            response = ([motor.flags, motor.output & 0xFF] + _split(motor.encoder() & 0xFFFFFFFF, 4) +
+                        _split(int(motor.model.get_dps()) & 0xFFFF, 2))
+
+        if response is not None and len(data) > 3:
+            reply[3] = 0xA5
+            for b, value in enumerate(response[:len(data) - 4]):
+                reply[4 + b] = value
+        return reply
+
+    def _motors(self, port):
+        return [self.motors[p] for p in range(4) if port & (1 << p)]
+
+    def _i2c_transact(self, port_index, address, out_bytes, in_bytes):
+        sensor = self.sensors[port_index]
+        if sensor.i2c is not None:
+            sensor.i2c_reply = list(sensor.i2c(address, list(out_bytes), in_bytes))[:in_bytes]
+        else:
+            sensor.i2c_reply = [0] * in_bytes
+
+
+def install(firmware = None, clock = None):
+    """
+    Install an emulated BrickPi3, so that brickpi3.BrickPi3 talks to it instead of the hardware
+
+    brickpi3 imports spidev, so on a computer without the spidev module, this must be called before brickpi3 is
+    imported: it installs a spidev module whose SpiDev is the emulated firmware. If brickpi3 is already imported
+    (e.g. with the real spidev module), its SPI device (brickpi3.BP_SPI) is replaced by the emulated firmware,
+    so all its BrickPi3 objects talk to the emulator from then on.
+
+    Keyword arguments:
+    firmware = None -- the BrickPi3Firmware to install. Defaults to a new one.
+    clock = None -- the SimClock for a new BrickPi3Firmware. Ignored if firmware is specified.
+
+    Returns the installed BrickPi3Firmware. Its clock is installed as well.
+    """
+    if firmware is None:
+        firmware = BrickPi3Firmware(clock)
+
+    spidev = types.ModuleType("spidev")
+    spidev.SpiDev = lambda: firmware
+    sys.modules["spidev"] = spidev
+
+    brickpi3 = sys.modules.get("brickpi3")
+    if brickpi3 is not None:
+        brickpi3.BP_SPI = firmware
+
+    firmware.clock.install()
+    return firmware
+
+
+def run(path, duration = None, speed = 0, firmware = None):
+    """
+    Run a BrickPi3 program against the emulated BrickPi3
+
+    Keyword arguments:
+    path -- the program's file name
+    duration = None -- the simulated time in seconds after which the program is interrupted (as if Ctrl+C was
+        pressed). None runs until the program exits.
+    speed = 0 -- how many times faster than real time to run. 0 runs as fast as possible.
+    firmware = None -- the BrickPi3Firmware to use. Defaults to a new one.
+
+    Returns the BrickPi3Firmware, with the motor trace recorded (see BrickPi3Firmware.start_trace).
+    """
+    import os
+    import runpy
+
+    if firmware is None:
+        firmware = BrickPi3Firmware(SimClock(speed))
+    firmware.start_trace()
+    firmware.clock.deadline = duration
+    install(firmware)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(path)))
+    try:
+        runpy.run_path(path, run_name = "__main__")
+    except (SystemExit, KeyboardInterrupt):
+        pass
+    finally:
+        firmware.clock.uninstall()
+    return firmware
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description = "Run a BrickPi3 program against an emulated BrickPi3.")
+    parser.add_argument("program", help = "the BrickPi3 program to run")
+    parser.add_argument("--duration", type = float, default = None, help = "simulated seconds to run for")
+    parser.add_argument("--speed", type = float, default = 0, help = "times faster than real time (default as fast as possible)")
+    parser.add_argument("--trace", default = None, help = "write the motor trace to this CSV file")
+    args = parser.parse_args()
+
+    start = time.time()
+    firmware = run(args.program, args.duration, args.speed)
+    wall = time.time() - start
+
+    print("")
+    print("Simulated %.2f seconds in %.2f seconds (%d SPI transfers)." % (firmware.clock.monotonic(), wall, firmware.transfers))
+
+    if args.trace:
+        with open(args.trace, "w") as f:
+            f.write("time," + ",".join("%s_power,%s_encoder,%s_dps" % (m, m, m) for m in "ABCD") + "\n")
+            for now, motors in firmware.trace:
+                f.write("%.4f," % now + ",".join("%d,%d,%d" % state for state in motors) + "\n")
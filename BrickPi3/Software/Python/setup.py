@@ -14,6 +14,6 @@ setuptools.setup(
     description="Drivers and examples for using the BrickPi3 in Python",
     author="Dexter Industries",
     url="http://www.dexterindustries.com/BrickPi/",
-    py_modules=['brickpi3'],
+    py_modules=['brickpi3', 'brickpi3_emulator', 'brickpi3_analog'],
     install_requires=['spidev']
 )
@@ -0,0 +1,50 @@
+from __future__ import print_function
+from __future__ import division
+
+import math
+
+import brickpi3_analog
+
+
+def reference_temperature(value):
+    # the dTemp conversion as it was worked out on every reading
+    _a = [0.003357042,         0.003354017,        0.0033530481,       0.0033536166]
+    _b = [0.00025214848,       0.00025617244,      0.00025420230,      0.000253772]
+    _c = [0.0000033743283,     0.0000021400943,    0.0000011431163,    0.00000085433271]
+    _d = [-0.000000064957311, -0.000000072405219, -0.000000069383563, -0.000000087912262]
+    RtRt25 = (float)(value) / (4095 - value)
+    lnRtRt25 = math.log(RtRt25)
+    if (RtRt25 > 3.277):
+        i = 0
+    elif (RtRt25 > 0.3599):
+        i = 1
+    elif (RtRt25 > 0.06816):
+        i = 2
+    else:
+        i = 3
+    temp = 1.0 / (_a[i] + (_b[i] * lnRtRt25) + (_c[i] * lnRtRt25 * lnRtRt25) + (_d[i] * lnRtRt25 * lnRtRt25 * lnRtRt25))
+    return temp - 273.15
+
+
+def test_temperature_table():
+    assert(len(brickpi3_analog.TEMPERATURE) == 4096)
+    for value in range(1, 4095):
+        assert(brickpi3_analog.TEMPERATURE[value] == reference_temperature(value))
+    assert(math.isnan(brickpi3_analog.TEMPERATURE[0]))
+    assert(math.isnan(brickpi3_analog.TEMPERATURE[4095]))
+
+
+def test_table_convert():
+    samples = [1, 1000, 2048, 4094]
+    assert(brickpi3_analog.TEMPERATURE.convert(samples) == [reference_temperature(value) for value in samples])
+    assert(brickpi3_analog.PRESSURE_500.convert([2048]) == [((2048 / 4095) - 0.04) / 0.0018])
+    try:
+        import numpy
+    except ImportError:
+        return
+    converted = brickpi3_analog.TEMPERATURE.convert(numpy.array(samples))
+    assert(list(converted) == [reference_temperature(value) for value in samples])
+
+if __name__ == '__main__':
+    test_temperature_table()
+    test_table_convert()
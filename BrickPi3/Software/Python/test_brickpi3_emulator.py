@@ -0,0 +1,132 @@
+from __future__ import print_function
+from __future__ import division
+
+import math
+import time
+
+import brickpi3_emulator
+from brickpi3_emulator import BrickPi3Firmware, DCMotor, SimClock
+
+# brickpi3 imports spidev, so install the emulator before importing it. Each test installs its own.
+brickpi3_emulator.install().clock.uninstall()
+import brickpi3
+
+
+def emulated():
+    # a BrickPi3 talking to a new emulated BrickPi3, and the emulated firmware. Uninstall the clock when done.
+    firmware = brickpi3_emulator.install(BrickPi3Firmware())
+    return brickpi3.BrickPi3(), firmware
+
+
+def test_dc_motor_speed():
+    motor = DCMotor()
+    for i in range(2000):
+        motor.step(9.0, 0.002)
+    # at full speed the drive torque is balanced by the back EMF, friction and static friction
+    final = (motor.kt * 9.0 / motor.resistance - motor.static_friction) / (motor.kt * motor.kb / motor.resistance + motor.friction)
+    assert(abs(motor.speed - final) < 1e-6)
+    assert(motor.position > 0)
+
+    # floating, the motor coasts to a stop and doesn't reverse
+    for i in range(2000):
+        motor.step(None, 0.002)
+    assert(motor.speed == 0)
+    position = motor.position
+    motor.step(None, 0.002)
+    assert(motor.position == position)
+
+
+def test_dc_motor_static_friction():
+    motor = DCMotor()
+    motor.step(0.1, 0.002) # not enough torque to start turning
+    assert(motor.speed == 0 and motor.position == 0)
+    motor = DCMotor(load_torque = 0.2)
+    motor.step(0, 0.002)   # the load turns the motor backwards
+    assert(motor.speed < 0)
+
+
+def test_motor_position_limits():
+    BP, firmware = emulated()
+    try:
+        trace = firmware.start_trace()
+        BP.set_motor_limits(BP.PORT_A, 0, 200)
+        BP.set_motor_position(BP.PORT_A, 360)
+        time.sleep(1)
+        assert(BP.get_motor_encoder(BP.PORT_A) < 250) # 360 degrees at 200 dps takes 1.8 seconds
+        time.sleep(2)
+        assert(abs(BP.get_motor_encoder(BP.PORT_A) - 360) <= 2)
+        assert(max(abs(motors[0][2]) for now, motors in trace) <= 220)
+        assert(not BP.get_motor_status(BP.PORT_A)[0] & brickpi3_emulator.MOTOR_STATUS_OVERLOADED)
+    finally:
+        firmware.clock.uninstall()
+
+
+def test_motor_dps():
+    BP, firmware = emulated()
+    try:
+        BP.set_motor_dps(BP.PORT_B, -300)
+        time.sleep(1)
+        assert(abs(BP.get_motor_status(BP.PORT_B)[3] + 300) <= 15)
+        start = BP.get_motor_encoder(BP.PORT_B)
+        time.sleep(1)
+        assert(abs(BP.get_motor_encoder(BP.PORT_B) - start + 300) <= 15)
+        assert(BP.get_motor_encoder(BP.PORT_A) == 0) # the other motors are left alone
+    finally:
+        firmware.clock.uninstall()
+
+
+def test_sensors_without_source():
+    BP, firmware = emulated()
+    try:
+        for name, number in sorted(brickpi3_emulator.SENSOR.items()):
+            if name == "NONE":
+                continue
+            params = 0
+            if name == "CUSTOM":
+                params = [BP.SENSOR_CUSTOM.PIN1_ADC]
+            elif name == "I2C":
+                params = [0, 0]
+            BP.set_sensor_type(BP.PORT_1, number, params)
+            time.sleep(brickpi3_emulator.SENSOR_CONFIG_TIME)
+            # every sensor type reads a value of its own shape, zero when it's a number
+            value = BP.get_sensor(BP.PORT_1)
+            if name in ("CUSTOM", "NXT_COLOR_FULL", "EV3_COLOR_RAW_REFLECTED", "EV3_GYRO_ABS_DPS",
+                        "EV3_COLOR_COLOR_COMPONENTS", "EV3_INFRARED_SEEK", "EV3_INFRARED_REMOTE"):
+                assert(len(value) > 0)
+            elif name != "I2C":
+                assert(value == 0)
+    finally:
+        firmware.clock.uninstall()
+
+
+def test_clock_deadline():
+    clock = SimClock(start = 100)
+    clock.deadline = 1
+    clock.sleep(0.5)
+    assert(clock.time() == 100.5)
+    try:
+        clock.sleep(0.6)
+        assert(False)
+    except KeyboardInterrupt:
+        pass
+    assert(clock.monotonic() == 1.1)
+    assert(clock.deadline is None)
+    clock.sleep(1) # only interrupts once
+
+
+def test_clock_install():
+    saved = time.time, time.sleep
+    with SimClock(start = 100) as clock:
+        assert(time.time() == 100)
+        time.sleep(60)
+        assert(time.time() == 160)
+    assert((time.time, time.sleep) == saved)
+
+if __name__ == '__main__':
+    test_dc_motor_speed()
+    test_dc_motor_static_friction()
+    test_motor_position_limits()
+    test_motor_dps()
+    test_sensors_without_source()
+    test_clock_deadline()
+    test_clock_install()
@@ -2,12 +2,17 @@ from __future__ import print_function
 from __future__ import division
 
 import scratch
-import re
+import collections
 import string
 import math
 import time
 import sys
+import socket
+import select
+import errno
+import argparse
 import brickpi3
+import brickpi3_analog
 import os # needed to create folders
 try:
     sys.path.insert(0, '/home/pi/Dexter/PivotPi/Software/Scratch/')
@@ -26,8 +31,12 @@ except:
 
 ## Add what's required to have modal popup windows
 ## and handle crashes if any
-from Tkinter import *
-import tkMessageBox
+try:
+    from Tkinter import *
+    import tkMessageBox
+except ImportError: # Python 3
+    from tkinter import *
+    import tkinter.messagebox as tkMessageBox
 import atexit
 
 def error_box(in_string):
@@ -109,81 +118,164 @@ except IOError as error:
 except:
     error_box("Unknown Error, closing Scratch Interpreter")
 
+# the sensor types, longest first, so that e.g. EV3USCM isn't taken for EV3US
+SENSOR_KEYS = sorted(sensor_types.keys(), key=len, reverse=True)
+
+# the Scratch sensor names, worked out once
+SENSOR_STATUS_KEYS = ["S{} Status".format(port + 1) for port in range(4)]
+# for each port, a dictionary of sensor type: names of its values
+SENSOR_VALUE_KEYS = [dict((type, ["S{} {}".format(port + 1, name) for name in sensor_types[type][1:]])
+                          for type in sensor_types) for port in range(4)]
+ENCODER_KEYS = [("Encoder {}".format(name), "Encoder {} Status".format(name)) for name in "ABCD"]
+
+# how much a value has to change by before it is pushed to Scratch (see SensorPusher). Values that aren't
+# listed are pushed whenever they change.
+SENSOR_DEADBANDS = {
+    "US cm"     : 1,
+    "US Inch"   : 0.5,
+    "Gyro ABS"  : 1,
+    "Gyro DPS"  : 2,
+    "IR Prox"   : 1,
+    "Raw"       : 8,
+    "Temp"      : 0.2,
+    "Flex"      : 8,
+}
+ENCODER_DEADBAND = 2 # degrees
+
+# sensor name: deadband
+DEADBANDS = {}
+for port in range(4):
+    for type in sensor_types:
+        for key, name in zip(SENSOR_VALUE_KEYS[port][type], sensor_types[type][1:]):
+            DEADBANDS[key] = SENSOR_DEADBANDS.get(name, 0)
+for encoder_key, status_key in ENCODER_KEYS:
+    DEADBANDS[encoder_key] = ENCODER_DEADBAND
+
+POLL_RATE = 20   # how many times a second to read the sensors and encoders in push mode
+UPDATE_RATE = 10 # the most sensor updates to send to Scratch each second in push mode
+
+SCRATCH_PORT = 42001    # the Scratch remote sensor port
+CONNECT_RETRY_MIN = 0.5 # seconds to wait before trying to connect to Scratch again, doubling with every attempt
+CONNECT_RETRY_MAX = 8   # ... up to this
+
 SensorType = ["NONE", "NONE", "NONE", "NONE"]
 defaultCameraFolder="/home/pi/Desktop/"
 cameraFolder = defaultCameraFolder
 
-# temperature conversion lists for the dTemp sensor
-_a = [0.003357042,         0.003354017,        0.0033530481,       0.0033536166]
-_b = [0.00025214848,       0.00025617244,      0.00025420230,      0.000253772]
-_c = [0.0000033743283,     0.0000021400943,    0.0000011431163,    0.00000085433271]
-_d = [-0.000000064957311, -0.000000072405219, -0.000000069383563, -0.000000087912262]
-
 
 ##################################################################
 # HELPER FUNCTIONS
 ##################################################################
 
-def get_regex_sensors():
-    '''
-    generate a regex ready string with all the sensor_types keys
-    '''
-    list_of_sensors = ""
-
-    # sort the keys by length
-    sorted_keys = sorted(sensor_types.keys(), key=len)
-
-    # for each key ordered from longest to shortest
-    for key in reversed(sorted_keys):
-        if list_of_sensors != "":
-            list_of_sensors += "|"
-        list_of_sensors += key
-    return list_of_sensors
-
-
-def set_regex_string():
-    '''
-    Sets up the regex string, and the test_msgs for asserting
-
-    regex explanation:
-    1. (S[1-4]\s*({}):  S1 to S4, potential spaces,
-                        one of the key in sensor_types
-    2. S[1-4]\s*$:  S1 to S4, potential spaces, but no other characters
-    3. M(?:OTOR)?\s*[A-D]\s*(ON|FULL|STOP|OFF|[0-9+]+\s*%?):
-            M or MOTOR, followed by A to D
-            followed by keywords ON, FULL, STOP, OFF,
-            or a value with or without a % sign
-    4. UPDATE keyword
-    '''
-    regex_set_sensor = "S([1-4])\s*({})".format(get_regex_sensors())
-    # group 1 -> sensor port
-    # group 2 -> sensor type (as a string)
-
-    regex_read_single_sensor = "S([1-4])\s*$"
-    # group 3 -> sensor port
+# kinds of BrickPi3 commands
+READ_SENSOR = "READ_SENSOR"  # S1 to S4
+SET_SENSOR = "SET_SENSOR"    # S1 to S4 followed by a sensor type, e.g. S1 EV3US
+SET_MOTOR = "SET_MOTOR"      # M or MOTOR, A to D, optionally P, POS or POSITION, then ON, FULL, STOP, OFF or a number
+UPDATE = "UPDATE"            # UPDATE
+RESET = "RESET"              # RESET
+READ_MOTOR = "READ_MOTOR"    # M or MOTOR, A to D
+
+MOTOR_NAMES = "ABCD"
+MOTOR_WORDS = [("ON", 100), ("FULL", 100), ("STOP", 0), ("OFF", 0)]
+POSITION_WORDS = ["POSITION", "POS", "P"]
+
+# a parsed command
+#   kind -- one of the command kinds above
+#   port -- the sensor or motor port index (0 to 3), or None
+#   value -- the sensor type for SET_SENSOR, the motor power or position for SET_MOTOR (None if it isn't a
+#            valid number), otherwise None
+#   position -- True for a SET_MOTOR position command
+BrickPiCommand = collections.namedtuple("BrickPiCommand", "kind port value position")
+
+# the number of distinct messages to remember the parsed command for
+COMMAND_CACHE_SIZE = 256
+command_cache = collections.OrderedDict()
+
+
+def _skip_spaces(text, pos):
+    while pos < len(text) and text[pos].isspace():
+        pos += 1
+    return pos
+
+
+def _parse_number(text, pos):
+    # a number is an optional - followed by digits and dots. Returns (the number or None if it isn't valid,
+    # whether there was a number at all)
+    end = pos + 1 if text.startswith("-", pos) else pos
+    start = end
+    while end < len(text) and text[end] in "0123456789.":
+        end += 1
+    if end == start:
+        return None, False
+    try:
+        return int(float(text[pos:end])), True
+    except ValueError:
+        return None, True
+
+
+def _parse_motor_target(text, pos, position):
+    # the target of a SET_MOTOR command, or False if there is none
+    for word, power in MOTOR_WORDS:
+        if text.startswith(word, pos):
+            return None if position else power
+    value, found = _parse_number(text, pos)
+    return value if found else False
+
+
+def _parse(text):
+    text = text.strip().upper()
+
+    if text.startswith("S") and text[1:2] in ("1", "2", "3", "4"):
+        port = int(text[1]) - 1
+        pos = _skip_spaces(text, 2)
+        if pos == len(text):
+            return BrickPiCommand(READ_SENSOR, port, None, False)
+        for sensor in SENSOR_KEYS:
+            if text.startswith(sensor, pos):
+                return BrickPiCommand(SET_SENSOR, port, sensor, False)
+        return None
 
-    # Nicole's regex
-    # (?:M)(?:OTOR)?\s*([A-D])\s*(?:(ON|FULL|STOP|OFF|-?[0-9.]+\s*%?)|(?:(P)(?:osition|os)?\s*(-?[0-9.]+)))
+    if text.startswith("M"):
+        pos = _skip_spaces(text, 5 if text.startswith("MOTOR") else 1)
+        if text[pos:pos + 1] and text[pos] in MOTOR_NAMES:
+            port = MOTOR_NAMES.index(text[pos])
+            pos = _skip_spaces(text, pos + 1)
+            for word in POSITION_WORDS:
+                if text.startswith(word, pos):
+                    target = _parse_motor_target(text, _skip_spaces(text, pos + len(word)), True)
+                    if target is not False:
+                        return BrickPiCommand(SET_MOTOR, port, target, True)
+            target = _parse_motor_target(text, pos, False)
+            if target is not False:
+                return BrickPiCommand(SET_MOTOR, port, target, False)
+            return BrickPiCommand(READ_MOTOR, port, None, False)
+        return None
 
-    regex_set_motor = "(?:M)(?:OTOR)?\s*([A-D])\s*(P(?:osition|os)?)?\s*(ON|FULL|STOP|OFF|-?[0-9.]+)\s*%?"
-    # group 4 -> motor port
-    # group 5 -> motor speed
+    if text.startswith(UPDATE):
+        return BrickPiCommand(UPDATE, None, None, False)
+    if text.startswith(RESET):
+        return BrickPiCommand(RESET, None, None, False)
+    return None
 
-    regex_set_update_all = "\s*(UPDATE)\s*"
-    # group 6 -> "UPDATE"
 
-    # Add a reset
-    regex_reset = "\s*(RESET)\s*"
+def parse_BrickPi_msg(msg):
+    """
+    Parse a broadcast message
 
-    # Read a motor speed
-    reget_read_motor = "(?:M)(?:OTOR)?\s*([A-D])\s*"
+    The parsed command for each distinct message is remembered (up to COMMAND_CACHE_SIZE of them, forgetting
+    the least recently used first), as Scratch programs send the same few messages over and over.
 
-    return ("^" + regex_set_sensor + "|" +
-                regex_read_single_sensor + "|" +
-                regex_set_motor + "|" +
-                regex_set_update_all + "|" +
-                regex_reset + "|" +
-                reget_read_motor)
+    Returns:
+        a BrickPiCommand, or None if the message isn't a BrickPi3 command
+    """
+    try:
+        command = command_cache.pop(msg)
+    except KeyError:
+        command = _parse(msg)
+        if len(command_cache) >= COMMAND_CACHE_SIZE:
+            command_cache.popitem(last=False)
+    command_cache[msg] = command
+    return command
 
 
 def is_BrickPi_msg(msg):
@@ -193,28 +285,25 @@ def is_BrickPi_msg(msg):
         True if valid for BrickPi3
         False otherwise
     '''
-    retval = compiled_regexBP.match(msg.strip())
+    return parse_BrickPi_msg(msg) is not None
 
-    if retval is None:
-        return False
-    else:
-        # print ("Recognized {}".format(msg))
-        return True
 
-
-def read_sensor(port_index):
+def read_sensor(port_index, verbose = True):
 
     return_dict = {}
     bp3_port = bp3ports[port_index]
+    status_key = SENSOR_STATUS_KEYS[port_index]
 
     type = SensorType[port_index]
+    value_keys = SENSOR_VALUE_KEYS[port_index][type]
     try:
         value = BP3.get_sensor(bp3_port)
         valid_reading = True
     except Exception as e:
-        print ("failing to read_sensor: {}".format(e))
+        if verbose:
+            print ("failing to read_sensor: {}".format(e))
         valid_reading = False
-        return_dict["S{} Status".format(port_index+1)] = e
+        return_dict[status_key] = e
 
     try:
         if valid_reading:
@@ -231,38 +320,25 @@ def read_sensor(port_index):
                     # using zip will iterate over both lists
                     # allowing iteration over the shortest of the
                     # two lists
-                    for out_str, out_value in zip(sensor_types[type][1:], value):
-                        return_dict["S{} {}".format((port_index+1), out_str)] = out_value
-                        return_dict["S{} Status".format(port_index+1)] = success_code
+                    for out_key, out_value in zip(value_keys, value):
+                        return_dict[out_key] = out_value
+                        return_dict[status_key] = success_code
 
                 # TypeError is generated if we attempt to iterate over
                 # a non-iterable object
                 # in other words, value was a number, not a list
                 except TypeError:
                     # for a sensor returning just one value:
-                    return_dict["S{} {}".format((port_index+1),sensor_types[type][1])] = value
-                    return_dict["S{} Status".format(port_index+1)] = success_code
+                    return_dict[value_keys[0]] = value
+                    return_dict[status_key] = success_code
 
             elif type == 'TEMP':
-                temp = 0
-                if value[0] == 4095:
-                    return_dict["S{} Status".format((port_index+1))] = "SENSOR_ERROR"
-                elif error == BP3.SUCCESS:
-                    RtRt25 = (float)(value[0]) / (4095 - value[0])
-                    lnRtRt25 = math.log(RtRt25)
-                    if (RtRt25 > 3.277):
-                        i = 0
-                    elif (RtRt25 > 0.3599):
-                        i = 1
-                    elif (RtRt25 > 0.06816):
-                        i = 2
-                    else:
-                        i = 3
-                    temp = 1.0 / (_a[i] + (_b[i] * lnRtRt25) + (_c[i] * lnRtRt25 * lnRtRt25) + (_d[i] * lnRtRt25 * lnRtRt25 * lnRtRt25))
-                    temp = temp - 273.15
-
-                return_dict["S{} {}".format((port_index + 1), sensor_types[type][1])] = temp
-                return_dict["S{} Status".format(port_index+1)] = success_code
+                temp = brickpi3_analog.TEMPERATURE[value[0]]
+                if math.isnan(temp): # 4095 when the sensor is disconnected
+                    return_dict[status_key] = "SENSOR_ERROR"
+                else:
+                    return_dict[value_keys[0]] = temp
+                    return_dict[status_key] = success_code
             else:
                 # we really should never get here. Should we handle this case
                 # or just let it pass?
@@ -276,13 +352,14 @@ def read_sensor(port_index):
 def read_encoder_values(port_index, name):
     # unpack the tuple here as Scratch can't do it
     return_encoder = {}
+    encoder_key, status_key = ENCODER_KEYS[port_index]
 
     try:
         value = BP3.get_motor_encoder(bp3motors[port_index])
-        return_encoder["Encoder {}".format(name)] = value
-        return_encoder["Encoder {} Status".format(name)] = success_code
+        return_encoder[encoder_key] = value
+        return_encoder[status_key] = success_code
     except Exception as e:
-        return_encoder["Encoder {} Status".format(name)] = e
+        return_encoder[status_key] = e
         # print ("read_encoder_value: {}".format(e))
 
     return return_encoder
@@ -300,47 +377,10 @@ def BP_reset():
         BP3.set_sensor_type(bp3ports[port], sensor_types["NONE"][0])
 
 
-def handle_BrickPi_msg(msg):
-    '''
-    parses the message
-    returns a dictionary containing one or more sensor names
-        and corresponding values
-    '''
-    return_string = "0"
-    return_dict = {}
-
-    # if en_debug:
-        # print("received {}".format(msg.strip().lower()))
-
-    regObj = compiled_regexBP.match(msg.strip().lower())
-    if regObj is None:
-        if en_debug:
-            print ("BrickPi3 command is not recognized")
-        return None
-
-    # the following are set to None when they are not required
-    incoming_sensor_port = regObj.group(1)
-    incoming_sensor_type = regObj.group(2)
-    incoming_sensor_port_read = regObj.group(3)
-    incoming_motor_port = regObj.group(4)
-    incoming_motor_poscmd = regObj.group(5)
-    incoming_motor_target = regObj.group(6)
-    incoming_update_all = regObj.group(7)
-    incoming_reset = regObj.group(8)
-    incoming_motor_read = regObj.group(9)
-
-    motor_name_to_number = {'A': 0, 'B': 1, 'C': 2, 'D': 3}
-    motor_number_to_name = ['A', 'B', 'C', 'D']
-
+def read_sensor_command(command):
     # READ A SPECIFIC SENSOR
     # valid when the broadcast msg is simply S1 to S4
-    if incoming_sensor_port_read is not None:
-        # read that sensor value
-        port_index = int(incoming_sensor_port_read) - 1  # convert the 1-4 to 0-3
-        return_dict = read_sensor(port_index)
-
-        # if en_debug:
-        #     print("Reading sensor port {}".format(incoming_sensor_port_read))
+    return read_sensor(command.port)
 
 # hold off on this for now.
 # for the EV3 IR sensor in remote mode:
@@ -348,277 +388,455 @@ def handle_BrickPi_msg(msg):
 #       with either "none"
 #       or else something like "red up, blu dw"
 
+
+def set_sensor_command(command):
     # SET and READ SENSOR TYPE
-    elif incoming_sensor_port is not None and incoming_sensor_type is not None:
-        # set that port to that sensor
-        port_index = int(incoming_sensor_port) - 1  # convert the 1-4 to 0-3
-        bp3_portaddress = bp3ports[port_index]
-        sensor_type_string = incoming_sensor_type.upper()
-
-        if SensorType[port_index] != sensor_type_string:
-            # print("Setting sensor type")
-            if (sensor_type_string == "RAW"
-             or sensor_type_string == "TEMP"
-             or sensor_type_string == "FLEX"):
-                BP3.set_sensor_type(bp3_portaddress, BP3.SENSOR_TYPE.CUSTOM, [(BP3.SENSOR_CUSTOM.PIN1_ADC)])
-            else:
-                BP3.set_sensor_type(bp3_portaddress,
-                                    sensor_types[sensor_type_string][0])
+    port_index = command.port
+    bp3_portaddress = bp3ports[port_index]
+    sensor_type_string = command.value
+
+    if SensorType[port_index] != sensor_type_string:
+        # print("Setting sensor type")
+        if (sensor_type_string == "RAW"
+         or sensor_type_string == "TEMP"
+         or sensor_type_string == "FLEX"):
+            BP3.set_sensor_type(bp3_portaddress, BP3.SENSOR_TYPE.CUSTOM, [(BP3.SENSOR_CUSTOM.PIN1_ADC)])
+        else:
+            BP3.set_sensor_type(bp3_portaddress,
+                                sensor_types[sensor_type_string][0])
+
+        SensorType[port_index] = sensor_type_string
+
+        # don't return sensor Type as it seems useless and just makes a busier sensor value list
+        # return_dict["S{} Type".format(port_index + 1)] = sensor_type_string
+        if en_debug:
+            print("Setting sensor port {} to sensor {}".format(port_index + 1, sensor_type_string))
+        time.sleep(0.010)
 
-            SensorType[port_index] = sensor_type_string
+    return_dict = read_sensor(port_index)
 
-            # don't return sensor Type as it seems useless and just makes a busier sensor value list
-            # return_dict["S{} Type".format(incoming_sensor_port)] = sensor_type_string
-            if en_debug:
-                print("Setting sensor port {} to sensor {}".format(incoming_sensor_port, sensor_type_string))
-            time.sleep(0.010)
+    if en_debug:
+        print("Reading sensor port {}".format(port_index + 1))
+    return return_dict
 
-        return_dict.update(read_sensor(port_index))
 
-        if en_debug:
-            print("Reading sensor port {}".format(incoming_sensor_port))
+def set_motor_command(command):
+    # SET MOTOR SPEED OR POSITION
+    motor_index = command.port
+    if command.value is None:
+        raise ValueError("Invalid motor target")
 
-    # SET MOTOR SPEED
-    elif incoming_motor_port is not None :
+    if command.position:
+        BP3.set_motor_position(bp3motors[motor_index], command.value)
+    else:
+        BP3.set_motor_power(bp3motors[motor_index], command.value)
 
-        # convert A-D to 0-3
-        motor_index = motor_name_to_number[incoming_motor_port.upper()]
+    # returning Motor Target is meaningless as it's exactly what Scratch passed to us
+    return read_encoder_values(motor_index, MOTOR_NAMES[motor_index])
 
 
-        if incoming_motor_poscmd is None: # speed control
-            # if en_debug:
-            #     print("Motor speed {}".format(incoming_motor_target))
+def update_command(command):
+    # UPDATE ALL SENSOR VALUES
+    return_dict = {}
+    for port in range(0, 4):
+        return_dict.update(read_sensor(port))
+        return_dict.update(read_encoder_values(port, MOTOR_NAMES[port]))
 
-            if incoming_motor_target == "on" or \
-               incoming_motor_target == "full":
-                incoming_motor_target = 100
-            elif incoming_motor_target == "off" or incoming_motor_target == "stop":
-                incoming_motor_target = 0
-            else:
-                # try:
-                #    incoming_motor_target = int(float(incoming_motor_target))
-                incoming_motor_target = int(float(incoming_motor_target))
-                # except TypeError:
-                #    incoming_motor_target = "target error"
-
-            if incoming_motor_target != "target error":
-                BP3.set_motor_power(bp3motors[motor_index], incoming_motor_target)
-            else:
-                BP3.set_motor_power(bp3motors[motor_index], 0)
+    if en_debug:
+        print("Update all sensor values")
+    return return_dict
 
-        else:  # position control
-            # if en_debug:
-            #     print("Motor position {}".format(incoming_motor_target))
 
-            try:
-                incoming_motor_target = int(float(incoming_motor_target))
-                BP3.set_motor_position(bp3motors[motor_index],
-                                       incoming_motor_target)
-                # print("Motor {} moved to {}".format(motor_index,incoming_motor_target))
-            except TypeError:
-                incoming_motor_target = "target error"
-                BP3.set_motor_power(bp3motors[motor_index], 0)
+def reset_command(command):
+    # ADD A RESET - NP 19 Jan 2017
+    BP_reset()
+    return {}
 
-        # returning Motor Target is meaningless as it's exactly what Scratch passed to us
-        # return_dict["Motor Target {}".format(incoming_motor_port.upper())] = incoming_motor_target
 
-        return_dict.update(read_encoder_values(motor_index,motor_number_to_name[motor_index]))
+def read_motor_command(command):
+    # Read a motor position
+    return read_encoder_values(command.port, MOTOR_NAMES[command.port])
 
-        # this is error inducing when setting motor to a specific position
-        # if en_debug:
-        #     print("setting motor {} to speed {}".format(incoming_motor_port, incoming_motor_target))
 
-    # UPDATE ALL SENSOR VALUES
-    elif incoming_update_all is not None:
+# the function that handles each kind of command
+command_handlers = {
+    READ_SENSOR : read_sensor_command,
+    SET_SENSOR  : set_sensor_command,
+    SET_MOTOR   : set_motor_command,
+    UPDATE      : update_command,
+    RESET       : reset_command,
+    READ_MOTOR  : read_motor_command,
+}
 
-        for port in range(0, 4):
-            return_dict.update(read_sensor(port))
-            return_dict.update(read_encoder_values(port,motor_number_to_name[port]))
 
+def handle_BrickPi_msg(msg):
+    '''
+    parses the message
+    returns a dictionary containing one or more sensor names
+        and corresponding values
+    '''
+    command = parse_BrickPi_msg(msg)
+    if command is None:
         if en_debug:
-            print("Update all sensor values")
-
-    # ADD A RESET - NP 19 Jan 2017
-    elif incoming_reset is not None:
-        BP_reset()
+            print ("BrickPi3 command is not recognized")
+        return None
 
-    # Read a motor position
-    elif incoming_motor_read is not None:
-        motor_index = motor_name_to_number[incoming_motor_read.upper()]
-        # print("incoming motor read: {}".format(incoming_motor_read))
-        return_dict.update(read_encoder_values(motor_index,
-                                      motor_number_to_name[motor_index]))
+    return command_handlers[command.kind](command)
 
-    else:
-        if en_debug:
-            print("Unexpected error: {}".format(msg))
 
-    # if en_debug:
-    #     print("Returning ", return_dict)
+class SensorPusher(object):
+    '''
+    Push mode: reads the configured sensors and the motor encoders every poll_interval (ScratchLink calls
+    poll), and sends Scratch the values that changed (by more than their deadband, see DEADBANDS) without
+    waiting for a broadcast. Changes are collected and sent at most update_rate times a second.
+    '''
 
-    return(return_dict)
+    def __init__(self, poll_rate = POLL_RATE, update_rate = UPDATE_RATE):
+        self.poll_interval = 1.0 / poll_rate
+        self.update_interval = 1.0 / update_rate
+        self.scratch = None
+        self.reported = {}  # sensor name: the value Scratch has (or will have, once pending is sent)
+        self.pending = {}   # sensor name: value, to send with the next update
+        self.last_update = 0
+
+        # statistics
+        self.polls = 0
+        self.updates = 0
+        self.values_sent = 0
+
+    def connect(self, s):
+        '''
+        Push to a (new) Scratch connection, starting with all the values
+        '''
+        self.scratch = s
+        self.reported = {}
+        self.pending = {}
+
+    def check(self, values):
+        '''
+        Add the values that have changed by more than their deadband to the next update
+        '''
+        for key, value in values.items():
+            if isinstance(value, Exception):
+                value = str(value)
+            last = self.reported.get(key)
+            if key in self.reported and value == last:
+                continue
+            try:
+                if abs(value - last) < DEADBANDS.get(key, 0):
+                    continue
+            except TypeError: # not numbers, or the first value
+                pass
+            self.reported[key] = value
+            self.pending[key] = value
+
+    def sent(self, values):
+        '''
+        Note values that were sent to Scratch some other way (in reply to a broadcast), so they aren't sent again
+        '''
+        for key, value in values.items():
+            self.reported[key] = str(value) if isinstance(value, Exception) else value
+            self.pending.pop(key, None)
+
+    def poll(self, now):
+        '''
+        Read the sensors and encoders, and send the changes if it is time to
+        '''
+        self.polls += 1
+        for port in range(4):
+            if SensorType[port] != "NONE":
+                self.check(read_sensor(port, verbose = False))
+            self.check(read_encoder_values(port, MOTOR_NAMES[port]))
+
+        if self.pending and self.scratch is not None and now - self.last_update >= self.update_interval:
+            self.scratch.sensorupdate(self.pending)
+            self.updates += 1
+            self.values_sent += len(self.pending)
+            self.pending = {}
+            self.last_update = now
+
+
+class ScratchConnection(scratch.Scratch):
+    '''
+    A scratch.Scratch using a socket that ScratchLink has already connected
+    '''
 
+    def __init__(self, sock, host, port):
+        self._connected_socket = sock
+        scratch.Scratch.__init__(self, host, port)
 
-##################################################################
-# MAIN FUNCTION
-##################################################################
-compiled_regexBP = re.compile(set_regex_string(), re.IGNORECASE)
+    def connect(self):
+        self.socket = self._connected_socket
+        self.socket.setblocking(1)
+        self.connected = True
 
-if __name__ == '__main__':
 
-    connected = 0   # This variable tells us if we're successfully connected.
+class ScratchLink(object):
+    '''
+    Runs the bridge from one select loop: connecting to Scratch without blocking (retrying with exponential
+    backoff while Scratch isn't running or remote sensor connections aren't enabled), handling broadcasts as
+    they arrive, and polling the sensors in push mode. With nothing to do it waits in select, using no CPU.
+    '''
 
-    while(connected == 0):
-        startTime = time.time()
+    def __init__(self, host = "localhost", port = SCRATCH_PORT, pusher = None, on_ready = None):
+        '''
+        Keyword arguments:
+        host, port -- where Scratch listens for remote sensor connections
+        pusher -- the SensorPusher, for push mode
+        on_ready -- called with the connection every time it connects to Scratch (after broadcasting READY)
+        '''
+        self.host = host
+        self.port = port
+        self.pusher = pusher
+        self.on_ready = on_ready
+        self.s = None               # the ScratchConnection, once connected
+        self.connecting = None      # the socket, while connecting
+        self.retry_delay = CONNECT_RETRY_MIN
+        self.next_connect = 0       # when to try connecting next
+        self.next_poll = None       # when the pusher polls next
+        self.reported_waiting = False
+
+        # statistics
+        self.connects = 0
+        self.messages = 0
+
+    def start_connect(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(0)
         try:
-            s = scratch.Scratch()
-            if s.connected:
-                if en_debug:
-                    print("BrickPi3 Scratch: Connected to Scratch successfully")
-            connected = 1   # We are succesfully connected!  Exit Away!
-            # time.sleep(1)
-
-        except scratch.ScratchError:
-            arbitrary_delay = 10  # no need to issue error statement if at least 10 seconds haven't gone by.
-            if (time.time() - startTime > arbitrary_delay):
-                print ("BrickPi Scratch: Scratch is either not opened or remote sensor connections aren't enabled")
-
-    try:
-        s.broadcast('READY')
-    except NameError:
+            error = sock.connect_ex((self.host, self.port))
+        except socket.error as e: # e.g. the host name can't be looked up
+            error = e
+        if error in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            self.connecting = sock
+        else:
+            sock.close()
+            self.retry()
+
+    def finish_connect(self):
+        sock, self.connecting = self.connecting, None
+        if sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) != 0:
+            sock.close()
+            self.retry()
+            return
+
+        self.s = ScratchConnection(sock, self.host, self.port)
+        self.connects += 1
+        self.retry_delay = CONNECT_RETRY_MIN
+        self.reported_waiting = False
         if en_debug:
-            print ("BrickPi Scratch: Unable to Broadcast")
-
-    while True:
+            print("BrickPi3 Scratch: Connected to Scratch successfully")
+        self.s.broadcast('READY')
+        if self.pusher is not None:
+            self.pusher.connect(self.s)
+            self.next_poll = time.time()
+        if self.on_ready is not None:
+            self.on_ready(self.s)
+
+    def retry(self):
+        # try again later, waiting twice as long each time, up to CONNECT_RETRY_MAX
+        if en_debug and not self.reported_waiting:
+            print("BrickPi Scratch: Scratch is either not opened or remote sensor connections aren't enabled")
+            self.reported_waiting = True
+        self.next_connect = time.time() + self.retry_delay
+        self.retry_delay = min(self.retry_delay * 2, CONNECT_RETRY_MAX)
+
+    def disconnected(self, e):
+        if en_debug:
+            print("BrickPi Scratch: Scratch connection error, Retrying: {}".format(e))
+        self.s.disconnect()
+        self.s = None
+        self.next_poll = None
+        if self.pusher is not None:
+            self.pusher.connect(None)
+        self.retry()
+
+    def receive(self):
+        m = self.s.receive()
+
+        # keep this for reference.
+        # may work to detect File/new, File/Open but needs a change in scratchpi
+        # to detect "send_vars" msg as being valid
+        # if m[0] == "send_vars":  # File/New
+        #     print("Resetting everything")
+        #     SensorType = ["None","None","None","None"]
+        #     for port in range(4):
+        #         BP3.set_sensor_type(bp3ports[port], sensor_types["NONE"][0])
+        if m is None or m[0] == 'sensor-update':
+            return
+
+        self.messages += 1
         try:
-            m = s.receive()
-
-            while m is None or m[0] == 'sensor-update' :
-
-                # keep this for reference.
-                # may work to detect File/new, File/Open but needs a change in scratchpi
-                # to detect "send_vars" msg as being valid
-                # if m[0] == "send_vars":  # File/New
-                #     print("Resetting everything")
-                #     SensorType = ["None","None","None","None"]
-                #     for port in range(4):
-                #         BP3.set_sensor_type(bp3ports[port], sensor_types["NONE"][0])
+            handle_message(self.s, m[1], self.pusher)
+        except scratch.ScratchError:
+            raise
+        except Exception:
+            e = sys.exc_info()[0]
+            if en_debug:
+                print("BrickPi Scratch: Error %s" % e)
 
-                m = s.receive()
+    def run_once(self, timeout = None):
+        '''
+        Wait until there is something to do (or for at most timeout seconds), and do it
+        '''
+        now = time.time()
+        readable = []
+        writable = []
+        deadline = None
+        if self.s is not None:
+            readable.append(self.s.socket)
+            deadline = self.next_poll
+        elif self.connecting is not None:
+            writable.append(self.connecting)
+        elif self.next_connect <= now:
+            self.start_connect()
+            return
+        else:
+            deadline = self.next_connect
+
+        wait = None if deadline is None else max(0, deadline - now)
+        if timeout is not None:
+            wait = timeout if wait is None else min(wait, timeout)
+        readable, writable, errors = select.select(readable, writable, [], wait)
 
-            msg = m[1]
+        try:
+            if writable:
+                self.finish_connect()
+            elif readable:
+                self.receive()
+            if self.next_poll is not None and time.time() >= self.next_poll:
+                self.pusher.poll(time.time())
+                self.next_poll += self.pusher.poll_interval
+                if self.next_poll < time.time(): # running behind; don't try to catch up
+                    self.next_poll = time.time()
+        except scratch.ScratchError as e:
+            self.disconnected(e)
+
+    def run(self):
+        while True:
+            self.run_once()
+
+
+def handle_message(s, msg, pusher = None):
+    '''
+    Handle a broadcast from Scratch, replying on s
+    '''
+    global cameraFolder
 
 # remove all spaces in the input msg to create ms_nospace
 # brickpi3 handles the one without spaces but we keep the one with spaces
 # for others (like pivotpi, camera, line_sensor) as a precautionary measure.
-            try:
-                msg_nospace = msg.replace(" ","")
-            except:
-                pass
+    try:
+        msg_nospace = msg.replace(" ","")
+    except:
+        pass
 
 
-            if en_debug:
-                print("Rx:{}".format(msg))
+    if en_debug:
+        print("Rx:{}".format(msg))
 
-            if is_BrickPi_msg(msg_nospace):
-                sensors = handle_BrickPi_msg(msg_nospace)
-                if sensors is not None:
-                    s.sensorupdate(sensors)
+    if is_BrickPi_msg(msg_nospace):
+        sensors = handle_BrickPi_msg(msg_nospace)
+        if sensors is not None:
+            s.sensorupdate(sensors)
+            if pusher is not None:
+                pusher.sent(sensors)
 
-            # CREATE FOLDER TO SAVE PHOTOS IN
+    # CREATE FOLDER TO SAVE PHOTOS IN
 
-            elif msg[:6].lower()=="FOLDER".lower():
-                print ("Camera folder")
-                try:
-                    cameraFolder=defaultCameraFolder+str(msg[6:]).strip()
-                    print(cameraFolder)
-                    if not os.path.exists(cameraFolder):
-                        pi=1000  # uid and gid of user pi
-                        os.makedirs(cameraFolder)
-                        os.chown(cameraFolder,pi,pi)
-                        s.sensorupdate({"folder":"created"})
-                    else:
-                        s.sensorupdate({"folder":"set"})
-                except:
-                    print ("error with folder name")
-
-            # TAKE A PICTURE
-
-            elif msg.lower()=="TAKE_PICTURE".lower():
-                print ("TAKE_PICTURE" )
+    elif msg[:6].lower()=="FOLDER".lower():
+        print ("Camera folder")
+        try:
+            cameraFolder=defaultCameraFolder+str(msg[6:]).strip()
+            print(cameraFolder)
+            if not os.path.exists(cameraFolder):
                 pi=1000  # uid and gid of user pi
-                try:
-                    from subprocess import call
-                    import datetime
-                    newimage = "{}/img_{}.jpg".format(cameraFolder,str(datetime.datetime.now()).replace(" ","_",10))
-                    photo_cmd="raspistill -o {} -w 640 -h 480 -t 1".format(newimage)
-                    call ([photo_cmd], shell=True)
-                    os.chown(newimage,pi,pi)
-                    if en_debug:
-                        print ("Picture Taken")
-                    s.sensorupdate({'camera':"Picture Taken"})
-                except:
-                    if en_debug:
-                        e = sys.exc_info()[1]
-                        print ("Error taking picture")
-                    s.sensorupdate({'camera':"Error"})
-
-
-            elif (msg[:5].lower()=="SPEAK".lower() or msg[:3].lower()=="SAY".lower() ):
-                try:
-                    from subprocess import call
-                    cmd_beg = "espeak -ven+f1 "
-                    if (msg[:5].lower() == "speak"):
-                        in_text = msg[5:]
-                    else:
-                        in_text = msg[3:]
-                    cmd_end = " 2>/dev/null"
-                    out_str = cmd_beg+"\""+in_text+"\""+cmd_end
-                    if en_debug:
-                        print(out_str)
-                    call([out_str], shell=True)
-
-                except:
-                    print("Issue with espeak")
-
-            # PIVOTPI
-            elif pivotpi_available==True and PivotPiScratch.isPivotPiMsg(msg):
-                pivotsensors = PivotPiScratch.handlePivotPi(msg)
-                # print "Back from PivotPi",pivotsensors
-                s.sensorupdate(pivotsensors)
-
-            # DI Sensors
-            elif disensors_available==True and diSensorsScratch.isDiSensorsMsg(msg):
-                disensors = diSensorsScratch.handleDiSensors(msg)
-                s.sensorupdate(disensors)
-
-
+                os.makedirs(cameraFolder)
+                os.chown(cameraFolder,pi,pi)
+                s.sensorupdate({"folder":"created"})
             else:
-                if en_debug:
-                    print ("Ignoring Command: {}".format(msg))
+                s.sensorupdate({"folder":"set"})
+        except:
+            print ("error with folder name")
 
-        except KeyboardInterrupt:
-            running = False
+    # TAKE A PICTURE
+
+    elif msg.lower()=="TAKE_PICTURE".lower():
+        print ("TAKE_PICTURE" )
+        pi=1000  # uid and gid of user pi
+        try:
+            from subprocess import call
+            import datetime
+            newimage = "{}/img_{}.jpg".format(cameraFolder,str(datetime.datetime.now()).replace(" ","_",10))
+            photo_cmd="raspistill -o {} -w 640 -h 480 -t 1".format(newimage)
+            call ([photo_cmd], shell=True)
+            os.chown(newimage,pi,pi)
             if en_debug:
-                print("BrickPi Scratch: Disconnected from Scratch")
-            break
-        except (scratch.scratch.ScratchConnectionError, NameError) as e:
-            print("exception error: ", e)
-            while True:
-                # thread1.join(0)
-                if en_debug:
-                    print("BrickPi Scratch: Scratch connection error, Retrying")
-                time.sleep(5)
-                try:
-                    s = scratch.Scratch()
-                    s.broadcast('READY')
-                    if en_debug:
-                        print("BrickPi Scratch: Connected to Scratch successfully")
-                    break
-                except scratch.ScratchError:
-                    if en_debug:
-                        print("BrickPi Scratch: Scratch is either not opened or remote sensor connections aren't enabled\n..............................\n")
+                print ("Picture Taken")
+            s.sensorupdate({'camera':"Picture Taken"})
         except:
-            e = sys.exc_info()[0]
             if en_debug:
-                print("BrickPi Scratch: Error %s" % e)
+                e = sys.exc_info()[1]
+                print ("Error taking picture")
+            s.sensorupdate({'camera':"Error"})
+
+
+    elif (msg[:5].lower()=="SPEAK".lower() or msg[:3].lower()=="SAY".lower() ):
+        try:
+            from subprocess import call
+            cmd_beg = "espeak -ven+f1 "
+            if (msg[:5].lower() == "speak"):
+                in_text = msg[5:]
+            else:
+                in_text = msg[3:]
+            cmd_end = " 2>/dev/null"
+            out_str = cmd_beg+"\""+in_text+"\""+cmd_end
+            if en_debug:
+                print(out_str)
+            call([out_str], shell=True)
+
+        except:
+            print("Issue with espeak")
+
+    # PIVOTPI
+    elif pivotpi_available==True and PivotPiScratch.isPivotPiMsg(msg):
+        pivotsensors = PivotPiScratch.handlePivotPi(msg)
+        # print "Back from PivotPi",pivotsensors
+        s.sensorupdate(pivotsensors)
+
+    # DI Sensors
+    elif disensors_available==True and diSensorsScratch.isDiSensorsMsg(msg):
+        disensors = diSensorsScratch.handleDiSensors(msg)
+        s.sensorupdate(disensors)
+
+
+    else:
+        if en_debug:
+            print ("Ignoring Command: {}".format(msg))
+
+
+##################################################################
+# MAIN FUNCTION
+##################################################################
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--push", action = "store_true",
+                        help = "send sensor and encoder values to Scratch when they change, without waiting for a broadcast")
+    parser.add_argument("--poll-rate", type = float, default = POLL_RATE,
+                        help = "how many times a second to read the sensors in push mode")
+    parser.add_argument("--update-rate", type = float, default = UPDATE_RATE,
+                        help = "the most sensor updates to send to Scratch each second in push mode")
+    parser.add_argument("--host", default = "localhost", help = "the computer running Scratch")
+    parser.add_argument("--port", type = int, default = SCRATCH_PORT, help = "the Scratch remote sensor port")
+    args = parser.parse_args()
+
+    pusher = None
+    if args.push:
+        pusher = SensorPusher(args.poll_rate, args.update_rate)
+
+    try:
+        ScratchLink(args.host, args.port, pusher).run()
+    except KeyboardInterrupt:
+        if en_debug:
+            print("BrickPi Scratch: Disconnected from Scratch")
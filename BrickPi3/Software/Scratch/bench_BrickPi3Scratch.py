@@ -0,0 +1,58 @@
+from __future__ import print_function
+from __future__ import division
+
+# Measures how long it takes to work out what a broadcast message means, for a mix of messages like a Scratch
+# program sends (mostly the same few motor and sensor messages, over and over).
+#
+# The regex matching that BrickPi3Scratch.py used to do is repeated here, to compare against.
+#
+#     python bench_BrickPi3Scratch.py
+
+import re
+import timeit
+from BrickPi3Scratch import *
+
+MESSAGES = (["MA50", "MB50", "MA-50", "MB-50", "MA STOP", "MB STOP", "S1", "S2"] * 10
+            + ["MOTOR C POSITION 90", "MC POS -90", "S1 EV3US", "S2 EV3TOUCH", "UPDATE", "hello", "start"])
+REPEAT = 5
+
+
+def regex_is_BrickPi_msg(msg):
+    return compiled_regexBP.match(msg.strip()) is not None
+
+
+def regex_parse(msg):
+    # the matching part of the old handle_BrickPi_msg
+    motor_name_to_number = {"A": 0, "B": 1, "C": 2, "D": 3}
+    regObj = compiled_regexBP.match(msg.strip().lower())
+    if regObj is None:
+        return None
+    motor_port = regObj.group(4)
+    if motor_port is not None:
+        return motor_name_to_number[motor_port.upper()], regObj.group(5), regObj.group(6)
+    return regObj.groups()
+
+
+compiled_regexBP = re.compile(r"S([1-4])\s*({})|S([1-4])\s*$|(?:M)(?:OTOR)?\s*([A-D])\s*(P(?:osition|os)?)?\s*"
+                              r"(ON|FULL|STOP|OFF|-?[0-9.]+)\s*%?|\s*(UPDATE)\s*|\s*(RESET)\s*|"
+                              r"(?:M)(?:OTOR)?\s*([A-D])\s*".format("|".join(SENSOR_KEYS)), re.IGNORECASE)
+
+
+def per_message(is_msg, parse, before = None):
+    # the best time per message to check and parse it (as the main loop does), in microseconds
+    number = 200
+    def run():
+        for msg in MESSAGES:
+            if before is not None:
+                before()
+            if is_msg(msg):
+                parse(msg)
+    return min(timeit.repeat(run, number = number, repeat = REPEAT)) * 1e6 / (number * len(MESSAGES))
+
+
+if __name__ == '__main__':
+    print("{} messages, {} different".format(len(MESSAGES), len(set(MESSAGES))))
+    print("regex:                  {:.2f} us per message".format(per_message(regex_is_BrickPi_msg, regex_parse)))
+    print("parser, nothing cached: {:.2f} us per message".format(
+          per_message(is_BrickPi_msg, parse_BrickPi_msg, command_cache.clear)))
+    print("parser:                 {:.2f} us per message".format(per_message(is_BrickPi_msg, parse_BrickPi_msg)))
@@ -0,0 +1,238 @@
+from __future__ import print_function
+from __future__ import division
+
+# Load test for the Scratch bridge (BrickPi3Scratch.py), without Scratch or a BrickPi3.
+#
+# Runs the bridge against an emulated BrickPi3 (see brickpi3_emulator.py), with this program standing in for
+# Scratch 1.4: it listens for the bridge's remote sensor connection, waits for READY, and then broadcasts a
+# scripted mix of messages, timing each one until the bridge's sensor-update reply arrives. The reply is sent
+# after the bridge has set the motors, so the reply latency is an upper bound on the broadcast-to-motor
+# latency. For example:
+#
+#     python loadtest_BrickPi3Scratch.py --mix classroom --messages 2000
+#     python loadtest_BrickPi3Scratch.py --mix motors --window 8 --max-p99 20
+#
+# With --window 1 (the default) each broadcast waits for the reply to the one before, like a Scratch script.
+# A bigger window keeps that many broadcasts outstanding, to find the most messages per second the bridge can
+# handle. With --max-p99, exits with an error when the 99th percentile latency is above that many ms.
+#
+# The bridge's CPU time is read from /proc, so CPU per message is only reported on Linux.
+
+import os
+import sys
+import time
+import random
+import socket
+import struct
+import argparse
+import threading
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BRIDGE = os.path.join(HERE, "BrickPi3Scratch.py")
+DRIVERS = os.path.join(HERE, "..", "Python")
+
+# message mixes: list of (weight, broadcast). Every message must get a reply from the bridge.
+MIXES = {
+    "motors"    : [(1, "MA50"), (1, "MB-50"), (1, "MA STOP"), (1, "MB STOP"), (1, "MOTOR C POSITION 90"), (1, "MC POS 0")],
+    "sensors"   : [(1, "S1"), (1, "S2")],
+    "update"    : [(1, "UPDATE")],
+    "classroom" : [(3, "MA50"), (3, "MB50"), (2, "MA STOP"), (2, "MB STOP"), (4, "S1"), (4, "S2"), (1, "UPDATE"),
+                   (1, "MA"), (1, "MB")],
+}
+
+# sent before the mix, to configure the sensors the mix reads
+SETUP = ["S1 EV3US", "S2 TOUCH"]
+
+
+class FakeScratch(object):
+    '''
+    The Scratch 1.4 end of a remote sensor connection: messages are a 4 byte big-endian length followed by
+    the message, e.g. 'broadcast "MA50"' or 'sensor-update "Encoder A" "0" '
+    '''
+
+    def __init__(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(("localhost", 0))
+        self.server.listen(1)
+        self.port = self.server.getsockname()[1]
+        self.connection = None
+        self.replies = []   # time each sensor-update arrived
+        self.broadcasts = []
+        self.received = threading.Condition()
+        self.thread = None
+
+    def accept(self, timeout):
+        self.server.settimeout(timeout)
+        self.connection, address = self.server.accept()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.thread = threading.Thread(target = self.read)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _read(self, size):
+        data = b""
+        while len(data) < size:
+            chunk = self.connection.recv(size - len(data))
+            if not chunk:
+                raise EOFError
+            data += chunk
+        return data
+
+    def read(self):
+        try:
+            while True:
+                message = self._read(struct.unpack(">L", self._read(4))[0]).decode("utf-8")
+                now = time.time()
+                with self.received:
+                    if message.startswith("sensor-update"):
+                        self.replies.append(now)
+                    elif message.startswith("broadcast"):
+                        self.broadcasts.append(message[len('broadcast "'):-1])
+                    self.received.notify_all()
+        except (EOFError, socket.error):
+            pass
+
+    def broadcast(self, message):
+        message = ('broadcast "%s"' % message.replace('"', '""')).encode("utf-8")
+        self.connection.sendall(struct.pack(">L", len(message)) + message)
+
+    def wait(self, condition, timeout):
+        deadline = time.time() + timeout
+        with self.received:
+            while not condition():
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise RuntimeError("timed out waiting for the bridge")
+                self.received.wait(remaining)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+        self.server.close()
+
+
+def cpu_seconds(pid):
+    # user + system CPU time of a process, or None where /proc isn't available
+    try:
+        with open("/proc/%d/stat" % pid) as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (IOError, OSError):
+        return None
+
+
+def percentile(values, fraction):
+    return values[int(fraction * (len(values) - 1))]
+
+
+def load_test(args):
+    scratch = FakeScratch()
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([DRIVERS, HERE] + [env["PYTHONPATH"]] if env.get("PYTHONPATH") else [DRIVERS, HERE])
+    log = open(args.log, "w") if args.log else open(os.devnull, "w")
+    bridge = subprocess.Popen([args.python, os.path.abspath(__file__), "--run-bridge", "--port", str(scratch.port)],
+                              env = env, stdout = log, stderr = subprocess.STDOUT)
+    try:
+        scratch.accept(args.timeout)
+        scratch.wait(lambda: "READY" in scratch.broadcasts, args.timeout)
+        for message in SETUP:
+            scratch.broadcast(message)
+        scratch.wait(lambda: len(scratch.replies) >= len(SETUP), args.timeout)
+        time.sleep(0.2) # let the sensors finish configuring
+        first_reply = len(scratch.replies)
+
+        random.seed(args.seed)
+        choices = [message for weight, message in MIXES[args.mix] for i in range(weight)]
+        script = [random.choice(choices) for i in range(args.messages)]
+
+        sent = []
+        cpu_start = cpu_seconds(bridge.pid)
+        start = time.time()
+        for i, message in enumerate(script):
+            # keep at most window broadcasts waiting for their replies
+            scratch.wait(lambda: len(scratch.replies) - first_reply > i - args.window, args.timeout)
+            sent.append(time.time())
+            scratch.broadcast(message)
+        scratch.wait(lambda: len(scratch.replies) - first_reply >= len(script), args.timeout)
+        elapsed = time.time() - start
+        cpu_end = cpu_seconds(bridge.pid)
+    finally:
+        bridge.kill()
+        bridge.wait()
+        scratch.close()
+        log.close()
+
+    latencies = sorted(1000 * (reply - send) for send, reply in zip(sent, scratch.replies[first_reply:]))
+    print("mix %s, %d messages, window %d" % (args.mix, len(script), args.window))
+    print("throughput: %.0f messages/second" % (len(script) / elapsed))
+    print("latency: mean %.2f ms, 50%% %.2f ms, 95%% %.2f ms, 99%% %.2f ms, max %.2f ms" % (
+          sum(latencies) / len(latencies), percentile(latencies, 0.5), percentile(latencies, 0.95),
+          percentile(latencies, 0.99), latencies[-1]))
+    if cpu_start is not None and cpu_end is not None:
+        cpu = cpu_end - cpu_start
+        print("bridge CPU: %.0f us per message (%.0f%% of a core)" % (1e6 * cpu / len(script), 100 * cpu / elapsed))
+
+    if args.max_p99 is not None and percentile(latencies, 0.99) > args.max_p99:
+        print("99th percentile latency is over %.2f ms" % args.max_p99)
+        return 1
+    return 0
+
+
+def run_bridge(port):
+    # runs in the bridge process: the bridge, talking to an emulated BrickPi3
+    import math
+    import runpy
+    import brickpi3_emulator
+
+    class WallClock(brickpi3_emulator.SimClock):
+        # emulated time that keeps up with real time, as the bridge waits in select rather than time.sleep.
+        # The time module is left alone.
+        def __init__(self):
+            brickpi3_emulator.SimClock.__init__(self)
+            self.origin = time.time()
+
+        def time(self):
+            return time.time()
+
+        def monotonic(self):
+            return time.time() - self.origin
+
+        def advance(self, seconds):
+            for listener in self.listeners:
+                listener.advance_to(self.monotonic())
+
+        def install(self):
+            pass
+
+        def uninstall(self):
+            pass
+
+    firmware = brickpi3_emulator.install(brickpi3_emulator.BrickPi3Firmware(WallClock()))
+    firmware.set_sensor_source(0x01, lambda t: 40 + 10 * math.sin(t))   # S1: ultrasonic, cm
+    firmware.set_sensor_source(0x02, lambda t: int(t) % 2)              # S2: touch, pressed every other second
+
+    sys.argv = [BRIDGE, "--port", str(port)]
+    sys.path.insert(0, HERE)
+    runpy.run_path(BRIDGE, run_name = "__main__")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Load test the Scratch bridge against an emulated BrickPi3.")
+    parser.add_argument("--mix", choices = sorted(MIXES), default = "classroom", help = "the messages to send")
+    parser.add_argument("--messages", type = int, default = 1000, help = "how many messages to send")
+    parser.add_argument("--window", type = int, default = 1, help = "how many messages to keep waiting for a reply")
+    parser.add_argument("--max-p99", type = float, default = None, help = "fail when the 99th percentile latency is over this many ms")
+    parser.add_argument("--seed", type = int, default = 1, help = "random seed for the order of the messages")
+    parser.add_argument("--python", default = sys.executable, help = "the Python to run the bridge with")
+    parser.add_argument("--log", default = None, help = "write the bridge's output to this file")
+    parser.add_argument("--timeout", type = float, default = 30, help = "seconds to wait for the bridge")
+    parser.add_argument("--run-bridge", action = "store_true", help = argparse.SUPPRESS)
+    parser.add_argument("--port", type = int, default = None, help = argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_bridge:
+        run_bridge(args.port)
+    else:
+        sys.exit(load_test(args))
@@ -1,4 +1,7 @@
+from __future__ import division
+
 from BrickPi3Scratch import *
+import socket
 
 test_msgs = []
 test_msgs += ["S1 EV3US",
@@ -27,9 +30,88 @@ def test_regex():
     for test_str in test_msgs:
         assert(is_BrickPi_msg(test_str))
 
+def test_not_BrickPi_msg():
+    for test_str in ["", "hello", "S5", "S1 FOO", "START", "MOVE"]:
+        assert(not is_BrickPi_msg(test_str))
+
+
+def test_parse():
+    assert(parse_BrickPi_msg("S1") == (READ_SENSOR, 0, None, False))
+    assert(parse_BrickPi_msg(" s4 ") == (READ_SENSOR, 3, None, False))
+    assert(parse_BrickPi_msg("S2EV3TOUCH") == (SET_SENSOR, 1, "EV3TOUCH", False))
+    assert(parse_BrickPi_msg("S1 EV3USCM") == (SET_SENSOR, 0, "EV3USCM", False))
+    assert(parse_BrickPi_msg("MAON") == (SET_MOTOR, 0, 100, False))
+    assert(parse_BrickPi_msg("MB STOP") == (SET_MOTOR, 1, 0, False))
+    assert(parse_BrickPi_msg("MC50.5") == (SET_MOTOR, 2, 50, False))
+    assert(parse_BrickPi_msg("MOTOR D -100 %") == (SET_MOTOR, 3, -100, False))
+    assert(parse_BrickPi_msg("MA POSITION 90") == (SET_MOTOR, 0, 90, True))
+    assert(parse_BrickPi_msg("MAPOS-90") == (SET_MOTOR, 0, -90, True))
+    assert(parse_BrickPi_msg("MA P 360") == (SET_MOTOR, 0, 360, True))
+    assert(parse_BrickPi_msg("MA 1.2.3") == (SET_MOTOR, 0, None, False))
+    assert(parse_BrickPi_msg("MA") == (READ_MOTOR, 0, None, False))
+    assert(parse_BrickPi_msg("motor b") == (READ_MOTOR, 1, None, False))
+    assert(parse_BrickPi_msg("Update") == (UPDATE, None, None, False))
+    assert(parse_BrickPi_msg("RESET") == (RESET, None, None, False))
+
+
+def test_command_cache():
+    for i in range(COMMAND_CACHE_SIZE + 10):
+        parse_BrickPi_msg("MA{}".format(i))
+    assert(len(command_cache) == COMMAND_CACHE_SIZE)
+    assert("MA0" not in command_cache)
+    assert(parse_BrickPi_msg("MA0") == (SET_MOTOR, 0, 0, False))
+
+
+def test_pusher_deadband():
+    pusher = SensorPusher()
+    pusher.check({"S1 US cm": 50.0, "S1 Status": "SUCCESS", "Encoder A": 0})
+    assert(pusher.pending == {"S1 US cm": 50.0, "S1 Status": "SUCCESS", "Encoder A": 0})
+    pusher.pending = {}
+    pusher.check({"S1 US cm": 50.5, "S1 Status": "SUCCESS", "Encoder A": 1})
+    assert(pusher.pending == {})
+    pusher.check({"S1 US cm": 51.0, "S1 Status": "SUCCESS", "Encoder A": 2})
+    assert(pusher.pending == {"S1 US cm": 51.0, "Encoder A": 2})
+    pusher.sent({"S1 US cm": 60.0})
+    assert(pusher.pending == {"Encoder A": 2})
+
+
+def test_scratch_link():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("localhost", 0))
+    port = server.getsockname()[1]
+    server.close()
+
+    # nothing listening: tries again later, backing off
+    link = ScratchLink("localhost", port)
+    for i in range(3):
+        link.run_once(0)
+        if link.connecting is not None:
+            link.run_once(1)
+        link.next_connect = 0
+    assert(link.s is None)
+    assert(link.retry_delay == CONNECT_RETRY_MIN * 8)
+
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(("localhost", port))
+    server.listen(1)
+    ready = []
+    link.on_ready = ready.append
+    for i in range(3):
+        link.run_once(1)
+    assert(link.s is not None and ready == [link.s])
+    assert(link.retry_delay == CONNECT_RETRY_MIN)
+    connection, address = server.accept()
+    assert(b"READY" in connection.recv(100))
+    connection.close()
+    server.close()
+
 if __name__ == '__main__':
 
     test_regex()
+    test_not_BrickPi_msg()
+    test_parse()
+    test_command_cache()
 
     handle_BrickPi_msg("S2TOUCH")
     handle_BrickPi_msg("S2 EV3US")
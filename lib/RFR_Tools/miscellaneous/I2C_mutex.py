@@ -4,55 +4,59 @@
 # Released under the MIT license (http://choosealicense.com/licenses/mit/).
 # For more information see https://github.com/DexterInd/DI_Sensors/blob/master/LICENSE.md
 
-import fcntl
+# The I2C mutex is a re-entrant lock on a file in /run/lock, shared by all the Mutex objects in the process,
+# see file_lock.py.
+
 import time
 import os
+import threading
+
+import file_lock
 
 class Mutex(object):
 
-    DexterLockI2C_handle = None
+    # the lock shared by all the Mutex objects in the process, created by the first one
+    DexterLockI2C_lock = None
+    DexterLockI2C_create_lock = threading.Lock()
 
     def __init__(self, debug = False):
         self.mutex_debug = debug
         self.DexterLockI2C_handle_filename = '/run/lock/DexterLockI2C'
+        self.DexterLockI2C_handle = 0 # how many times this Mutex holds the lock
 
         # putting the following file in /run/lock so any user can have access
         # putting it directly in /run requires sudo priviledges
         self.DexterOverallMutex_filename = '/run/lock/DexterOS_overall_mutex'
-        
-        try:
-            open(self.DexterLockI2C_handle_filename, 'w')
-            if os.path.isfile(self.DexterLockI2C_handle_filename):
-                os.chmod(self.DexterLockI2C_handle_filename, 0o777)
-        except Exception as e:
-            pass
 
-    def acquire(self):
+        with Mutex.DexterLockI2C_create_lock:
+            if Mutex.DexterLockI2C_lock is None:
+                Mutex.DexterLockI2C_lock = file_lock.FileLock(self.DexterLockI2C_handle_filename)
+
+    def acquire(self, timeout = None):
+        """ Acquire the mutex
+
+        Keyword arguments:
+        timeout (default None) -- the most seconds to wait for the mutex, or None to wait for as long as it takes
+
+        Returns True if the mutex was acquired, False if it timed out
+        """
         if self.mutex_debug:
             print("I2C mutex acquire")
 
-        acquired = False
-        while not acquired:
-            try:
-                self.DexterLockI2C_handle = open(self.DexterLockI2C_handle_filename, 'w')
-                # lock
-                fcntl.lockf(self.DexterLockI2C_handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
-                acquired = True
-            except IOError: # already locked by a different process
-                time.sleep(0.001)
-            except Exception as e:
-                print(e)
+        if not Mutex.DexterLockI2C_lock.acquire(timeout):
+            return False
+        self.DexterLockI2C_handle += 1
+
         if self.mutex_debug:
             print("I2C mutex acquired {}".format(time.time()))
+        return True
 
 
     def release(self):
         if self.mutex_debug:
             print("I2C mutex release: {}".format(time.time()))
-        if self.DexterLockI2C_handle is not None and self.DexterLockI2C_handle is not True:
-            self.DexterLockI2C_handle.close()
-            self.DexterLockI2C_handle = None
-            time.sleep(0.001)
+        if self.DexterLockI2C_handle > 0 and Mutex.DexterLockI2C_lock.release():
+            self.DexterLockI2C_handle -= 1
 
     def enableDebug(self):
         self.mutex_debug = True
@@ -0,0 +1,65 @@
+from __future__ import print_function
+from __future__ import division
+
+# Measures how long it takes to open I2C sensor drivers on the four BrickPi3 sensor ports (DI_I2C "BP3_1" to
+# "BP3_4"), against an emulated BrickPi3 (see brickpi3_emulator.py in the BrickPi3 repository), which counts
+# the SPI transfers and simulates the time they and the sleeps take.
+#
+#     python bench_di_i2c.py
+#
+# "separate" is what DI_I2C used to do: each driver gets its own BrickPi3 object, sets its port up and waits for
+# it to be ready. "shared" is DI_I2C now, with one BrickPi3 per SPI address, and the drivers' first transfers
+# waiting for the ports to be ready. "reopen" opens the drivers again in the same process, with the ports
+# already set up.
+
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(HERE, "..", "..", "..", "BrickPi3", "Software", "Python"))
+
+real_time = time.time # the emulator replaces time.time with simulated time
+
+import brickpi3_emulator
+firmware = brickpi3_emulator.install()
+
+import brickpi3
+import di_i2c
+
+BUSSES = ["BP3_1", "BP3_2", "BP3_3", "BP3_4"]
+
+
+def wait_ready(driver):
+    # what the driver's first transfer does
+    wait = driver.ready_time - time.time()
+    if wait > 0:
+        time.sleep(wait)
+
+
+def open_drivers(separate):
+    transfers = firmware.transfers
+    simulated = firmware.clock.monotonic()
+    start = real_time()
+    drivers = []
+    for bus in BUSSES:
+        if separate:
+            di_i2c._brickpi3s.clear()
+            di_i2c._brickpi3_ports.clear()
+        drivers.append(di_i2c.DI_I2C(bus, 0x10))
+        if separate:
+            wait_ready(drivers[-1])
+    for driver in drivers:
+        wait_ready(driver)
+    return firmware.transfers - transfers, firmware.clock.monotonic() - simulated, real_time() - start
+
+
+if __name__ == '__main__':
+    print("Opening %d drivers:" % len(BUSSES))
+    for name, separate in (("separate", True), ("shared", False), ("reopen", False)):
+        if name == "shared":
+            di_i2c._brickpi3s.clear()
+            di_i2c._brickpi3_ports.clear()
+        transfers, simulated, wall = open_drivers(separate)
+        print("{:10} {:3d} SPI transfers, {:6.1f} ms on the BrickPi3 (simulated), {:5.2f} ms real time".format(
+              name, transfers, 1000 * simulated, 1000 * wall))
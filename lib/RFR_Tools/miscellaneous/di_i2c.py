@@ -5,36 +5,188 @@
 # For more information see https://github.com/DexterInd/DI_Sensors/blob/master/LICENSE.md
 #
 # Python I2C drivers
+#
+# The library used for each bus (the backend) is chosen when a DI_I2C is created, and only that library is
+# imported. For the RPi hardware bus it's one of RPI_1_BACKENDS, and for the RPi software bus one of
+# RPI_1SW_BACKENDS. By default the first one that's installed is used; to choose one, pass it to DI_I2C, or set
+# the DI_I2C_BACKEND (hardware bus) or DI_I2C_SW_BACKEND (software bus) environment variable. The backend an
+# object uses is in its backend attribute.
+#
+# With the periphery backend, the messages of a transfer (or of several, with transfer_many) are sent one of
+# three ways, set by the transfer_mode argument of DI_I2C or the DI_I2C_TRANSFER_MODE environment variable:
+#     TRANSFER_SEPARATE (default) -- each write and read is its own I2C_RDWR ioctl, with a stop after each.
+#     TRANSFER_COMBINED -- all the messages in one ioctl, with repeated starts between them. The RPi doesn't
+#         recognize clock stretching during repeated starts, so this is for devices that don't stretch the clock.
+#     TRANSFER_STOP_START -- all the messages in one ioctl, with a stop and a start between them (I2C_M_STOP),
+#         for adapters that support it (I2C_FUNC_PROTOCOL_MANGLING). Other adapters ignore I2C_M_STOP, so the
+#         adapter's functionality is read when the bus is opened, and DI_I2C raises IOError if it's missing. The
+#         RPi's adapter (i2c-bcm2835) doesn't support it.
+# The other backends send each write and read on its own.
+#
+# The bytes to write can be a list, or bytes, a bytearray or a memoryview. Reads return a list when the bytes
+# written were a list, and a bytearray otherwise. readinto reads into a buffer, and the register helpers
+# (read_16, write_reg_32, ...) convert values with the precompiled struct codecs below.
+#
+# The BrickPi3 busses of a process share one BrickPi3 object for each SPI address (see get_brickpi3), so the
+# BrickPi3 is only detected once, and a sensor port is only set to I2C when it isn't already. Rather than
+# sleeping after setting a port, the first transfer waits until the port is ready, so opening drivers on
+# several ports waits once.
 
 from __future__ import print_function
 from __future__ import division
 
+import os
 import time
+import array
+import fcntl
+import struct
+import atexit
+import importlib
+import threading
 import di_mutex
 
 __version__ = "1.3.2"
 
-# Enabling one of the communication libraries
-# This is not meant to change on a regular basis
-# If Periphery doesn't work for you, uncomment either pigpio or smbus
-#RPI_1_Module = "pigpio"
-#RPI_1_Module = "smbus"
-RPI_1_Module = "periphery"
+# The backends for the RPi hardware and software I2C busses, in order of preference
+RPI_1_BACKENDS = ("periphery", "smbus", "pigpio")
+RPI_1SW_BACKENDS = ("wiringpi", "RPi.GPIO")
+
+# The default backends. "auto" chooses the first backend that's installed.
+RPI_1_Module = os.environ.get("DI_I2C_BACKEND", "auto")
+RPI_1SW_Module = os.environ.get("DI_I2C_SW_BACKEND", "auto")
+
+# How the periphery backend sends the messages of a transfer
+TRANSFER_SEPARATE = "separate"
+TRANSFER_COMBINED = "combined"
+TRANSFER_STOP_START = "stop_start"
+TRANSFER_MODES = (TRANSFER_SEPARATE, TRANSFER_COMBINED, TRANSFER_STOP_START)
+TRANSFER_MODE = os.environ.get("DI_I2C_TRANSFER_MODE", TRANSFER_SEPARATE)
+
+I2C_M_STOP = 0x8000 # i2c_msg flag: send a stop after the message
+I2C_FUNCS = 0x0705 # ioctl: get the adapter's functionality
+I2C_FUNC_PROTOCOL_MANGLING = 0x00000004 # the adapter supports I2C_M_STOP (and the other protocol mangling flags)
+
+# struct codecs for register values, for (signed, big_endian)
+READ_16 = {(False, True) : struct.Struct(">H"), (True, True) : struct.Struct(">h"),
+           (False, False): struct.Struct("<H"), (True, False): struct.Struct("<h")}
+READ_32 = {(False, True) : struct.Struct(">I"), (True, True) : struct.Struct(">i"),
+           (False, False): struct.Struct("<I"), (True, False): struct.Struct("<i")}
+
+# struct codecs for writing a register and a value, for big_endian
+WRITE_REG_16 = {True: struct.Struct(">BH"), False: struct.Struct("<BH")}
+WRITE_REG_32 = {True: struct.Struct(">BI"), False: struct.Struct("<BI")}
+
+# GPIO libraries for the software I2C bus, imported by the first DI_I2C_RPI_SW or DI_I2C_RPI_SW_GPIO
+wiringpi = None
+GPIO = None
+
+
+def select_backend(backends, backend = "auto"):
+    """Choose and import a backend
+
+    Keyword arguments:
+    backends -- the backends for the bus, in order of preference
+    backend (default "auto") -- the backend to use, or "auto" for the first one in backends that's installed
+
+    Returns the name of the backend and its module"""
+    if backend != "auto":
+        if backend not in backends:
+            raise IOError("I2C backend {} not supported. Use one of {}".format(backend, ", ".join(backends)))
+        return backend, importlib.import_module(backend)
+    for name in backends:
+        try:
+            return name, importlib.import_module(name)
+        except ImportError:
+            pass
+    raise IOError("No I2C backend installed. Install one of {}".format(", ".join(backends)))
+
+
+def i2c_funcs(fd):
+    """Read an I2C adapter's functionality (the I2C_FUNC_* bits)
+
+    Keyword arguments:
+    fd -- the file descriptor of the open I2C bus (/dev/i2c-*)
+
+    Returns the functionality bits"""
+    buf = array.array("L", [0]) # unsigned long
+    fcntl.ioctl(fd, I2C_FUNCS, buf, True)
+    return buf[0]
+
+
+# BrickPi3 objects, for get_brickpi3
+_brickpi3s = {}          # SPI address: BrickPi3
+_brickpi3_ports = {}     # (SPI address, port): (the I2C settings the port was set to, when it's ready)
+_brickpi3_lock = threading.Lock()
+
+BRICKPI3_I2C_SETUP_TIME = 0.01 # how long a sensor port takes to be ready after it's set to I2C
+
+
+def get_brickpi3(address = 1):
+    """Get the process's BrickPi3 object for an SPI address. The first time, it's created (detecting the BrickPi3).
+
+    Keyword arguments:
+    address (default 1) -- the BrickPi3's SPI address
+
+    Returns the BrickPi3"""
+    with _brickpi3_lock:
+        bp3 = _brickpi3s.get(address)
+        if bp3 is None:
+            bp3 = importlib.import_module("brickpi3").BrickPi3(address)
+            _brickpi3s[address] = bp3
+        return bp3
+
+
+def configure_brickpi3_port(bp3, port, settings = (0, 0), force = False):
+    """Set a BrickPi3 sensor port to I2C, unless it's already set to I2C with the same settings
+
+    Keyword arguments:
+    bp3 -- the BrickPi3 (from get_brickpi3)
+    port -- the sensor port. PORT_1, PORT_2, PORT_3 or PORT_4.
+    settings (default (0, 0)) -- the I2C settings (see BrickPi3.set_sensor_type)
+    force (default False) -- set the port even if it's already set
 
-if RPI_1_Module == "pigpio":
-    import pigpio
-elif RPI_1_Module == "smbus":
-    import smbus
-elif RPI_1_Module == "periphery":
-    from periphery import I2C
-else:
-    raise IOError("RPI_1 module not supported")
+    Returns the time (from time.time) when the port is ready to use"""
+    key = (bp3.SPI_Address, port)
+    with _brickpi3_lock:
+        port_index = (bp3.PORT_1, bp3.PORT_2, bp3.PORT_3, bp3.PORT_4).index(port)
+        settings = list(settings)
+        configured, ready = _brickpi3_ports.get(key, (None, 0))
+        if not force and configured == settings and bp3.SensorType[port_index] == bp3.SENSOR_TYPE.I2C:
+            return ready
+        bp3.set_sensor_type(port, bp3.SENSOR_TYPE.I2C, settings)
+        ready = time.time() + BRICKPI3_I2C_SETUP_TIME
+        _brickpi3_ports[key] = (settings, ready)
+        return ready
+
+
+def _to_bytearray(outArr):
+    """ The bytes to write as a bytearray, with list values masked to 0-255 """
+    if isinstance(outArr, bytearray):
+        return outArr
+    try:
+        return bytearray(outArr)
+    except ValueError: # values outside 0-255
+        return bytearray(b & 0xFF for b in outArr)
+
+
+def _read_result(data, as_list):
+    """ Bytes read as a list, or as a bytearray """
+    if as_list:
+        if isinstance(data, bytearray):
+            return list(data)
+    elif isinstance(data, list):
+        return bytearray(data)
+    return data
 
 
 class DI_I2C(object):
     """ Dexter Industries I2C drivers for hardware and software I2C busses """
 
-    def __init__(self, bus, address, big_endian = True):
+    Mutex = di_mutex.DI_Mutex # the mutex for each bus
+    RPI_1_BACKENDS = RPI_1_BACKENDS
+    RPI_1SW_BACKENDS = RPI_1SW_BACKENDS
+
+    def __init__(self, bus, address, big_endian = True, backend = None, transfer_mode = None):
         """Initialize I2C
 
         Keyword arguments:
@@ -43,27 +195,51 @@ class DI_I2C(object):
                 "RPI_1SW" - RPi software I2C
                 "GPG3_AD1" - GPG3 AD1 software I2C
                 "GPG3_AD2" - GPG3 AD2 software I2C
+                "BP3_1" to "BP3_4" - BrickPi3 sensor port I2C
             address -- the slave I2C address. Formatted as bits 0-6, not 1-7.
             big_endian (default True) -- Big endian?
+            backend (default None) -- for "RPI_1", one of RPI_1_BACKENDS, and for "RPI_1SW", one of
+                RPI_1SW_BACKENDS. "auto" uses the first one that's installed, and None uses the default
+                (RPI_1_Module or RPI_1SW_Module).
+            transfer_mode (default None) -- with the periphery backend, how to send the messages of a transfer:
+                TRANSFER_SEPARATE, TRANSFER_COMBINED or TRANSFER_STOP_START (raises IOError if the adapter doesn't
+                support it). None uses TRANSFER_MODE.
         """
 
+        self.bus_name = bus
+        self.i2c_bus_handle = None
+        self.transfer_mode = transfer_mode or TRANSFER_MODE
+        if self.transfer_mode not in TRANSFER_MODES:
+            raise IOError("I2C transfer mode {} not supported".format(self.transfer_mode))
+        self.bus_transfer_many = self.__transfer_each__
+
         if bus == "RPI_1":
-            self.bus_name = bus
-
-            if RPI_1_Module == "pigpio":
-                self.i2c_bus = pigpio.pi()
-                self.i2c_bus_handle = None
-            elif RPI_1_Module == "smbus":
-                self.i2c_bus = smbus.SMBus(1)
-            elif RPI_1_Module == "periphery":
-                self.bus_name = bus
-                self.i2c_bus = I2C("/dev/i2c-1")
+            self.backend, module = select_backend(self.RPI_1_BACKENDS, backend or RPI_1_Module)
+            if self.backend == "pigpio":
+                self.i2c_bus = module.pi()
+                self.bus_transfer = self.__transfer_pigpio__
+            elif self.backend == "smbus":
+                self.i2c_bus = module.SMBus(1)
+                self.bus_transfer = self.__transfer_smbus__
+            elif self.backend == "periphery":
+                self.i2c_bus = module.I2C("/dev/i2c-1")
+                if(self.transfer_mode == TRANSFER_STOP_START and
+                   not i2c_funcs(self.i2c_bus.fd) & I2C_FUNC_PROTOCOL_MANGLING):
+                    self.i2c_bus.close()
+                    raise IOError("I2C transfer mode {} not supported by /dev/i2c-1, the adapter doesn't support "
+                                  "I2C_M_STOP (I2C_FUNC_PROTOCOL_MANGLING). Use {} or {}".format(
+                                  TRANSFER_STOP_START, TRANSFER_SEPARATE, TRANSFER_COMBINED))
+                self.bus_transfer = self.__transfer_periphery__
+                self.bus_transfer_many = self.__transfer_many_periphery__
         elif bus == "RPI_1SW":
-            self.bus_name = bus
-            self.i2c_bus = DI_I2C_RPI_SW()
+            self.backend, module = select_backend(self.RPI_1SW_BACKENDS, backend or RPI_1SW_Module)
+            if self.backend == "wiringpi":
+                self.i2c_bus = DI_I2C_RPI_SW()
+            else:
+                self.i2c_bus = DI_I2C_RPI_SW_GPIO()
+            self.bus_transfer = self.__transfer_rpi_sw__
         elif bus == "GPG3_AD1" or bus == "GPG3_AD2":
-            self.bus_name = bus
-
+            self.backend = "gopigo3"
             self.gopigo3_module = __import__("gopigo3")
             self.gpg3 = self.gopigo3_module.GoPiGo3()
             if bus == "GPG3_AD1":
@@ -71,12 +247,12 @@ class DI_I2C(object):
             elif bus == "GPG3_AD2":
                 self.port = self.gpg3.GROVE_2
             self.gpg3.set_grove_type(self.port, self.gpg3.GROVE_TYPE.I2C)
+            self.bus_transfer = self.__transfer_gpg3__
             time.sleep(0.01)
         elif bus == "BP3_1" or bus == "BP3_2" or bus == "BP3_3" or bus == "BP3_4":
-            self.bus_name = bus
-
+            self.backend = "brickpi3"
             self.brickpi3_module = __import__("brickpi3")
-            self.bp3 = self.brickpi3_module.BrickPi3()
+            self.bp3 = get_brickpi3()
             if bus == "BP3_1":
                 self.port = self.bp3.PORT_1
             elif bus == "BP3_2":
@@ -85,20 +261,20 @@ class DI_I2C(object):
                 self.port = self.bp3.PORT_3
             elif bus == "BP3_4":
                 self.port = self.bp3.PORT_4
-            self.bp3.set_sensor_type(self.port, self.bp3.SENSOR_TYPE.I2C, [0, 0])
-            time.sleep(0.01)
+            self.bus_transfer = self.__transfer_bp3__
+            self.ready_time = configure_brickpi3_port(self.bp3, self.port)
         else:
             raise IOError("I2C bus not supported")
 
-        self.mutex = di_mutex.DI_Mutex(name = ("I2C_Bus_" + bus))
+        self.mutex = self.Mutex(name = ("I2C_Bus_" + bus))
         self.set_address(address)
         self.big_endian = big_endian
 
     def __del__(self):
 
         # release pigpio resources
-        if RPI_1_Module == "pigpio":
-    	    self.i2c_bus.stop()
+        if getattr(self, "backend", None) == "pigpio":
+            self.i2c_bus.stop()
 
     def reconfig_bus(self):
         """Reconfigure I2C bus
@@ -106,6 +282,8 @@ class DI_I2C(object):
         Reconfigure I2C port. If the port configuration got reset, call this method to reconfigure it."""
         if self.bus_name == "GPG3_AD1" or self.bus_name == "GPG3_AD2":
             self.gpg3.set_grove_type(self.port, self.gpg3.GROVE_TYPE.I2C)
+        elif self.backend == "brickpi3":
+            self.ready_time = configure_brickpi3_port(self.bp3, self.port, force = True)
 
     def set_address(self, address):
         """Set I2C address
@@ -113,7 +291,7 @@ class DI_I2C(object):
         Keyword arguments:
         address -- the slave I2C address"""
         self.address = address
-        if self.bus_name == "RPI_1" and RPI_1_Module == "pigpio":
+        if self.backend == "pigpio":
             if self.i2c_bus_handle:
                 self.i2c_bus.i2c_close(self.i2c_bus_handle)
             self.i2c_bus_handle = self.i2c_bus.i2c_open(1, address, 0)
@@ -122,93 +300,173 @@ class DI_I2C(object):
         """Conduct an I2C transfer (write and/or read)
 
         Keyword arguments:
-        outArr -- list of bytes to write
+        outArr -- bytes to write: a list, or bytes, a bytearray or a memoryview
         inBytes (default 0) -- how many bytes to read
 
-        Returns list of bytes read"""
-
-        # Make sure all bytes are in the range of 0-255
-        for b in range(len(outArr)):
-            outArr[b] &= 0xFF
+        Returns the bytes read: a list if outArr is a list, otherwise a bytearray"""
 
         # type cast to int to ensure compatibility
         inBytes = int(inBytes)
 
         self.mutex.acquire() # acquire the bus mutex
 
-        return_val = None
+        try:
+            return_val = self.bus_transfer(_to_bytearray(outArr), inBytes)
+        except:
+            self.mutex.release() # release the bus mutex before raising the exception
+            raise # raise the exception for user-code to deal with
+
+        self.mutex.release() # release the bus mutex
+        return _read_result(return_val, isinstance(outArr, list)) # return data (if read)
+
+    def transfer_many(self, segments):
+        """Conduct several I2C transfers, holding the bus for all of them
+
+        With the periphery backend and TRANSFER_COMBINED or TRANSFER_STOP_START, all the transfers are sent in
+        one I2C_RDWR ioctl.
+
+        Keyword arguments:
+        segments -- list of (outArr, inBytes): the bytes to write and how many bytes to read, for each transfer
+
+        Returns a list with the bytes read by each transfer (None for transfers that don't read), each a list
+        or a bytearray as for transfer"""
+
+        # type cast to int to ensure compatibility
+        bus_segments = [(_to_bytearray(outArr), int(inBytes)) for outArr, inBytes in segments]
+
+        self.mutex.acquire() # acquire the bus mutex
 
         try:
-            if self.bus_name == "RPI_1":
-                if RPI_1_Module == "pigpio":
-                    if(len(outArr) >= 2 and inBytes == 0):
-                        self.i2c_bus.i2c_write_i2c_block_data(self.i2c_bus_handle, outArr[0], outArr[1:])
-                    elif(len(outArr) == 1 and inBytes == 0):
-                        self.i2c_bus.i2c_write_byte(self.i2c_bus_handle, outArr[0])
-                    elif(len(outArr) == 1 and inBytes >= 1):
-                        return_val = self.i2c_bus.i2c_read_i2c_block_data(self.i2c_bus_handle, outArr[0], inBytes)
-                    elif(len(outArr) == 0 and inBytes >= 1):
-                        return_val = self.i2c_bus.i2c_read_byte(self.i2c_bus_handle)
-                    else:
-                        raise IOError("I2C operation not supported")
-                elif RPI_1_Module == "smbus":
-                    if(len(outArr) >= 2 and inBytes == 0):
-                        self.i2c_bus.write_i2c_block_data(self.address, outArr[0], outArr[1:])
-                    elif(len(outArr) == 1 and inBytes == 0):
-                        self.i2c_bus.write_byte(self.address, outArr[0])
-                    elif(len(outArr) == 1 and inBytes >= 1):
-                        return_val = self.i2c_bus.read_i2c_block_data(self.address, outArr[0], inBytes)
-                    elif(len(outArr) == 0 and inBytes == 1):
-                        return_val = self.i2c_bus.read_byte(self.address)
-                    else:
-                        raise IOError("I2C operation not supported")
-                elif RPI_1_Module == "periphery":
-                    # for repeated starts
-                    # seems to fail regularly. RPi does not recognize clock stretching during repeated starts.
-                    #msgs = []
-                    #offset = 0
-                    #if(len(outArr) > 0):
-                    #    msgs.append(self.i2c_bus.Message(outArr))
-                    #    offset = 1
-                    #if(inBytes):
-                    #    r = [0 for b in range(inBytes)]
-                    #    msgs.append(self.i2c_bus.Message(r, read = True))
-                    #if(len(msgs) >= 1):
-                    #    self.i2c_bus.transfer(self.address, msgs)
-                    #if(inBytes):
-                    #    return msgs[offset].data
-
-                    # for independent messages (no repeated starts)
-                    # there is a small delay between messages, but it doesn't fail to recognize clock stretching between the messages
-                    if(len(outArr) > 0):
-                        msg = [self.i2c_bus.Message(outArr)]
-                        self.i2c_bus.transfer(self.address, msg)
-                    if(inBytes):
-                        r = [0 for b in range(inBytes)]
-                        msg = [self.i2c_bus.Message(r, read = True)]
-                        self.i2c_bus.transfer(self.address, msg)
-                        return_val = msg[0].data
-
-            elif self.bus_name == "RPI_1SW":
-                return_val = self.i2c_bus.transfer(self.address, outArr, inBytes)
-
-            elif self.bus_name == "GPG3_AD1" or self.bus_name == "GPG3_AD2":
-                try:
-                    return_val = self.gpg3.grove_i2c_transfer(self.port, self.address, outArr, inBytes)
-                except self.gopigo3_module.I2CError:
-                    raise IOError("[Errno 5] Input/output error")
-
-            elif self.bus_name == "BP3_1" or self.bus_name == "BP3_2" or self.bus_name == "BP3_3" or self.bus_name == "BP3_4":
-                try:
-                    return_val = self.bp3.i2c_transfer(self.port, self.address, outArr, inBytes)
-                except self.brickpi3_module.I2CError:
-                    raise IOError("[Errno 5] Input/output error")
+            return_val = self.bus_transfer_many(bus_segments)
         except:
             self.mutex.release() # release the bus mutex before raising the exception
             raise # raise the exception for user-code to deal with
 
         self.mutex.release() # release the bus mutex
-        return return_val    # return data (if read)
+        return [_read_result(data, isinstance(outArr, list)) for data, (outArr, inBytes) in zip(return_val, segments)]
+
+    def readinto(self, buf, reg = None):
+        """Read bytes into a buffer
+
+        Keyword arguments:
+        buf -- a bytearray, memoryview or other writable buffer to fill with the bytes read. Buffers of items
+            other than bytes (e.g. an array of 16-bit values) are filled byte by byte, and need Python 3.
+        reg (default None) -- Register to read from or None
+
+        Returns the number of bytes read"""
+
+        view = memoryview(buf)
+        if view.format != "B":
+            if not hasattr(view, "cast"): # Python 2
+                raise TypeError("readinto needs a buffer of bytes on Python 2, not {}".format(view.format))
+            view = view.cast("B")
+
+        # write the register to read from?
+        if reg != None:
+            outArr = bytearray((reg & 0xFF,))
+        else:
+            outArr = bytearray()
+
+        data = self.transfer(outArr, len(view))
+        view[:] = data
+        return len(data)
+
+    def __transfer_each__(self, segments):
+        """ Transfer several, one at a time """
+
+        return [self.bus_transfer(outArr, inBytes) for outArr, inBytes in segments]
+
+    def __transfer_pigpio__(self, outArr, inBytes):
+        """ Transfer with pigpio """
+
+        if(len(outArr) >= 2 and inBytes == 0):
+            self.i2c_bus.i2c_write_i2c_block_data(self.i2c_bus_handle, outArr[0], outArr[1:])
+        elif(len(outArr) == 1 and inBytes == 0):
+            self.i2c_bus.i2c_write_byte(self.i2c_bus_handle, outArr[0])
+        elif(len(outArr) == 1 and inBytes >= 1):
+            return self.i2c_bus.i2c_read_i2c_block_data(self.i2c_bus_handle, outArr[0], inBytes)
+        elif(len(outArr) == 0 and inBytes >= 1):
+            return self.i2c_bus.i2c_read_byte(self.i2c_bus_handle)
+        else:
+            raise IOError("I2C operation not supported")
+
+    def __transfer_smbus__(self, outArr, inBytes):
+        """ Transfer with smbus """
+
+        if(len(outArr) >= 2 and inBytes == 0):
+            self.i2c_bus.write_i2c_block_data(self.address, outArr[0], list(outArr[1:]))
+        elif(len(outArr) == 1 and inBytes == 0):
+            self.i2c_bus.write_byte(self.address, outArr[0])
+        elif(len(outArr) == 1 and inBytes >= 1):
+            return self.i2c_bus.read_i2c_block_data(self.address, outArr[0], inBytes)
+        elif(len(outArr) == 0 and inBytes == 1):
+            return self.i2c_bus.read_byte(self.address)
+        else:
+            raise IOError("I2C operation not supported")
+
+    def __transfer_periphery__(self, outArr, inBytes):
+        """ Transfer with periphery """
+
+        return self.__transfer_many_periphery__([(outArr, inBytes)])[0]
+
+    def __transfer_many_periphery__(self, segments):
+        """ Transfer several with periphery, as set by transfer_mode """
+
+        flags = 0
+        if self.transfer_mode == TRANSFER_STOP_START:
+            flags = I2C_M_STOP
+
+        msgs = []
+        reads = [] # (segment, message) for each read
+        for segment, (outArr, inBytes) in enumerate(segments):
+            if(len(outArr) > 0):
+                msgs.append(self.i2c_bus.Message(outArr, flags = flags))
+            if(inBytes):
+                r = bytearray(inBytes)
+                msgs.append(self.i2c_bus.Message(r, read = True, flags = flags))
+                reads.append((segment, msgs[-1]))
+
+        if self.transfer_mode == TRANSFER_SEPARATE:
+            # for independent messages (no repeated starts)
+            # there is a small delay between messages, but it doesn't fail to recognize clock stretching between the messages
+            for msg in msgs:
+                self.i2c_bus.transfer(self.address, [msg])
+        elif(len(msgs) >= 1):
+            # for repeated starts (or stops, with TRANSFER_STOP_START), in one ioctl
+            # repeated starts seem to fail regularly. RPi does not recognize clock stretching during repeated starts.
+            self.i2c_bus.transfer(self.address, msgs)
+
+        return_val = [None] * len(segments)
+        for segment, msg in reads:
+            return_val[segment] = msg.data
+        return return_val
+
+    def __transfer_rpi_sw__(self, outArr, inBytes):
+        """ Transfer with the RPi software I2C bus """
+
+        return self.i2c_bus.transfer(self.address, list(outArr), inBytes)
+
+    def __transfer_gpg3__(self, outArr, inBytes):
+        """ Transfer with a GoPiGo3 grove port """
+
+        try:
+            return self.gpg3.grove_i2c_transfer(self.port, self.address, list(outArr), inBytes)
+        except self.gopigo3_module.I2CError:
+            raise IOError("[Errno 5] Input/output error")
+
+    def __transfer_bp3__(self, outArr, inBytes):
+        """ Transfer with a BrickPi3 sensor port """
+
+        if self.ready_time is not None: # the first transfer since the port was set up
+            wait = self.ready_time - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            self.ready_time = None
+
+        try:
+            return self.bp3.i2c_transfer(self.port, self.address, list(outArr), inBytes)
+        except self.brickpi3_module.I2CError:
+            raise IOError("[Errno 5] Input/output error")
 
     def write_8(self, val):
         """Write an 8-bit value
@@ -237,10 +495,7 @@ class DI_I2C(object):
         val = int(val)
         if big_endian == None:
             big_endian = self.big_endian
-        if big_endian:
-            self.transfer([reg, ((val >> 8) & 0xFF), (val & 0xFF)])
-        else:
-            self.transfer([reg, (val & 0xFF), ((val >> 8) & 0xFF)])
+        self.transfer(WRITE_REG_16[bool(big_endian)].pack(reg & 0xFF, val & 0xFFFF))
 
     def write_reg_32(self, reg, val, big_endian = None):
         """Write a 32-bit value to a register
@@ -252,10 +507,7 @@ class DI_I2C(object):
         val = int(val)
         if big_endian == None:
             big_endian = self.big_endian
-        if big_endian:
-            self.transfer( [reg, ((val >> 24) & 0xFF), ((val >> 16) & 0xFF), ((val >> 8) & 0xFF), (val & 0xFF)])
-        else:
-            self.transfer([reg, (val & 0xFF), ((val >> 8) & 0xFF), ((val >> 16) & 0xFF), ((val >> 24) & 0xFF)])
+        self.transfer(WRITE_REG_32[bool(big_endian)].pack(reg & 0xFF, val & 0xFFFFFFFF))
 
     def write_reg_list(self, reg, list):
         """Write a list of bytes to a register
@@ -306,28 +558,16 @@ class DI_I2C(object):
         """
         # write the register to read from?
         if reg != None:
-            outArr = [reg]
+            outArr = bytearray((reg & 0xFF,))
         else:
-            outArr = []
+            outArr = bytearray()
 
         val = self.transfer(outArr, 2)
 
         if big_endian == None:
             big_endian = self.big_endian
 
-        # big endian?
-        if big_endian:
-            value = (val[0] << 8) | val[1]
-        else:
-            value = (val[1] << 8) | val[0]
-
-        # signed value?
-        if signed:
-            # negative value?
-            if value & 0x8000:
-                value = value - 0x10000
-
-        return value
+        return READ_16[(bool(signed), bool(big_endian))].unpack_from(val)[0]
 
     def read_32(self, reg = None, signed = False, big_endian = None):
         """Read a 32-bit value
@@ -341,28 +581,16 @@ class DI_I2C(object):
         """
         # write the register to read from?
         if reg != None:
-            outArr = [reg]
+            outArr = bytearray((reg & 0xFF,))
         else:
-            outArr = []
+            outArr = bytearray()
 
         val = self.transfer(outArr, 4)
 
         if big_endian == None:
             big_endian = self.big_endian
 
-        # big endian?
-        if big_endian:
-            value = (val[0] << 24) | (val[1] << 16) | (val[2] << 8) | val[3]
-        else:
-            value = (val[3] << 24) | (val[2] << 16) | (val[1] << 8) | val[0]
-
-        # signed value?
-        if signed:
-            # negative value?
-            if value & 0x80000000:
-                value = value - 0x100000000
-
-        return value
+        return READ_32[(bool(signed), bool(big_endian))].unpack_from(val)[0]
 
     def read_list(self, reg, len):
         """Read a list of bytes from a register
@@ -380,9 +608,6 @@ class DI_I2C(object):
             outArr = []
         return self.transfer(outArr, len)
 
-import wiringpi
-import atexit
-
 
 class DI_I2C_RPI_SW(object):
     """Dexter Industries I2C bit-bang drivers for the Raspberry Pi"""
@@ -440,6 +665,10 @@ class DI_I2C_RPI_SW(object):
     def __init__(self):
         """ Initialize """
 
+        global wiringpi
+        if wiringpi is None:
+            wiringpi = importlib.import_module("wiringpi")
+
         # set up the GPIO with BCM numbering
         wiringpi.wiringPiSetupGpio()
 
@@ -655,3 +884,266 @@ class DI_I2C_RPI_SW(object):
             return self.ERROR_CLOCK_STRETCH_TIMEOUT, 0
         wiringpi.pinMode(3, self.OUTPUT) # SCL Low
         return self.SUCCESS, data
+
+
+class DI_I2C_RPI_SW_GPIO(object):
+    """Dexter Industries I2C bit-bang drivers for the Raspberry Pi, using RPi.GPIO"""
+
+    '''
+    Currently the bus runs at about 100kbps. Tested with an RPi 3B+ with minimal CPU load.
+
+
+    Code for using RPi.GPIO for GPIO control
+        # setup
+        GPIO.setmode(GPIO.BCM) # set up the GPIO with BCM numbering
+        GPIO.setup(2, GPIO.IN) # set SDA pin as input
+        GPIO.setup(3, GPIO.IN) # set SCL pin as input
+
+        GPIO.setup(3, GPIO.IN) # SCL High
+        GPIO.setup(3, GPIO.OUT) # SCL Low
+        GPIO.setup(2, GPIO.IN) # SDA High
+        GPIO.setup(2, GPIO.OUT) # SDA Low
+        GPIO.input(3) # SCL Read
+        GPIO.input(2) # SDA Read
+
+    Code for using wiringpi for GPIO control
+        # setup
+        wiringpi.wiringPiSetup()
+        wiringpi.pinMode(8, 0) # set SDA pin as input
+        wiringpi.pinMode(9, 0) # set SCL pin as input
+        wiringpi.digitalWrite(8, 0)
+        wiringpi.digitalWrite(9, 0)
+
+        wiringpi.pinMode(9, 0) # SCL High
+        wiringpi.pinMode(9, 1) # SCL Low
+        wiringpi.pinMode(8, 0) # SDA High
+        wiringpi.pinMode(8, 1) # SDA Low
+        wiringpi.digitalRead(9) # SCL Read
+        wiringpi.digitalRead(8) # SDA Read
+    '''
+
+    SUCCESS = 0
+    ERROR_NACK = 1
+    ERROR_CLOCK_STRETCH_TIMEOUT = 2
+    ERROR_DATA_STRETCH_TIMEOUT  = 3
+    ERROR_DATA_AND_CLOCK_STRETCH_TIMEOUT  = 4
+
+    # timeout if stretched for more than this long (in seconds)
+    STRETCH_TIMEOUT = 0.001
+
+    def __init__(self):
+        """ Initialize """
+
+        global GPIO
+        if GPIO is None:
+            GPIO = importlib.import_module("RPi.GPIO")
+
+        # Set up the GPIO pins
+        GPIO.setmode(GPIO.BCM) # set up the GPIO with BCM numbering
+        GPIO.setup(3, GPIO.IN) # set SCL pin as input
+        GPIO.setup(2, GPIO.IN) # set SDA pin as input
+
+        self.BusActive = False
+
+        # Register the exit method
+        atexit.register(self.__exit_cleanup__) # register the exit method
+
+    def __exit_cleanup__(self):
+        """ Called at exit to clean up """
+
+        if self.BusActive:
+            # Set GPIOs as inputs
+            GPIO.setup(3, GPIO.IN) # set SCL pin as input
+            GPIO.setup(2, GPIO.IN) # set SDA pin as input
+
+        self.BusActive = False
+
+    def transfer(self, addr, outArr, inBytes):
+        """ Write and/or read I2C """
+
+        if(len(outArr) > 0): # bytes to write?
+            self.BusActive = True
+            if self.__write__(addr, outArr, inBytes) != self.SUCCESS:
+                self.BusActive = False
+                raise IOError("[Errno 5] Input/output error")
+
+        if(inBytes > 0): # read bytes?
+            self.BusActive = True
+            result, value = self.__read__(addr, inBytes)
+            self.BusActive = False
+            if result != self.SUCCESS:
+                raise IOError("[Errno 5] Input/output error")
+            return value
+        else:
+            self.BusActive = False
+
+    def __delay__(self):
+        """ Delay called for slowing down the I2C clock to around 100kbps """
+
+        #time_start = time.time()
+        #while (time.time() - time_start) < 0.000005:
+        #    pass
+
+        #time.sleep(0.000005)
+
+        pass # Already enough time overhead. Return ASAP.
+
+    def __scl_high_check__(self):
+        """ Allow SCL to go high, and wait until it's high. Timeout. """
+
+        GPIO.setup(3, GPIO.IN) # SCL High
+        if not GPIO.input(3): # SCL Read
+            return self.__scl_check_timeout__()
+        return self.SUCCESS
+
+    def __scl_check_timeout__(self):
+        """ Wait until SCL is high, and timeout if it takes too long """
+
+        time_start = time.time()
+        while not GPIO.input(3): # SCL Read
+            if (time.time() - time_start) > self.STRETCH_TIMEOUT:
+                return self.ERROR_CLOCK_STRETCH_TIMEOUT # timeout waiting for SCL to go high
+        #self.__delay__() # SCL is already high, just make sure it's high enough
+        return self.SUCCESS
+
+    def __sda_high_check__(self):
+        """ Allow SDA to go high, and wait until it's high """
+
+        GPIO.setup(2, GPIO.IN) # SDA High
+        result = 0
+        time_start = time.time()
+        while not GPIO.input(2): # SDA Read
+            if time.time() - time_start > self.STRETCH_TIMEOUT:
+                return self.ERROR_DATA_STRETCH_TIMEOUT # timeout waiting for SDA to go high
+        #self.__delay__() # SDA is already high, just make sure it's high enough
+        return self.SUCCESS
+
+    def __write__(self, addr, outArr, restart = False):
+        """ Write bytes """
+
+        outBuffer = [(addr << 1)] # left-shift I2C address and clear read bit
+        outBuffer.extend(outArr) # outBuffer now contains the address and outArr
+        self.__start__() # issue bus start
+        for b in range(len(outBuffer)): # for each byte
+            result = self.__write_byte__(outBuffer[b]) # write the byte
+            if result != self.SUCCESS: # if an error
+                if result == self.ERROR_NACK: # if NACK
+                    self.__stop__()
+                else: # other error. Probably ERROR_CLOCK_STRETCH_TIMEOUT
+                    GPIO.setup(3, GPIO.IN) # SCL High
+                    GPIO.setup(2, GPIO.IN) # SDA High
+                return result # return error
+        if restart: # if a read is immediately following, issue a restart
+            # SDA high then SCL high, with provisions for timeout
+            if self.__sda_high_check__():
+                if self.__scl_high_check__():
+                    return self.ERROR_DATA_AND_CLOCK_STRETCH_TIMEOUT
+                return self.ERROR_DATA_STRETCH_TIMEOUT
+            if self.__scl_high_check__():
+                return self.ERROR_CLOCK_STRETCH_TIMEOUT
+
+            #self.__start__() # This doesn't seem to be necessary # issue bus start
+            return self.SUCCESS
+        else:
+            return self.__stop__() # issue bus stop
+
+    def __read__(self, addr, inBytes):
+        """ Read bytes """
+
+        addr = (addr << 1) | 0x01 # left-shift I2C address and set read bit
+        inBuffer = []
+
+        self.__start__() # issue bus start
+        result = self.__write_byte__(addr) # write the address and read bit
+        if result != self.SUCCESS: # check for error
+            if result == self.ERROR_NACK: # if NACK
+                self.__stop__()
+            else: # other error. Probably ERROR_CLOCK_STRETCH_TIMEOUT
+                GPIO.setup(3, GPIO.IN) # SCL High
+                GPIO.setup(2, GPIO.IN) # SDA High
+            return result, inBuffer
+
+        for b in range(inBytes): # for each byte to read
+            result, value = self.__read_byte__((inBytes - 1) - b) # read a byte, and ack all except the last
+            if result != self.SUCCESS: # check for error
+                GPIO.setup(3, GPIO.IN) # SCL High
+                GPIO.setup(2, GPIO.IN) # SDA High
+                return result, inBuffer # return error
+            inBuffer.append(value) # append the read byte to inBuffer
+
+        result = self.__stop__() # issue bus stop
+        return result, inBuffer # return the read byte array
+
+    def __start__(self):
+        """ Issue bus start sequence """
+
+        GPIO.setup(2, GPIO.OUT) # SDA Low
+        self.__delay__()
+
+    def __stop__(self):
+        """ Issue bus stop sequence """
+
+        GPIO.setup(2, GPIO.OUT) # SDA Low
+        self.__delay__()
+
+        # SCL high then SDA high, with provisions for timeout
+        if self.__scl_high_check__():
+            if self.__sda_high_check__():
+                return self.ERROR_DATA_AND_CLOCK_STRETCH_TIMEOUT
+            return self.ERROR_CLOCK_STRETCH_TIMEOUT
+        if self.__sda_high_check__():
+            return self.ERROR_DATA_STRETCH_TIMEOUT
+
+        return self.SUCCESS
+
+    def __write_byte__(self, val):
+        """ Write a byte """
+
+        for b in range(8):
+            GPIO.setup(3, GPIO.OUT) # SCL Low
+            if (0x80 >> b) & val:
+                GPIO.setup(2, GPIO.IN) # SDA High
+            else:
+                GPIO.setup(2, GPIO.OUT) # SDA Low
+            #self.__delay__()
+            GPIO.setup(3, GPIO.IN) # SCL High
+            if not GPIO.input(3): # SCL Read
+                if self.__scl_check_timeout__():
+                    return self.ERROR_CLOCK_STRETCH_TIMEOUT
+            #self.__delay__()
+        GPIO.setup(3, GPIO.OUT) # SCL Low
+        GPIO.setup(2, GPIO.IN) # SDA High
+        self.__delay__()
+        if self.__scl_high_check__():
+            return self.ERROR_CLOCK_STRETCH_TIMEOUT
+
+        result = self.SUCCESS
+        if GPIO.input(2): # SDA Read. check for ACK
+            result = self.ERROR_NACK
+        GPIO.setup(3, GPIO.OUT) # SCL Low
+        return result
+
+    def __read_byte__(self, ack):
+        """ Read a byte """
+
+        GPIO.setup(2, GPIO.IN) # SDA High
+        data = 0
+        GPIO.setup(3, GPIO.OUT) # SCL Low
+        for b in range(8):
+            self.__delay__()
+            GPIO.setup(3, GPIO.IN) # SCL High
+            if not GPIO.input(3): # SCL Read
+                if self.__scl_check_timeout__():
+                    return self.ERROR_CLOCK_STRETCH_TIMEOUT
+            if GPIO.input(2): # SDA Read
+                data |= (0x80 >> b)
+            #self.__delay__()
+            GPIO.setup(3, GPIO.OUT) # SCL Low
+        if ack != 0: # send ack?
+            GPIO.setup(2, GPIO.OUT) # SDA Low
+        else:
+            self.__delay__()
+        if self.__scl_high_check__():
+            return self.ERROR_CLOCK_STRETCH_TIMEOUT, 0
+        GPIO.setup(3, GPIO.OUT) # SCL Low
+        return self.SUCCESS, data
@@ -0,0 +1,201 @@
+# https://www.dexterindustries.com
+#
+# Copyright (c) 2020 Dexter Industries
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information see https://github.com/DexterInd/DI_Sensors/blob/master/LICENSE.md
+#
+# The lock used by the Dexter bus mutexes (DI_Mutex, Dexter_Mutex and I2C_mutex.Mutex)
+#
+# The lock is a lock on a file in /run/lock, so it works between processes. Within a process, the threads take a
+# threading.RLock first, so only one thread at a time waits for (or holds) the file lock. The lock is re-entrant:
+# the thread holding it can acquire it again, and it's released when that thread has released it as many times
+# as it acquired it. The file is only locked by the outermost acquire. The lock file is opened once and kept
+# open, and waiting for another process to release the lock blocks in the kernel instead of polling.
+#
+# NamedFileLock is a FileLock named by a string, with one lock per name in each process (DI_Mutex and Dexter_Mutex
+# are NamedFileLocks).
+
+from __future__ import print_function
+from __future__ import division
+
+import time
+import fcntl
+import errno
+import os
+import atexit
+import threading
+
+try:
+    import mutex_trace
+except ImportError:
+    mutex_trace = None
+
+
+class FileLock(object):
+    """ A re-entrant lock between the threads and processes using a lock file """
+
+    # the longest to sleep between attempts to lock the file, when waiting with a timeout
+    MaxLoopTime = 0.01
+
+    def __init__(self, filename, loop_time = 0.0001):
+        """ Initialize
+
+        Keyword arguments:
+        filename -- the lock file. It's created if it doesn't exist.
+        loop_time (default 0.0001) -- the shortest sleep between attempts to lock the file, when waiting with a timeout
+        """
+
+        self.Filename = filename
+        self.LoopTime = loop_time
+        self.File = None   # the lock file, opened by the first acquire and kept open
+        self.Lock = threading.RLock()
+        self.Owner = None  # the thread holding the lock, otherwise None
+        self.Depth = 0     # how many times the owner has acquired the lock without releasing it
+        self.Trace = None  # see mutex_trace.py
+        if mutex_trace is not None:
+            self.Trace = mutex_trace.tracer(self.Filename)
+
+        try:
+            open(self.Filename, 'a').close()
+            if os.path.isfile(self.Filename):
+                os.chmod(self.Filename, 0o777)
+        except Exception as e:
+            pass
+
+    def acquire(self, timeout = None):
+        """ Acquire the lock
+
+        Keyword arguments:
+        timeout (default None) -- the most seconds to wait for the lock, or None to wait for as long as it takes
+
+        Returns True if the lock was acquired, False if it timed out
+        """
+
+        start = time.time()
+        deadline = None
+        if timeout is not None:
+            deadline = start + timeout
+
+        if not self.__acquire_thread_lock__(deadline):
+            return False
+        if self.Depth == 0:
+            try:
+                if self.File is None:
+                    self.File = open(self.Filename, 'a')
+                if not self.__lock_file__(deadline):
+                    self.Lock.release()
+                    return False
+            except:
+                self.Lock.release()
+                raise
+            self.Owner = threading.current_thread()
+            if self.Trace is not None:
+                self.Trace.acquired(start)
+        self.Depth += 1
+        return True
+
+    def release(self):
+        """ Release the lock
+
+        Returns True if the lock was released, False if the calling thread doesn't hold it
+        """
+
+        if self.Depth == 0 or self.Owner is not threading.current_thread():
+            return False
+        self.Depth -= 1
+        if self.Depth == 0:
+            if self.Trace is not None:
+                self.Trace.released()
+            self.Owner = None
+            fcntl.lockf(self.File, fcntl.LOCK_UN)
+        self.Lock.release()
+        return True
+
+    def held(self):
+        """ Returns True if the calling thread holds the lock """
+
+        return self.Depth > 0 and self.Owner is threading.current_thread()
+
+    def __acquire_thread_lock__(self, deadline):
+        """ Take the lock between the threads of this process """
+
+        if deadline is None:
+            return self.Lock.acquire()
+        try:
+            return self.Lock.acquire(True, max(0, deadline - time.time()))
+        except TypeError: # Python 2 locks can't time out
+            while not self.Lock.acquire(False):
+                if time.time() >= deadline:
+                    return False
+                time.sleep(self.LoopTime)
+            return True
+
+    def __lock_file__(self, deadline):
+        """ Take the lock between processes """
+
+        delay = self.LoopTime
+        while True:
+            try:
+                fcntl.lockf(self.File, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except IOError as e:
+                if e.errno not in (errno.EACCES, errno.EAGAIN):
+                    raise
+            # already locked by a different process
+            if deadline is None:
+                fcntl.lockf(self.File, fcntl.LOCK_EX) # wait until it's released
+                return True
+            # lockf can't time out, so try again with increasing sleeps until the deadline
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, self.MaxLoopTime)
+
+
+class NamedFileLock(FileLock):
+    """ A FileLock for a name, shared by everything in the process using that name. Subclasses set Prefix. """
+
+    Prefix = None # the lock file name is Prefix + name
+
+    # (class, name): lock. There is one lock per name and class in each process.
+    Instances = {}
+    InstancesLock = threading.Lock()
+
+    DefaultLoopTime = 0.0001
+
+    def __new__(cls, name, loop_time = None):
+        with NamedFileLock.InstancesLock:
+            lock = NamedFileLock.Instances.get((cls, name))
+            if lock is None:
+                lock = object.__new__(cls)
+                lock.Initialized = False
+                NamedFileLock.Instances[(cls, name)] = lock
+            return lock
+
+    def __init__(self, name, loop_time = None):
+        """ Initialize
+
+        Keyword arguments:
+        name -- the lock's name
+        loop_time (default None) -- see FileLock. None uses the interned lock's loop_time (DefaultLoopTime for a new
+            lock). Raises ValueError if it differs from the loop_time the lock for the name was created with.
+        """
+
+        with NamedFileLock.InstancesLock:
+            if self.Initialized:
+                if loop_time is not None and loop_time != self.LoopTime:
+                    raise ValueError("{} {} already exists with loop_time {}".format(
+                                     type(self).__name__, name, self.LoopTime))
+                return
+            FileLock.__init__(self, self.Prefix + name, self.DefaultLoopTime if loop_time is None else loop_time)
+            self.Initialized = True
+
+        # Register the exit method
+        atexit.register(self.__exit_cleanup__) # register the exit method
+
+    def __exit_cleanup__(self):
+        """ Called at exit to clean up """
+
+        while self.release():
+            pass
@@ -0,0 +1,283 @@
+# https://www.dexterindustries.com
+#
+# Copyright (c) 2020 Dexter Industries
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information see https://github.com/DexterInd/DI_Sensors/blob/master/LICENSE.md
+#
+# Lock contention tracing for the Dexter bus mutexes (DI_Mutex, Dexter_Mutex and I2C_mutex.Mutex)
+#
+# Tracing is off unless the DEXTER_MUTEX_TRACE environment variable is set (to anything but 0), or the program
+# calls mutex_trace.enable() before creating its mutexes. When it's on, every time a mutex is released a record
+# of how long the process waited for it, how long it held it, the process ID and the call site (the first
+# caller outside the mutex and I2C driver modules) is written to a ring buffer in shared memory, one ring per
+# lock file. Records are written while the mutex is still held, so the processes sharing a lock take turns
+# writing its ring.
+#
+# To watch the locks being used, run this module:
+#
+#     DEXTER_MUTEX_TRACE=1 python my_robot.py &
+#     python mutex_trace.py --threshold 20
+#
+# Every second it shows each lock's use since the last report, the process holding it now, the processes and
+# call sites that held it the longest, and flags holds longer than the threshold (in ms).
+
+from __future__ import print_function
+from __future__ import division
+
+import os
+import sys
+import errno
+import time
+import mmap
+import fcntl
+import struct
+
+TRACE_DIR = os.environ.get("DEXTER_MUTEX_TRACE_DIR", "/dev/shm")
+TRACE_PREFIX = "dexter_mutex_trace."
+SLOTS = 4096 # records kept per lock
+SITE_SIZE = 100
+
+MAGIC = b"DXMT"
+VERSION = 1
+
+# magic, version, slots, records written, holder PID (0 when free), holder acquired at, holder waited, holder site
+HEADER = struct.Struct("<4sIIQidd%ds" % SITE_SIZE)
+HEADER_SIZE = 256
+
+# acquired at, waited, held (seconds), PID, site
+RECORD = struct.Struct("<dddi%ds" % SITE_SIZE)
+
+# frames in these modules are skipped when looking for the call site
+LIBRARY_MODULES = set(["mutex_trace", "file_lock", "di_mutex", "dexter_mutex", "I2C_mutex", "di_i2c", "dexter_i2c"])
+
+_enabled = os.environ.get("DEXTER_MUTEX_TRACE", "0") not in ("", "0")
+
+
+def enable():
+    """ Trace the mutexes created from now on """
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """ Don't trace the mutexes created from now on """
+    global _enabled
+    _enabled = False
+
+
+def enabled():
+    """ Returns True if new mutexes are traced """
+    return _enabled
+
+
+def trace_filename(lock_filename):
+    """ The shared memory file for a lock file """
+    return os.path.join(TRACE_DIR, TRACE_PREFIX + os.path.basename(lock_filename))
+
+
+def tracer(lock_filename):
+    """ Get a LockTrace for a mutex's lock file
+
+    Returns None if tracing is off, or the trace file can't be opened
+    """
+    if not _enabled:
+        return None
+    try:
+        return LockTrace(trace_filename(lock_filename))
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def call_site():
+    """ The file, line and function of the first caller outside the mutex and I2C driver modules """
+    frame = sys._getframe(1)
+    while frame.f_back is not None and frame.f_globals.get("__name__") in LIBRARY_MODULES:
+        frame = frame.f_back
+    code = frame.f_code
+    return "%s:%d %s" % (os.path.basename(code.co_filename), frame.f_lineno, code.co_name)
+
+
+def _pack_site(site):
+    return site.encode("utf-8")[:SITE_SIZE]
+
+
+def _unpack_site(site):
+    return site.rstrip(b"\0").decode("utf-8", "replace")
+
+
+class LockTrace(object):
+    """ The ring buffer of records for one lock, in a file in shared memory """
+
+    def __init__(self, filename, slots = SLOTS):
+        self.Filename = filename
+        size = HEADER_SIZE + slots * RECORD.size
+        fd = os.open(filename, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            # the first process to open the file sets it up
+            fcntl.lockf(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_size < HEADER_SIZE:
+                    os.ftruncate(fd, size)
+                    os.write(fd, HEADER.pack(MAGIC, VERSION, slots, 0, 0, 0, 0, b""))
+                    try:
+                        os.fchmod(fd, 0o666) # so other users' processes can trace the lock too
+                    except OSError:
+                        pass
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN)
+            self.Map = mmap.mmap(fd, 0)
+        finally:
+            os.close(fd)
+
+        magic, version, self.Slots = HEADER.unpack_from(self.Map)[:3]
+        if magic != MAGIC or version != VERSION or len(self.Map) < HEADER_SIZE + self.Slots * RECORD.size:
+            self.Map.close()
+            raise ValueError("%s isn't a mutex trace file" % filename)
+
+        self.Acquired = 0
+        self.Waited = 0
+        self.Site = b""
+
+    def acquired(self, wait_start):
+        """ Called by the mutex once it's acquired, with the time it started waiting """
+
+        self.Acquired = time.time()
+        self.Waited = self.Acquired - wait_start
+        self.Site = _pack_site(call_site())
+        struct.pack_into("<idd%ds" % SITE_SIZE, self.Map, 20, os.getpid(), self.Acquired, self.Waited, self.Site)
+
+    def released(self):
+        """ Called by the mutex before it's released """
+
+        count = struct.unpack_from("<Q", self.Map, 12)[0]
+        RECORD.pack_into(self.Map, HEADER_SIZE + (count % self.Slots) * RECORD.size,
+                         self.Acquired, self.Waited, time.time() - self.Acquired, os.getpid(), self.Site)
+        struct.pack_into("<Qi", self.Map, 12, count + 1, 0)
+
+    def read(self, since = 0):
+        """ Read the trace
+
+        Keyword arguments:
+        since (default 0) -- the number of records written when last read, to only get the records after those
+
+        Returns the number of records written, the holder (PID, acquired at, waited, site) or None if the lock is
+        free, and a list of records (acquired at, waited, held, PID, site), oldest first
+        """
+        header = HEADER.unpack_from(self.Map)
+        count, pid = header[3], header[4]
+        holder = None
+        if pid:
+            holder = (pid, header[5], header[6], _unpack_site(header[7]))
+        records = []
+        for i in range(max(since, count - self.Slots), count):
+            acquired, waited, held, pid, site = RECORD.unpack_from(self.Map, HEADER_SIZE + (i % self.Slots) * RECORD.size)
+            records.append((acquired, waited, held, pid, _unpack_site(site)))
+        return count, holder, records
+
+    def close(self):
+        self.Map.close()
+
+
+def _running(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM # running, as a different user
+    return True
+
+
+def report(name, trace, since, interval, threshold, top):
+    """ Print a lock's use since the last report (when since records had been written), and return the count
+
+    interval is the seconds since the last report, or None when reporting on the whole ring
+    """
+
+    count, holder, records = trace.read()
+    new = records[len(records) - min(len(records), count - since):]
+    print(name)
+
+    if new:
+        waits = [record[1] for record in new]
+        held = sum(record[2] for record in new)
+        if interval is None: # the whole ring
+            interval = max(time.time() - new[0][0], held)
+        print("  %d acquires, %.0f%% held, wait mean %.2f ms max %.2f ms, %d waited over 1 ms" % (
+              len(new), 100 * min(held / interval, 1), 1000 * sum(waits) / len(waits), 1000 * max(waits),
+              sum(1 for wait in waits if wait > 0.001)))
+    else:
+        print("  not used")
+
+    if holder is not None:
+        pid, acquired, waited, site = holder
+        held = time.time() - acquired
+        flag = ""
+        if not _running(pid):
+            flag = "  <-- process has exited"
+        elif held > threshold:
+            flag = "  <-- HELD OVER %.0f ms" % (1000 * threshold)
+        print("  held now by %d at %s for %.1f ms%s" % (pid, site, 1000 * held, flag))
+
+    # top holders, over the whole ring
+    holders = {}
+    for acquired, waited, held, pid, site in records:
+        total = holders.setdefault((pid, site), [0, 0, 0, 0])
+        total[0] += 1
+        total[1] += held
+        total[2] = max(total[2], held)
+        total[3] += waited
+    if holders:
+        print("  top holders (last %d acquires):" % len(records))
+        for (pid, site), (n, held, longest, waited) in sorted(holders.items(), key = lambda item: -item[1][1])[:top]:
+            print("    %7d %-40s %6d x, held %8.1f ms (max %.1f), waited %8.1f ms" % (
+                  pid, site, n, 1000 * held, 1000 * longest, 1000 * waited))
+
+    for acquired, waited, held, pid, site in new:
+        if held > threshold:
+            print("  HELD %.1f ms by %d at %s (%s)" % (1000 * held, pid, site,
+                  time.strftime("%H:%M:%S", time.localtime(acquired))))
+    return count
+
+
+def main():
+    # only the monitor needs these
+    import glob
+    import argparse
+
+    parser = argparse.ArgumentParser(description = "Show the contention on the traced Dexter mutexes (see DEXTER_MUTEX_TRACE).")
+    parser.add_argument("locks", nargs = "*", help = "the locks to show, e.g. DexterLockI2C (default all)")
+    parser.add_argument("--interval", type = float, default = 1, help = "seconds between reports")
+    parser.add_argument("--threshold", type = float, default = 50, help = "flag holds longer than this many ms")
+    parser.add_argument("--top", type = int, default = 5, help = "how many of the top holders to show")
+    parser.add_argument("--once", action = "store_true", help = "report once (on the whole ring) and exit")
+    args = parser.parse_args()
+
+    traces = {}
+    counts = {}
+    while True:
+        for filename in sorted(glob.glob(os.path.join(TRACE_DIR, TRACE_PREFIX + "*"))):
+            name = os.path.basename(filename)[len(TRACE_PREFIX):]
+            if name in traces or (args.locks and name not in args.locks):
+                continue
+            try:
+                traces[name] = LockTrace(filename)
+            except (IOError, OSError, ValueError):
+                continue
+            counts[name] = 0 if args.once else traces[name].read()[0]
+
+        if not traces:
+            print("No traced locks in %s. Set DEXTER_MUTEX_TRACE=1 for the programs to trace." % TRACE_DIR)
+        print(time.strftime("%H:%M:%S"))
+        for name in sorted(traces):
+            counts[name] = report(name, traces[name], counts[name], None if args.once else args.interval,
+                                  args.threshold / 1000, args.top)
+        if args.once:
+            return
+        print()
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
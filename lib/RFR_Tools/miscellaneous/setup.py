@@ -22,6 +22,6 @@ setuptools.setup(
 	description="Dexter Industries Robot Autodetection and I2C Mutex Security",
 	author="Dexter Industries",
 	url="http://www.dexterindustries.com/GoPiGo/",
-	py_modules=['auto_detect_robot', 'auto_detect_rpi', 'I2C_mutex', 'di_i2c', 'di_mutex'],
+	py_modules=['auto_detect_robot', 'auto_detect_rpi', 'I2C_mutex', 'di_i2c', 'di_mutex', 'file_lock', 'mutex_trace'],
 	install_requires=['pyserial', 'python-periphery'],
 )
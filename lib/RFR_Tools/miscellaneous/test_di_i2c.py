@@ -0,0 +1,373 @@
+#!/usr/bin/env python
+#
+# https://www.dexterindustries.com
+#
+# Copyright (c) 2020 Dexter Industries
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information see https://github.com/DexterInd/DI_Sensors/blob/master/LICENSE.md
+#
+# Tests for DI_I2C: choosing the backend, and transfer_many with the periphery backend in each transfer mode
+#
+# The tests put fake backend modules in sys.modules, so they don't need an I2C bus. A module set to None in
+# sys.modules can't be imported, like a backend that isn't installed. The fake periphery I2C bus records the
+# messages of each I2C_RDWR ioctl, and answers reads with the bytes 1, 2, 3, ... (or the bytes in its reply).
+
+from __future__ import print_function
+from __future__ import division
+
+import os
+import sys
+import array
+import types
+import ctypes
+import subprocess
+
+import di_i2c
+import dexter_i2c
+
+ADDRESS = 0x21
+
+
+class FakeI2C(object):
+    """ A periphery I2C bus """
+
+    funcs = 0 # the adapter's I2C_FUNC_* bits
+    buses = []
+
+    class Message(object):
+        def __init__(self, data, read = False, flags = 0):
+            self.data = data
+            self.read = read
+            self.flags = flags
+
+    def __init__(self, devpath):
+        self.devpath = devpath
+        self.fd = 3
+        self.ioctls = [] # [(address, [(data, read, flags), ...]), ...]
+        self.reply = None # the bytes to answer reads with, instead of 1, 2, 3, ...
+        self.closed = False
+        FakeI2C.buses.append(self)
+
+    def transfer(self, address, messages):
+        for msg in messages:
+            if msg.read:
+                if self.reply is None:
+                    msg.data[:] = bytearray(range(1, len(msg.data) + 1))
+                else:
+                    msg.data[:] = self.reply[:len(msg.data)]
+        self.ioctls.append((address, [(bytes(msg.data), msg.read, msg.flags) for msg in messages]))
+
+    def close(self):
+        self.closed = True
+
+
+class FakeDevice(object):
+    """ An smbus or pigpio bus. Every method does nothing and returns 1. """
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: 1
+
+
+def fake_module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    return module
+
+
+def fake_backends(*missing):
+    """ Fake modules for all the backends, with the ones in missing not installed """
+
+    periphery = fake_module("periphery", I2C = FakeI2C)
+    gpio = fake_module("RPi.GPIO", BCM = 11, IN = 1, setmode = lambda mode: None, setup = lambda pin, mode: None)
+    modules = {"periphery" : periphery,
+               "smbus" : fake_module("smbus", SMBus = lambda bus: FakeDevice()),
+               "pigpio" : fake_module("pigpio", pi = FakeDevice),
+               "wiringpi" : fake_module("wiringpi", wiringPiSetupGpio = lambda: None),
+               "RPi" : fake_module("RPi", GPIO = gpio),
+               "RPi.GPIO" : gpio}
+    for name in missing:
+        modules[name] = None
+    return modules
+
+
+def install_modules(modules):
+    """ Put modules in sys.modules. Returns what to pass to restore_modules. """
+
+    saved = dict((name, sys.modules.get(name, False)) for name in modules)
+    sys.modules.update(modules)
+    return saved
+
+
+def restore_modules(saved):
+    for name, module in saved.items():
+        if module is False:
+            del sys.modules[name]
+        else:
+            sys.modules[name] = module
+    # the software busses keep the GPIO module they imported
+    di_i2c.wiringpi = None
+    di_i2c.GPIO = None
+
+
+def open_fake(transfer_mode, funcs = 0):
+    """ Open a DI_I2C on a fake periphery bus. Returns the DI_I2C and the bus. """
+
+    saved = install_modules({"periphery" : fake_module("periphery", I2C = FakeI2C)}), di_i2c.i2c_funcs
+    di_i2c.i2c_funcs = lambda fd: funcs
+    try:
+        FakeI2C.buses = []
+        i2c = di_i2c.DI_I2C("RPI_1", ADDRESS, backend = "periphery", transfer_mode = transfer_mode)
+        return i2c, FakeI2C.buses[0]
+    finally:
+        restore_modules(saved[0])
+        di_i2c.i2c_funcs = saved[1]
+
+
+def backend(bus, *missing, **kwargs):
+    """ The backend a DI_I2C (or the class in kwargs["cls"]) chooses for a bus, with the backends in missing not
+        installed. The other kwargs are passed to it. """
+
+    cls = kwargs.pop("cls", di_i2c.DI_I2C)
+    saved = install_modules(fake_backends(*missing))
+    try:
+        return cls(bus, ADDRESS, **kwargs).backend
+    finally:
+        restore_modules(saved)
+
+
+def default_backends(env):
+    """ RPI_1_Module and RPI_1SW_Module, when di_i2c is imported with the environment variables in env """
+
+    script = "import di_i2c; print('%s %s' % (di_i2c.RPI_1_Module, di_i2c.RPI_1SW_Module))"
+    return subprocess.check_output([sys.executable, "-c", script], env = env,
+                                   cwd = os.path.dirname(os.path.abspath(__file__))).split()
+
+
+def test_select_backend():
+    saved = install_modules(fake_backends())
+    try:
+        # "auto" chooses the first one that's installed
+        assert(di_i2c.select_backend(di_i2c.RPI_1_BACKENDS)[0] == "periphery")
+        name, module = di_i2c.select_backend(di_i2c.RPI_1_BACKENDS, "pigpio")
+        assert(name == "pigpio" and module is sys.modules["pigpio"])
+        try:
+            di_i2c.select_backend(di_i2c.RPI_1_BACKENDS, "wiringpi")
+            assert(False)
+        except IOError as e:
+            assert("not supported" in str(e))
+    finally:
+        restore_modules(saved)
+
+    saved = install_modules(fake_backends("periphery", "smbus", "pigpio"))
+    try:
+        try:
+            di_i2c.select_backend(di_i2c.RPI_1_BACKENDS)
+            assert(False)
+        except IOError as e:
+            assert("No I2C backend installed" in str(e))
+    finally:
+        restore_modules(saved)
+
+
+def test_backend_order():
+    # the hardware bus prefers periphery, then smbus, then pigpio
+    assert(backend("RPI_1") == "periphery")
+    assert(backend("RPI_1", "periphery") == "smbus")
+    assert(backend("RPI_1", "periphery", "smbus") == "pigpio")
+    assert(backend("RPI_1", backend = "smbus") == "smbus")
+    assert(backend("RPI_1", backend = "auto") == "periphery")
+    # DI_I2C prefers wiringpi for the software bus, and Dexter_I2C prefers RPi.GPIO
+    assert(backend("RPI_1SW") == "wiringpi")
+    assert(backend("RPI_1SW", "wiringpi") == "RPi.GPIO")
+    assert(backend("RPI_1SW", cls = dexter_i2c.Dexter_I2C) == "RPi.GPIO")
+    assert(backend("RPI_1SW", "RPi.GPIO", cls = dexter_i2c.Dexter_I2C) == "wiringpi")
+    try:
+        backend("RPI_1", "periphery", "smbus", "pigpio")
+        assert(False)
+    except IOError as e:
+        assert("No I2C backend installed" in str(e))
+
+
+def test_default_backend():
+    # the default backends (from DI_I2C_BACKEND and DI_I2C_SW_BACKEND) are used when no backend is passed
+    saved = di_i2c.RPI_1_Module, di_i2c.RPI_1SW_Module
+    di_i2c.RPI_1_Module, di_i2c.RPI_1SW_Module = "pigpio", "RPi.GPIO"
+    try:
+        assert(backend("RPI_1") == "pigpio")
+        assert(backend("RPI_1", backend = "smbus") == "smbus")
+        assert(backend("RPI_1SW") == "RPi.GPIO")
+        di_i2c.RPI_1_Module = "wiringpi"
+        try:
+            backend("RPI_1")
+            assert(False)
+        except IOError as e:
+            assert("not supported" in str(e))
+    finally:
+        di_i2c.RPI_1_Module, di_i2c.RPI_1SW_Module = saved
+
+    # the environment variables are read when di_i2c is imported
+    env = dict(os.environ, DI_I2C_BACKEND = "smbus", DI_I2C_SW_BACKEND = "RPi.GPIO")
+    assert(default_backends(env) == [b"smbus", b"RPi.GPIO"])
+    del env["DI_I2C_BACKEND"], env["DI_I2C_SW_BACKEND"]
+    assert(default_backends(env) == [b"auto", b"auto"])
+
+
+# a register write, a register read, and a read without a write
+SEGMENTS = [([0x10, 0xAB], 0), ([0x20], 2), ([], 1)]
+RESULT = [None, [1, 2], [1]]
+
+
+def test_separate():
+    i2c, bus = open_fake(di_i2c.TRANSFER_SEPARATE)
+    assert(i2c.transfer_many(SEGMENTS) == RESULT)
+    # one ioctl for each message
+    assert(bus.ioctls == [(ADDRESS, [(b"\x10\xab", False, 0)]),
+                          (ADDRESS, [(b"\x20", False, 0)]),
+                          (ADDRESS, [(b"\x01\x02", True, 0)]),
+                          (ADDRESS, [(b"\x01", True, 0)])])
+
+
+def test_combined():
+    i2c, bus = open_fake(di_i2c.TRANSFER_COMBINED)
+    assert(i2c.transfer_many(SEGMENTS) == RESULT)
+    # all the messages in one ioctl, with repeated starts
+    assert(bus.ioctls == [(ADDRESS, [(b"\x10\xab", False, 0), (b"\x20", False, 0),
+                                     (b"\x01\x02", True, 0), (b"\x01", True, 0)])])
+
+
+def test_stop_start():
+    i2c, bus = open_fake(di_i2c.TRANSFER_STOP_START, funcs = di_i2c.I2C_FUNC_PROTOCOL_MANGLING)
+    assert(i2c.transfer_many(SEGMENTS) == RESULT)
+    # all the messages in one ioctl, with a stop after each
+    stop = di_i2c.I2C_M_STOP
+    assert(bus.ioctls == [(ADDRESS, [(b"\x10\xab", False, stop), (b"\x20", False, stop),
+                                     (b"\x01\x02", True, stop), (b"\x01", True, stop)])])
+
+
+def test_stop_start_not_supported():
+    # adapters without protocol mangling (like the RPi's) ignore I2C_M_STOP, so the mode is rejected
+    try:
+        open_fake(di_i2c.TRANSFER_STOP_START, funcs = 0)
+        assert(False)
+    except IOError as e:
+        assert("I2C_FUNC_PROTOCOL_MANGLING" in str(e))
+    assert(FakeI2C.buses[0].closed)
+    # the other modes don't need it
+    open_fake(di_i2c.TRANSFER_SEPARATE, funcs = 0)
+    open_fake(di_i2c.TRANSFER_COMBINED, funcs = 0)
+
+
+def test_bytes():
+    i2c, bus = open_fake(di_i2c.TRANSFER_COMBINED)
+    # reads return a bytearray when the bytes written aren't a list
+    assert(i2c.transfer_many([(bytearray([0x20]), 3), (b"\x30", 0)]) == [bytearray([1, 2, 3]), None])
+    assert(i2c.transfer([0x20], 2) == [1, 2])
+    assert(len(bus.ioctls) == 2)
+
+
+
+def written(bus):
+    # the bytes written by the last transfer
+    return bytearray(bus.ioctls[-1][1][0][0])
+
+
+def test_readinto():
+    i2c, bus = open_fake(di_i2c.TRANSFER_COMBINED)
+    bus.reply = bytearray([0x12, 0x34, 0x56, 0x78])
+
+    buf = bytearray(3)
+    assert(i2c.readinto(buf, 0x20) == 3)
+    assert(buf == bytearray([0x12, 0x34, 0x56]))
+    assert(bus.ioctls[-1][1] == [(b"\x20", False, 0), (b"\x12\x34\x56", True, 0)])
+
+    # a slice of a memoryview, without writing a register
+    buf = bytearray(6)
+    assert(i2c.readinto(memoryview(buf)[2:5]) == 3)
+    assert(buf == bytearray([0, 0, 0x12, 0x34, 0x56, 0]))
+    assert(bus.ioctls[-1][1] == [(b"\x12\x34\x56", True, 0)])
+
+    # buffers of items other than bytes are filled byte by byte, on Python 3
+    if hasattr(memoryview, "cast"):
+        values = array.array("H", [0, 0])
+        assert(i2c.readinto(values, 0x20) == 4)
+        assert(bytearray(values.tobytes()) == bus.reply)
+    else:
+        try:
+            i2c.readinto((ctypes.c_uint16 * 2)(), 0x20)
+            assert(False)
+        except TypeError as e:
+            assert("Python 2" in str(e))
+
+
+def test_read_values():
+    i2c, bus = open_fake(di_i2c.TRANSFER_COMBINED)
+    bus.reply = bytearray([0xFE, 0xDC, 0xBA, 0x98])
+
+    # the object is big endian unless told otherwise
+    assert(i2c.read_16(0x20) == 0xFEDC)
+    assert(written(bus) == bytearray([0x20]))
+    assert(i2c.read_16(0x20, signed = True) == 0xFEDC - 0x10000)
+    assert(i2c.read_16(0x20, big_endian = False) == 0xDCFE)
+    assert(i2c.read_16(0x20, signed = True, big_endian = False) == 0xDCFE - 0x10000)
+    assert(i2c.read_32(0x20) == 0xFEDCBA98)
+    assert(i2c.read_32(0x20, signed = True) == 0xFEDCBA98 - 0x100000000)
+    assert(i2c.read_32(0x20, big_endian = False) == 0x98BADCFE)
+    assert(i2c.read_32(0x20, signed = True, big_endian = False) == 0x98BADCFE - 0x100000000)
+
+    # positive values are the same signed or not
+    bus.reply = bytearray([0x12, 0x34, 0x56, 0x78])
+    assert(i2c.read_16(signed = True) == i2c.read_16() == 0x1234)
+    assert(i2c.read_32(signed = True) == i2c.read_32() == 0x12345678)
+
+    i2c.big_endian = False
+    assert(i2c.read_16() == 0x3412)
+    assert(i2c.read_32() == 0x78563412)
+    assert(i2c.read_32(big_endian = True) == 0x12345678)
+
+
+def test_write_values():
+    i2c, bus = open_fake(di_i2c.TRANSFER_COMBINED)
+
+    i2c.write_reg_16(0x10, 0x1234)
+    assert(written(bus) == bytearray([0x10, 0x12, 0x34]))
+    i2c.write_reg_16(0x10, 0x1234, big_endian = False)
+    assert(written(bus) == bytearray([0x10, 0x34, 0x12]))
+    # negative values are written as two's complement, and values too big are cut to 16 bits
+    i2c.write_reg_16(0x10, -2)
+    assert(written(bus) == bytearray([0x10, 0xFF, 0xFE]))
+    i2c.write_reg_16(0x110, 0x12345)
+    assert(written(bus) == bytearray([0x10, 0x23, 0x45]))
+
+    i2c.write_reg_32(0x10, 0x12345678)
+    assert(written(bus) == bytearray([0x10, 0x12, 0x34, 0x56, 0x78]))
+    i2c.write_reg_32(0x10, 0x12345678, big_endian = False)
+    assert(written(bus) == bytearray([0x10, 0x78, 0x56, 0x34, 0x12]))
+    i2c.write_reg_32(0x10, -2)
+    assert(written(bus) == bytearray([0x10, 0xFF, 0xFF, 0xFF, 0xFE]))
+    i2c.write_reg_32(0x10, 0x123456789)
+    assert(written(bus) == bytearray([0x10, 0x23, 0x45, 0x67, 0x89]))
+    i2c.write_reg_16(0x10, 2.9) # values are truncated to integers
+    assert(written(bus) == bytearray([0x10, 0x00, 0x02]))
+
+    # list values outside 0-255 are cut to 8 bits
+    i2c.transfer([0x10, 256, -1, 0x1FF])
+    assert(written(bus) == bytearray([0x10, 0x00, 0xFF, 0xFF]))
+    i2c.write_reg_list(0x10, [300, -3])
+    assert(written(bus) == bytearray([0x10, 0x2C, 0xFD]))
+    i2c.write_reg_8(0x10, -1)
+    assert(written(bus) == bytearray([0x10, 0xFF]))
+
+
+if __name__ == '__main__':
+    test_select_backend()
+    test_backend_order()
+    test_default_backend()
+    test_separate()
+    test_combined()
+    test_stop_start()
+    test_stop_start_not_supported()
+    test_bytes()
+    test_readinto()
+    test_read_values()
+    test_write_values()
+    print("All tests passed")
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+#
+# https://www.dexterindustries.com
+#
+# Copyright (c) 2020 Dexter Industries
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information see https://github.com/DexterInd/DI_Sensors/blob/master/LICENSE.md
+#
+# Tests for the DI_I2C BrickPi3 busses ("BP3_1" to "BP3_4"), against an emulated BrickPi3 (see
+# brickpi3_emulator.py in the BrickPi3 repository), which simulates the time the SPI transfers and sleeps take.
+#
+# The BrickPi3 sensor port transfers themselves (BrickPi3.i2c_transfer) are recorded by the tests instead of
+# being sent to the emulator.
+
+from __future__ import print_function
+from __future__ import division
+
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(HERE, "..", "..", "..", "BrickPi3", "Software", "Python"))
+
+import brickpi3_emulator
+
+# brickpi3 imports spidev, so install the emulator before importing it. Each test installs its own.
+brickpi3_emulator.install().clock.uninstall()
+import brickpi3
+import di_i2c
+
+
+class Recorder(object):
+    """ Records the BrickPi3's set_sensor_type calls (passing them on) and i2c_transfer calls """
+
+    def __init__(self, bp3):
+        self.bp3 = bp3
+        self.set_sensor_type = bp3.set_sensor_type
+        self.configured = [] # (port, type, settings) for each set_sensor_type
+        self.transfers = []  # (time, port) for each i2c_transfer
+        bp3.set_sensor_type = self.record_set_sensor_type
+        bp3.i2c_transfer = self.record_i2c_transfer
+
+    def record_set_sensor_type(self, port, type, params = 0):
+        self.configured.append((port, type, list(params) if isinstance(params, (list, tuple)) else params))
+        self.set_sensor_type(port, type, params)
+
+    def record_i2c_transfer(self, port, address, outArr, inBytes):
+        self.transfers.append((time.time(), port))
+        return [0] * inBytes
+
+
+def emulated():
+    """ Install a new emulated BrickPi3 and forget the BrickPi3 and ports of the last test. Returns the firmware and
+        a Recorder for the process's BrickPi3. Uninstall the firmware's clock when done. """
+
+    firmware = brickpi3_emulator.install(brickpi3_emulator.BrickPi3Firmware())
+    di_i2c._brickpi3s.clear()
+    di_i2c._brickpi3_ports.clear()
+    return firmware, Recorder(di_i2c.get_brickpi3())
+
+
+def test_shared_port():
+    firmware, bp3 = emulated()
+    try:
+        # the drivers share the BrickPi3, and the port is only set to I2C by the first one
+        first = di_i2c.DI_I2C("BP3_1", 0x10)
+        second = di_i2c.DI_I2C("BP3_1", 0x20)
+        assert(first.bp3 is second.bp3 is bp3.bp3 is di_i2c.get_brickpi3())
+        assert(bp3.configured == [(bp3.bp3.PORT_1, bp3.bp3.SENSOR_TYPE.I2C, [0, 0])])
+        assert(first.ready_time == second.ready_time)
+
+        # another port is set up on its own
+        di_i2c.DI_I2C("BP3_2", 0x10)
+        assert(len(bp3.configured) == 2 and bp3.configured[1][0] == bp3.bp3.PORT_2)
+    finally:
+        firmware.clock.uninstall()
+
+
+def test_reconfigure():
+    firmware, bp3 = emulated()
+    try:
+        PORT_1 = bp3.bp3.PORT_1
+        driver = di_i2c.DI_I2C("BP3_1", 0x10)
+        assert(len(bp3.configured) == 1)
+
+        # different settings
+        di_i2c.configure_brickpi3_port(bp3.bp3, PORT_1, [bp3.bp3.SENSOR_I2C_SETTINGS.MID_CLOCK, 0])
+        assert(len(bp3.configured) == 2)
+        di_i2c.configure_brickpi3_port(bp3.bp3, PORT_1, (bp3.bp3.SENSOR_I2C_SETTINGS.MID_CLOCK, 0))
+        assert(len(bp3.configured) == 2)
+        di_i2c.configure_brickpi3_port(bp3.bp3, PORT_1)
+        assert(len(bp3.configured) == 3)
+
+        # the port was set to another sensor type
+        bp3.bp3.set_sensor_type(PORT_1, bp3.bp3.SENSOR_TYPE.TOUCH)
+        di_i2c.DI_I2C("BP3_1", 0x20)
+        assert(len(bp3.configured) == 5 and bp3.configured[-1][1] == bp3.bp3.SENSOR_TYPE.I2C)
+
+        # reconfig_bus always sets the port
+        driver.reconfig_bus()
+        assert(len(bp3.configured) == 6)
+        assert(driver.ready_time > time.time())
+    finally:
+        firmware.clock.uninstall()
+
+
+def test_ready_wait():
+    firmware, bp3 = emulated()
+    try:
+        start = time.time()
+        first = di_i2c.DI_I2C("BP3_1", 0x10)
+        second = di_i2c.DI_I2C("BP3_2", 0x10)
+        # opening the drivers doesn't wait for the ports to be ready
+        assert(time.time() - start < di_i2c.BRICKPI3_I2C_SETUP_TIME)
+        ready = first.ready_time
+
+        # the first transfer waits until the port is ready
+        first.read_8(0x00)
+        assert(bp3.transfers[-1][0] >= ready)
+        assert(first.ready_time is None)
+        # by then the other port is ready too, so its first transfer doesn't wait
+        now = time.time()
+        second.read_8(0x00)
+        assert(bp3.transfers[-1][0] - now < 0.001)
+
+        # a driver on a port that's already ready doesn't wait either
+        time.sleep(1)
+        third = di_i2c.DI_I2C("BP3_1", 0x20)
+        now = time.time()
+        third.read_8(0x00)
+        assert(bp3.transfers[-1][0] - now < 0.001)
+    finally:
+        firmware.clock.uninstall()
+
+
+if __name__ == '__main__':
+    test_shared_port()
+    test_reconfigure()
+    test_ready_wait()
+    print("All tests passed")
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+#
+# https://www.dexterindustries.com
+#
+# Copyright (c) 2020 Dexter Industries
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information see https://github.com/DexterInd/DI_Sensors/blob/master/LICENSE.md
+#
+# Tests for the Dexter bus mutexes (di_mutex.py, dexter_mutex.py and I2C_mutex.py, all using file_lock.py)
+#
+# The mutexes lock files in /run/lock, named after the test and the process ID so the tests don't get in the
+# way of a robot using the bus, and the files are removed at the end of each test.
+
+from __future__ import print_function
+from __future__ import division
+
+import os
+import sys
+import time
+import threading
+import subprocess
+
+import file_lock
+import di_mutex
+import dexter_mutex
+import I2C_mutex
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# run in another process: acquire the mutex, say so, and hold it until stdin is closed
+HOLDER = """
+import sys
+import di_mutex
+mutex = di_mutex.DI_Mutex(sys.argv[1])
+mutex.acquire()
+print("acquired")
+sys.stdout.flush()
+sys.stdin.read()
+mutex.release()
+"""
+
+
+def mutex_name(test):
+    return "test_%s_%d" % (test, os.getpid())
+
+
+def remove_lock_file(mutex):
+    try:
+        os.remove(mutex.Filename)
+    except OSError:
+        pass
+
+
+def in_thread(function):
+    """ Run function in another thread and return its result """
+
+    result = []
+    thread = threading.Thread(target = lambda: result.append(function()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def start_holder(name):
+    """ Start a process holding the DI_Mutex name. Close its stdin to make it release the mutex and exit. """
+
+    holder = subprocess.Popen([sys.executable, "-c", HOLDER, name], cwd = HERE,
+                              stdin = subprocess.PIPE, stdout = subprocess.PIPE)
+    assert(holder.stdout.readline().strip() == b"acquired")
+    return holder
+
+
+def stop_holder(holder):
+    holder.stdin.close()
+    holder.wait()
+    holder.stdout.close()
+    assert(holder.returncode == 0)
+
+
+def test_interning():
+    name = mutex_name("interning")
+    mutex = di_mutex.DI_Mutex(name)
+    try:
+        assert(di_mutex.DI_Mutex(name) is mutex)
+        assert(di_mutex.DI_Mutex(name + "_other") is not mutex)
+        # the two mutex classes keep their own instances and lock files
+        assert(dexter_mutex.Dexter_Mutex(name) is not mutex)
+        assert(dexter_mutex.Dexter_Mutex(name) is dexter_mutex.Dexter_Mutex(name))
+        assert(dexter_mutex.Dexter_Mutex(name).Filename != mutex.Filename)
+        assert(mutex.Filename == "/run/lock/DI_Mutex_" + name)
+        # a different loop_time can't be given to a mutex that already exists
+        assert(di_mutex.DI_Mutex(name, loop_time = mutex.LoopTime) is mutex)
+        try:
+            di_mutex.DI_Mutex(name, loop_time = 0.5)
+            assert(False)
+        except ValueError:
+            pass
+        assert(mutex.LoopTime == file_lock.NamedFileLock.DefaultLoopTime)
+    finally:
+        remove_lock_file(mutex)
+        remove_lock_file(di_mutex.DI_Mutex(name + "_other"))
+        remove_lock_file(dexter_mutex.Dexter_Mutex(name))
+
+
+def test_reentrant():
+    mutex = di_mutex.DI_Mutex(mutex_name("reentrant"))
+    try:
+        assert(mutex.acquire(timeout = 1))
+        # the thread holding the mutex can take it again, it doesn't deadlock
+        assert(mutex.acquire(timeout = 1))
+        assert(mutex.Depth == 2)
+        assert(mutex.release())
+        # still held after the inner release
+        assert(mutex.held())
+        assert(not in_thread(lambda: mutex.acquire(timeout = 0.05)))
+        assert(mutex.release())
+        assert(not mutex.held())
+        # releasing a mutex that isn't held does nothing
+        assert(not mutex.release())
+        assert(in_thread(lambda: mutex.acquire(timeout = 1) and mutex.release()))
+    finally:
+        remove_lock_file(mutex)
+
+
+def test_timeout_thread():
+    mutex = di_mutex.DI_Mutex(mutex_name("timeout_thread"))
+    try:
+        assert(mutex.acquire())
+        start = time.time()
+        assert(not in_thread(lambda: mutex.acquire(timeout = 0.1)))
+        assert(time.time() - start >= 0.1)
+        # another thread can't release it
+        assert(not in_thread(mutex.release))
+        assert(mutex.held())
+        mutex.release()
+    finally:
+        remove_lock_file(mutex)
+
+
+def test_timeout_process():
+    name = mutex_name("timeout_process")
+    mutex = di_mutex.DI_Mutex(name)
+    try:
+        holder = start_holder(name)
+        start = time.time()
+        assert(not mutex.acquire(timeout = 0.1))
+        assert(time.time() - start >= 0.1)
+        assert(not mutex.held())
+        stop_holder(holder)
+        assert(mutex.acquire(timeout = 1))
+        mutex.release()
+    finally:
+        remove_lock_file(mutex)
+
+
+def test_exclusion_between_processes():
+    name = mutex_name("exclusion")
+    mutex = di_mutex.DI_Mutex(name)
+    try:
+        holder = start_holder(name)
+        released = []
+
+        def stop():
+            time.sleep(0.2)
+            released.append(time.time())
+            stop_holder(holder)
+
+        stopper = threading.Thread(target = stop)
+        stopper.start()
+        # blocks until the other process releases the mutex
+        assert(mutex.acquire())
+        acquired = time.time()
+        stopper.join()
+        assert(released and acquired >= released[0])
+        mutex.release()
+    finally:
+        remove_lock_file(mutex)
+
+
+def test_i2c_mutex():
+    a = I2C_mutex.Mutex()
+    b = I2C_mutex.Mutex()
+    assert(a.acquire(timeout = 1))
+    # all the I2C Mutex objects share one lock, which the thread holding it can take again
+    assert(b.acquire(timeout = 1))
+    assert(not in_thread(lambda: I2C_mutex.Mutex().acquire(timeout = 0.05)))
+    b.release()
+    # releasing a Mutex that doesn't hold the lock does nothing
+    b.release()
+    assert(not in_thread(lambda: I2C_mutex.Mutex().acquire(timeout = 0.05)))
+    with a:
+        pass
+
+    def acquire_release():
+        mutex = I2C_mutex.Mutex()
+        if not mutex.acquire(timeout = 1):
+            return False
+        mutex.release()
+        return True
+
+    assert(in_thread(acquire_release))
+
+
+if __name__ == '__main__':
+    test_interning()
+    test_reentrant()
+    test_timeout_thread()
+    test_timeout_process()
+    test_exclusion_between_processes()
+    test_i2c_mutex()
+    print("All tests passed")
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+#
+# https://www.dexterindustries.com
+#
+# Copyright (c) 2020 Dexter Industries
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information see https://github.com/DexterInd/DI_Sensors/blob/master/LICENSE.md
+#
+# Tests for mutex_trace.py
+#
+# The traces are written to a temporary folder instead of /dev/shm, and the clock of mutex_trace and file_lock
+# is replaced by one the tests set, so every record's times are known.
+
+from __future__ import print_function
+from __future__ import division
+
+import os
+import sys
+import time
+import shutil
+import struct
+import tempfile
+import subprocess
+
+TRACE_DIR = tempfile.mkdtemp(prefix = "test_mutex_trace.")
+os.environ["DEXTER_MUTEX_TRACE_DIR"] = TRACE_DIR
+
+import mutex_trace
+import file_lock
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+class FakeTime(object):
+    """ Replaces the time module, with a clock that only moves when now is set """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def strftime(self, format, t = None):
+        return time.strftime(format, t)
+
+    def localtime(self, t = None):
+        return time.localtime(t)
+
+
+def traced_lock(name, fake_time):
+    """ A traced FileLock with its lock file and trace in the temporary folder """
+
+    mutex_trace.TRACE_DIR = TRACE_DIR # in case mutex_trace was imported before the environment was set
+    mutex_trace.time = fake_time
+    file_lock.time = fake_time
+    mutex_trace.enable()
+    try:
+        return file_lock.FileLock(os.path.join(TRACE_DIR, name))
+    finally:
+        mutex_trace.disable()
+
+
+def restore_time():
+    mutex_trace.time = time
+    file_lock.time = time
+
+
+def cycle(lock, clock, start, held):
+    # acquire at start (without waiting) and release held seconds later
+    clock.now = start
+    assert(lock.acquire())
+    clock.now = start + held
+    lock.release()
+
+
+def run_report(trace, since, interval, threshold):
+    saved = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        count = mutex_trace.report("lock", trace, since, interval, threshold, 5)
+        return count, sys.stdout.getvalue()
+    finally:
+        sys.stdout = saved
+
+
+def test_records():
+    clock = FakeTime()
+    lock = traced_lock("records", clock)
+    try:
+        trace = lock.Trace
+        assert(trace.Filename == os.path.join(TRACE_DIR, mutex_trace.TRACE_PREFIX + "records"))
+        assert(trace.Slots == mutex_trace.SLOTS)
+
+        # more acquires than the ring holds
+        total = trace.Slots + 10
+        for i in range(total):
+            cycle(lock, clock, 2000 + i, 0.001 * (i % 7))
+
+        count, holder, records = trace.read()
+        assert(count == total)
+        assert(holder is None)
+        # the ring wrapped around: the oldest 10 records were overwritten, and the rest are read oldest first
+        assert(len(records) == trace.Slots)
+        for n, (acquired, waited, held, pid, site) in enumerate(records):
+            i = n + 10
+            assert(acquired == 2000 + i)
+            assert(abs(held - 0.001 * (i % 7)) < 1e-9)
+            assert(waited == 0)
+            assert(pid == os.getpid())
+            # the call site is the first caller outside the library modules
+            assert(site.startswith("test_mutex_trace.py:") and site.endswith(" cycle"))
+
+        # since only gets the records written after it, and never more than the ring holds
+        count, holder, records = trace.read(since = total - 3)
+        assert([record[0] for record in records] == [2000 + total - 3, 2000 + total - 2, 2000 + total - 1])
+        assert(trace.read(since = total)[2] == [])
+        assert(len(trace.read(since = 5)[2]) == trace.Slots)
+
+        # another LockTrace on the same file reads the same records
+        other = mutex_trace.LockTrace(trace.Filename)
+        assert(other.read(since = total - 3) == (count, None, records))
+        other.close()
+    finally:
+        restore_time()
+
+
+def test_holder():
+    clock = FakeTime()
+    lock = traced_lock("holder", clock)
+    try:
+        trace = lock.Trace
+        clock.now = 3000
+        lock.acquire()
+        count, holder, records = trace.read()
+        assert(count == 0 and records == [])
+        pid, acquired, waited, site = holder
+        assert(pid == os.getpid() and acquired == 3000 and waited == 0)
+        assert(site.startswith("test_mutex_trace.py:") and site.endswith(" test_holder"))
+        # the header fields written by hand match the HEADER layout
+        assert(mutex_trace.HEADER.unpack_from(trace.Map)[4:7] == (os.getpid(), 3000, 0))
+
+        # a re-entrant acquire isn't traced again
+        lock.acquire()
+        lock.release()
+        assert(trace.read()[0] == 0)
+
+        clock.now = 3000.25
+        lock.release()
+        count, holder, records = trace.read()
+        assert(count == 1 and holder is None)
+        assert(records[0][:4] == (3000, 0, 0.25, os.getpid()))
+    finally:
+        restore_time()
+
+
+def test_report():
+    clock = FakeTime()
+    lock = traced_lock("report", clock)
+    try:
+        trace = lock.Trace
+        for i in range(4):
+            cycle(lock, clock, 4000 + i, 0.01)
+        cycle(lock, clock, 4010, 0.2)
+
+        # since the last report: 2 acquires in 1 second, 21% held, and the long hold is flagged
+        clock.now = 4011
+        count, text = run_report(trace, 3, 1.0, 0.05)
+        assert(count == 5)
+        assert("2 acquires, 21% held" in text)
+        assert("HELD 200.0 ms by %d" % os.getpid() in text)
+        assert("top holders (last 5 acquires)" in text)
+        assert("held now" not in text)
+
+        # nothing since the last report
+        count, text = run_report(trace, 5, 1.0, 0.05)
+        assert("not used" in text)
+
+        # the current holder, flagged when it's held over the threshold
+        clock.now = 5000
+        lock.acquire()
+        clock.now = 5000.1
+        count, text = run_report(trace, 5, 1.0, 0.05)
+        assert("held now by %d" % os.getpid() in text and "HELD OVER 50 ms" in text)
+        count, text = run_report(trace, 5, 1.0, 0.5)
+        assert("held now by %d" % os.getpid() in text and "HELD OVER" not in text)
+        lock.release()
+
+        # a holder that has exited without releasing the lock
+        exited = subprocess.Popen([sys.executable, "-c", "pass"])
+        exited.wait()
+        struct.pack_into("<i", trace.Map, 20, exited.pid) # the holder PID in the header
+        count, text = run_report(trace, 6, 1.0, 0.05)
+        assert("held now by %d" % exited.pid in text and "process has exited" in text)
+    finally:
+        restore_time()
+
+
+def test_tracer_off():
+    assert(not mutex_trace.enabled())
+    assert(mutex_trace.tracer(os.path.join(TRACE_DIR, "off")) is None)
+    # a file that isn't a trace
+    with open(os.path.join(TRACE_DIR, "not_a_trace"), "wb") as f:
+        f.write(b"\0" * mutex_trace.HEADER_SIZE)
+    try:
+        mutex_trace.LockTrace(os.path.join(TRACE_DIR, "not_a_trace"))
+        assert(False)
+    except ValueError:
+        pass
+
+
+def teardown_module(module):
+    shutil.rmtree(TRACE_DIR, ignore_errors = True)
+
+
+if __name__ == '__main__':
+    try:
+        test_records()
+        test_holder()
+        test_report()
+        test_tracer_off()
+    finally:
+        teardown_module(None)
+    print("All tests passed")
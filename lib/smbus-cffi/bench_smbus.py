@@ -0,0 +1,89 @@
+"""Compare the calls per second of SMBus and FastSMBus.
+
+With a device on a bus, e.g. an EEPROM at address 0x50 on /dev/i2c-1:
+
+    python bench_smbus.py --bus 1 --addr 0x50
+
+Without one (--loopback), the C functions and the I2C_SLAVE ioctl are
+replaced by Python functions that return at once, so only the time spent
+in the bindings is measured.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import time
+
+import smbus
+from smbus import smbus as smbus_module
+
+CALLS = [
+    ("read_byte_data", lambda bus, addr: bus.read_byte_data(addr, 0)),
+    ("write_byte_data", lambda bus, addr: bus.write_byte_data(addr, 0, 0)),
+    ("read_word_data", lambda bus, addr: bus.read_word_data(addr, 0)),
+    ("read_i2c_block_data", lambda bus, addr: bus.read_i2c_block_data(addr, 0, 16)),
+    ("write_i2c_block_data", lambda bus, addr: bus.write_i2c_block_data(addr, 0, [0] * 16)),
+]
+
+
+class Loopback(object):
+    """Stands in for the cffi lib, without a device"""
+
+    def __init__(self, lib):
+        self._lib = lib
+
+    def __getattr__(self, name):
+        if name.startswith("i2c_smbus_"):
+            return self._call
+        return getattr(self._lib, name)
+
+    def _call(self, *args):
+        return 0
+
+
+def calls_per_second(fn, bus, addr, seconds):
+    fn(bus, addr)
+    n = 0
+    start = time.time()
+    end = start + seconds
+    while True:
+        for i in range(100):
+            fn(bus, addr)
+        n += 100
+        now = time.time()
+        if now >= end:
+            return n / (now - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the calls per second of SMBus and FastSMBus.")
+    parser.add_argument("--bus", type=int, default=1, help="the I2C bus number")
+    parser.add_argument("--addr", type=lambda s: int(s, 0), default=0x50, help="the device address")
+    parser.add_argument("--seconds", type=float, default=1, help="how long to run each call")
+    parser.add_argument("--loopback", action="store_true", help="measure the bindings only, without a device")
+    args = parser.parse_args()
+
+    if args.loopback:
+        smbus_module.SMBUS = Loopback(smbus_module.SMBUS)
+        smbus_module.ioctl = lambda fd, request, arg: 0
+    busses = []
+    for cls in (smbus.SMBus, smbus.FastSMBus):
+        bus = cls()
+        if args.loopback:
+            bus._fd = os.open(os.devnull, os.O_RDWR)
+        else:
+            bus.open(args.bus)
+        busses.append(bus)
+
+    print("%-22s %12s %12s %8s" % ("calls/s", "SMBus", "FastSMBus", "speedup"))
+    for name, fn in CALLS:
+        slow, fast = [calls_per_second(fn, bus, args.addr, args.seconds) for bus in busses]
+        print("%-22s %12.0f %12.0f %7.1fx" % (name, slow, fast, fast / slow))
+
+    for bus in busses:
+        bus.close()
+
+
+if __name__ == '__main__':
+    main()
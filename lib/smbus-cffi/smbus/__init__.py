@@ -1,4 +1,8 @@
 from .smbus import ffi
 from .smbus import SMBus
+from .smbus import FastSMBus
+from .smbus import I2CMsg
 from .smbus import list_to_smbus_data
 from .smbus import smbus_data_to_list
+from .smbus import bytes_to_smbus_data
+from .smbus import smbus_data_to_bytes
@@ -37,6 +37,9 @@ from ._smbus_cffi import lib as SMBUS
 
 MAXPATH = 16
 
+# the most bytes i2c-dev accepts in one segment of an I2C_RDWR ioctl
+I2C_RDWR_MAX_MSG_LEN = 8192
+
 
 class SMBus(object):
     """SMBus([bus]) -> SMBus
@@ -274,6 +277,43 @@ class SMBus(object):
                                   data):
             raise IOError(ffi.errno)
 
+    def i2c_rdwr(self, *msgs):
+        """i2c_rdwr(msg, ...)
+
+        Perform a combined I2C transaction of several I2CMsg segments, with
+        a repeated start between them and one stop at the end, in a single
+        I2C_RDWR ioctl. Write segments are sent from their buffers without
+        copying, and read segments are read into their buffers.
+
+        The kernel takes at most I2C_RDRW_IOCTL_MAX_MSGS (42) segments of
+        at most I2C_RDWR_MAX_MSG_LEN (8192) bytes each, so read a larger
+        block (e.g. a whole EEPROM) with several calls.
+        """
+        nmsgs = len(msgs)
+        if nmsgs > SMBUS.I2C_RDRW_IOCTL_MAX_MSGS or nmsgs == 0:
+            raise OverflowError("Expected at least one, but not more than %d "
+                                "messages" % SMBUS.I2C_RDRW_IOCTL_MAX_MSGS)
+        c_msgs = ffi.new("struct i2c_msg[]", nmsgs)
+        bufs = []  # keeps the buffers' cdata alive until the ioctl is done
+        for c_msg, msg in zip(c_msgs, msgs):
+            if msg.flags & SMBUS.I2C_M_RD and memoryview(msg.buf).readonly:
+                raise TypeError("Expected a writable buffer to read into")
+            buf = ffi.from_buffer(msg.buf)
+            if len(buf) > I2C_RDWR_MAX_MSG_LEN:
+                raise OverflowError("Expected segments of at most %d bytes, "
+                                    "not %d" % (I2C_RDWR_MAX_MSG_LEN,
+                                                len(buf)))
+            bufs.append(buf)
+            c_msg.addr = msg.addr
+            c_msg.flags = msg.flags
+            c_msg.len = len(buf)
+            c_msg.buf = buf
+        data = ffi.new("struct i2c_rdwr_ioctl_data *")
+        data.msgs = c_msgs
+        data.nmsgs = nmsgs
+        if SMBUS.i2c_rdwr_access(self._fd, data) < 0:
+            raise IOError(ffi.errno)
+
     @property
     def pec(self):
         return self._pec
@@ -288,6 +328,224 @@ class SMBus(object):
             self._pec = pec
 
 
+# read_write arguments of i2c_smbus_access, which is a char
+_READ = int2byte(SMBUS.I2C_SMBUS_READ)
+_WRITE = int2byte(SMBUS.I2C_SMBUS_WRITE)
+
+
+class FastSMBus(SMBus):
+    """FastSMBus([bus]) -> FastSMBus
+    An SMBus with less overhead per call, for polling devices in a loop.
+
+    The methods take the same arguments as SMBus, but they are not wrapped
+    in validate. The address is checked once when it is bound to the file
+    descriptor (the I2C_SLAVE ioctl, done when it changes), and the other
+    integers are checked by cffi when they are passed to the C functions,
+    so out of range values raise OverflowError instead of being truncated.
+
+    The block methods reuse one i2c_smbus_data union per object, accept
+    bytes, bytearray or a list of integers and return bytes. As the union
+    is shared, an object must not be used by several threads at once.
+    """
+
+    def __init__(self, bus=-1):
+        self._data = ffi.new("union i2c_smbus_data *")
+        SMBus.__init__(self, bus)
+
+    def _set_addr(self, addr):
+        """private helper method"""
+        if self._addr != addr:
+            if not isinstance(addr, int):
+                raise TypeError("Expected integer")
+            ioctl(self._fd, SMBUS.I2C_SLAVE, addr)
+            self._addr = addr
+
+    def write_quick(self, addr):
+        """write_quick(addr)
+
+        Perform SMBus Quick transaction.
+        """
+        self._set_addr(addr)
+        if SMBUS.i2c_smbus_write_quick(self._fd, SMBUS.I2C_SMBUS_WRITE) != 0:
+            raise IOError(ffi.errno)
+
+    def read_byte(self, addr):
+        """read_byte(addr) -> result
+
+        Perform SMBus Read Byte transaction.
+        """
+        self._set_addr(addr)
+        result = SMBUS.i2c_smbus_read_byte(self._fd)
+        if result == -1:
+            raise IOError(ffi.errno)
+        return result
+
+    def write_byte(self, addr, val):
+        """write_byte(addr, val)
+
+        Perform SMBus Write Byte transaction.
+        """
+        self._set_addr(addr)
+        if SMBUS.i2c_smbus_write_byte(self._fd, val) == -1:
+            raise IOError(ffi.errno)
+
+    def read_byte_data(self, addr, cmd):
+        """read_byte_data(addr, cmd) -> result
+
+        Perform SMBus Read Byte Data transaction.
+        """
+        self._set_addr(addr)
+        res = SMBUS.i2c_smbus_read_byte_data(self._fd, cmd)
+        if res == -1:
+            raise IOError(ffi.errno)
+        return res
+
+    def write_byte_data(self, addr, cmd, val):
+        """write_byte_data(addr, cmd, val)
+
+        Perform SMBus Write Byte Data transaction.
+        """
+        self._set_addr(addr)
+        if SMBUS.i2c_smbus_write_byte_data(self._fd, cmd, val) == -1:
+            raise IOError(ffi.errno)
+
+    def read_word_data(self, addr, cmd):
+        """read_word_data(addr, cmd) -> result
+
+        Perform SMBus Read Word Data transaction.
+        """
+        self._set_addr(addr)
+        result = SMBUS.i2c_smbus_read_word_data(self._fd, cmd)
+        if result == -1:
+            raise IOError(ffi.errno)
+        return result
+
+    def write_word_data(self, addr, cmd, val):
+        """write_word_data(addr, cmd, val)
+
+        Perform SMBus Write Word Data transaction.
+        """
+        self._set_addr(addr)
+        if SMBUS.i2c_smbus_write_word_data(self._fd, cmd, val) == -1:
+            raise IOError(ffi.errno)
+
+    def process_call(self, addr, cmd, val):
+        """process_call(addr, cmd, val)
+
+        Perform SMBus Process Call transaction.
+
+        Like SMBus.process_call, only returns the result if _compat is set.
+        """
+        self._set_addr(addr)
+        ret = SMBUS.i2c_smbus_process_call(self._fd, cmd, val)
+        if ret == -1:
+            raise IOError(ffi.errno)
+        if self._compat:
+            return ret
+
+    def read_block_data(self, addr, cmd):
+        """read_block_data(addr, cmd) -> bytes
+
+        Perform SMBus Read Block Data transaction.
+        """
+        self._set_addr(addr)
+        data = self._data
+        if SMBUS.i2c_smbus_access(self._fd, _READ, cmd,
+                                  SMBUS.I2C_SMBUS_BLOCK_DATA, data):
+            raise IOError(ffi.errno)
+        return smbus_data_to_bytes(data)
+
+    def write_block_data(self, addr, cmd, vals):
+        """write_block_data(addr, cmd, vals)
+
+        Perform SMBus Write Block Data transaction.
+        """
+        self._set_addr(addr)
+        data = self._data
+        bytes_to_smbus_data(data, vals)
+        if SMBUS.i2c_smbus_access(self._fd, _WRITE, cmd,
+                                  SMBUS.I2C_SMBUS_BLOCK_DATA, data):
+            raise IOError(ffi.errno)
+
+    def block_process_call(self, addr, cmd, vals):
+        """block_process_call(addr, cmd, vals) -> bytes
+
+        Perform SMBus Block Process Call transaction.
+        """
+        self._set_addr(addr)
+        data = self._data
+        bytes_to_smbus_data(data, vals)
+        if SMBUS.i2c_smbus_access(self._fd, _WRITE, cmd,
+                                  SMBUS.I2C_SMBUS_BLOCK_PROC_CALL, data):
+            raise IOError(ffi.errno)
+        return smbus_data_to_bytes(data)
+
+    def read_i2c_block_data(self, addr, cmd, len=32):
+        """read_i2c_block_data(addr, cmd, len=32) -> bytes
+
+        Perform I2C Block Read transaction.
+        """
+        self._set_addr(addr)
+        data = self._data
+        data.block[0] = len
+        if len == 32:
+            arg = SMBUS.I2C_SMBUS_I2C_BLOCK_BROKEN
+        else:
+            arg = SMBUS.I2C_SMBUS_I2C_BLOCK_DATA
+        if SMBUS.i2c_smbus_access(self._fd, _READ, cmd, arg, data):
+            raise IOError(ffi.errno)
+        return smbus_data_to_bytes(data)
+
+    def write_i2c_block_data(self, addr, cmd, vals):
+        """write_i2c_block_data(addr, cmd, vals)
+
+        Perform I2C Block Write transaction.
+        """
+        self._set_addr(addr)
+        data = self._data
+        bytes_to_smbus_data(data, vals)
+        if SMBUS.i2c_smbus_access(self._fd, _WRITE, cmd,
+                                  SMBUS.I2C_SMBUS_I2C_BLOCK_BROKEN, data):
+            raise IOError(ffi.errno)
+
+
+class I2CMsg(object):
+    """I2CMsg(addr, buf[, flags]) -> I2CMsg
+    One segment of an SMBus.i2c_rdwr transaction.
+
+    buf is the data to write, or for a read (flags has I2C_M_RD) the
+    writable buffer to read into, e.g. a bytearray or a memoryview of
+    part of one. Use I2CMsg.read and I2CMsg.write to make them.
+    """
+
+    def __init__(self, addr, buf, flags=0):
+        self.addr = addr
+        self.buf = buf
+        self.flags = flags
+
+    @classmethod
+    def read(cls, addr, buf):
+        """read(addr, buf) -> I2CMsg
+
+        A segment that reads into buf, or into a new bytearray when buf is
+        the number of bytes to read.
+        """
+        if isinstance(buf, int):
+            buf = bytearray(buf)
+        return cls(addr, buf, SMBUS.I2C_M_RD)
+
+    @classmethod
+    def write(cls, addr, buf):
+        """write(addr, buf) -> I2CMsg
+
+        A segment that writes buf, which is bytes, a bytearray or another
+        buffer, or a list of integers (which is copied).
+        """
+        if isinstance(buf, list):
+            buf = bytearray(buf)
+        return cls(addr, buf)
+
+
 def smbus_data_to_list(data):
     block = data.block
     return [block[i + 1] for i in range(block[0])]
@@ -301,3 +559,19 @@ def list_to_smbus_data(data, vals):
     data.block[0] = len(vals)
     for i, val in enumerate(vals):
         data.block[i + 1] = val
+
+
+def smbus_data_to_bytes(data):
+    block = data.block
+    return ffi.buffer(block, min(block[0], SMBUS.I2C_SMBUS_BLOCK_MAX) + 1)[1:]
+
+
+def bytes_to_smbus_data(data, vals):
+    block_max = SMBUS.I2C_SMBUS_BLOCK_MAX
+    if len(vals) > block_max or len(vals) == 0:
+        raise OverflowError("Third argument must be at least one, "
+                            "but not more than %d bytes" % block_max)
+    if isinstance(vals, list):
+        vals = bytearray(vals)
+    data.block[0] = len(vals)
+    ffi.memmove(data.block + 1, vals, len(vals))
@@ -9,9 +9,11 @@ ffi.cdef("""
 typedef unsigned char __u8;
 typedef int32_t __s32;
 typedef unsigned short int __u16;
+typedef unsigned int __u32;
 
 #define I2C_SLAVE ...
 #define I2C_PEC ...
+#define I2C_RDWR ...
 
 /* smbus_access read or write markers */
 #define I2C_SMBUS_READ  ...
@@ -57,6 +59,30 @@ static inline __s32 i2c_smbus_process_call(int file, __u8 command, __u16 value);
 
 //static inline __s32 i2c_smbus_read_block_data(int file, __u8 command, __u8 *values)
 //static inline __s32 i2c_smbus_write_block_data(int file, __u8 command, __u8 length, const __u8 *values)
+
+/*
+ * I2C Messages, for combined transactions with the I2C_RDWR ioctl
+ */
+#define I2C_M_TEN           ...
+#define I2C_M_RD            ...
+#define I2C_M_NOSTART       ...
+#define I2C_M_REV_DIR_ADDR  ...
+#define I2C_M_IGNORE_NAK    ...
+#define I2C_M_NO_RD_ACK     ...
+struct i2c_msg {
+        __u16 addr;
+        unsigned short flags;
+        short len;
+        char *buf;
+};
+
+#define I2C_RDRW_IOCTL_MAX_MSGS ...
+struct i2c_rdwr_ioctl_data {
+        struct i2c_msg *msgs;
+        __u32 nmsgs;
+};
+
+static inline int i2c_rdwr_access(int file, struct i2c_rdwr_ioctl_data *data);
 """)
 
 include_dir = os.path.join(os.path.dirname(__file__), 'include')
@@ -64,6 +90,11 @@ include_dir = os.path.join(os.path.dirname(__file__), 'include')
 ffi.set_source(module_name, """
 #include <sys/types.h>
 #include <linux/i2c-dev.h>
+
+static inline int i2c_rdwr_access(int file, struct i2c_rdwr_ioctl_data *data)
+{
+        return ioctl(file, I2C_RDWR, data);
+}
 """, include_dirs=[include_dir])
 
 if __name__ == '__main__':
@@ -0,0 +1,47 @@
+import pytest
+from smbus import ffi, FastSMBus, bytes_to_smbus_data, smbus_data_to_bytes
+
+
+def test_init_does_nothing_by_default():
+    bus = FastSMBus()
+    assert bus._fd == -1
+    assert bus._addr == -1
+    assert bus._pec == 0
+
+
+def test_init_allocates_data():
+    assert FastSMBus()._data is not FastSMBus()._data
+
+
+def test_set_addr_validates():
+    bus = FastSMBus()
+    with pytest.raises(TypeError):
+        bus.read_byte("0x10")
+    assert bus._addr == -1
+
+
+def test_bytes_to_smbus_data():
+    data = ffi.new("union i2c_smbus_data *")
+    for vals in (bytes(bytearray(range(10))), bytearray(range(10)), list(range(10))):
+        bytes_to_smbus_data(data, vals)
+        assert data.block[0] == 10
+        for i in range(10):
+            assert data.block[i + 1] == i
+
+
+def test_smbus_data_to_bytes():
+    data = ffi.new("union i2c_smbus_data *")
+    bytes_to_smbus_data(data, bytearray(range(1, 33)))
+    result = smbus_data_to_bytes(data)
+    assert isinstance(result, bytes)
+    assert result == bytes(bytearray(range(1, 33)))
+
+
+def test_bytes_to_smbus_data_errors():
+    data = ffi.new("union i2c_smbus_data *")
+    with pytest.raises(OverflowError):
+        bytes_to_smbus_data(data, bytearray(33))
+    with pytest.raises(OverflowError):
+        bytes_to_smbus_data(data, b"")
+    # does not raise
+    bytes_to_smbus_data(data, bytearray(32))
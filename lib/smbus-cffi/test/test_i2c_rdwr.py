@@ -0,0 +1,71 @@
+import os
+import pytest
+from smbus import ffi, SMBus, FastSMBus, I2CMsg
+from smbus.smbus import I2C_RDWR_MAX_MSG_LEN
+
+
+def test_read_allocates_buffer():
+    msg = I2CMsg.read(0x50, 64)
+    assert msg.addr == 0x50
+    assert msg.flags == ffi.integer_const("I2C_M_RD")
+    assert msg.buf == bytearray(64)
+
+
+def test_read_into_buffer():
+    buf = bytearray(16)
+    view = memoryview(buf)[4:12]
+    assert I2CMsg.read(0x50, view).buf is view
+
+
+def test_write():
+    data = b"\x00\x10"
+    msg = I2CMsg.write(0x50, data)
+    assert msg.buf is data
+    assert msg.flags == 0
+    assert I2CMsg.write(0x50, [0, 16]).buf == bytearray(data)
+
+
+def test_structs():
+    assert ffi.sizeof("struct i2c_msg") >= 8
+    assert ffi.offsetof("struct i2c_rdwr_ioctl_data", "nmsgs") == ffi.sizeof("struct i2c_msg *")
+
+
+@pytest.mark.parametrize("cls", [SMBus, FastSMBus])
+def test_i2c_rdwr_not_a_bus(cls):
+    bus = cls()
+    bus._fd = os.open(os.devnull, os.O_RDWR)
+    try:
+        with pytest.raises(IOError):
+            bus.i2c_rdwr(I2CMsg.write(0x50, b"\x00\x10"), I2CMsg.read(0x50, 64))
+    finally:
+        bus.close()
+
+
+def test_i2c_rdwr_errors():
+    bus = SMBus()
+    with pytest.raises(OverflowError):
+        bus.i2c_rdwr()
+    with pytest.raises(OverflowError):
+        bus.i2c_rdwr(*[I2CMsg.write(0x50, b"\x00")] * 43)
+    with pytest.raises(TypeError):
+        bus.i2c_rdwr(I2CMsg(0x50, b"\x00" * 4, ffi.integer_const("I2C_M_RD")))
+
+
+@pytest.mark.parametrize("cls", [SMBus, FastSMBus])
+def test_i2c_rdwr_segment_length(cls):
+    bus = cls()
+    bus._fd = os.open(os.devnull, os.O_RDWR)
+    try:
+        # the longest segment i2c-dev takes gets as far as the ioctl
+        with pytest.raises(IOError):
+            bus.i2c_rdwr(I2CMsg.write(0x50, b"\x00\x00"),
+                         I2CMsg.read(0x50, I2C_RDWR_MAX_MSG_LEN))
+        for length in (I2C_RDWR_MAX_MSG_LEN + 1, 40000):
+            with pytest.raises(OverflowError) as error:
+                bus.i2c_rdwr(I2CMsg.write(0x50, b"\x00\x00"),
+                             I2CMsg.read(0x50, length))
+            assert "at most %d bytes" % I2C_RDWR_MAX_MSG_LEN in str(error.value)
+            with pytest.raises(OverflowError):
+                bus.i2c_rdwr(I2CMsg.write(0x50, b"\x00" * length))
+    finally:
+        bus.close()